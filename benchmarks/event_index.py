@@ -0,0 +1,164 @@
+import sys
+import time
+import random
+import asyncio
+import argparse
+import statistics
+from datetime import datetime
+from datetime import timedelta
+
+from bson import ObjectId
+
+from benchmarks.event_search import percentile, synthetic_event, vocabulary
+from dependencies.db.event_index import EventIndex, np
+from dependencies.utils.text import fold
+
+"""
+This module contains a benchmark of the in-process event index: its memory use, how long it takes to build, and the
+latency of the searches it answers, on a synthetic set of public events kept in memory. No database is needed.
+
+`--events` events (a million by default) are drawn like the corpus of the event search benchmark, with half of them
+free, and the index is built from them with the default configuration (every event covered). Each filter combination
+below is then searched `--queries` times with random values, reading the first page of `--size` events and the page
+after it, and the p50 and p95 latencies are reported. The searches without a start date, the default of
+`/events/search`, are measured too. Finally `--changes` events are inserted then deleted through the change buffer, and
+the time per change of applying and merging them is reported.
+
+Every search is also evaluated by brute force over the events, and the pages must hold the same events in the same
+order.
+
+Usage:
+    EVENT_INDEX=1 python -m benchmarks.event_index --events 1000000 --queries 200
+
+    Exits with 1 if a page differs from the brute force result.
+"""
+
+NOW = datetime(2024, 6, 1)
+SEARCHES = {
+    "city, no date": lambda rng, cities, categories: {"city": rng.choice(cities), "start_date": None},
+    "no filter": lambda rng, cities, categories: {"start_date": None},
+    "date range": lambda rng, cities, categories: {"end_date": NOW + timedelta(days=rng.randint(1, 30))},
+    "city": lambda rng, cities, categories: {"city": rng.choice(cities)},
+    "city prefix": lambda rng, cities, categories: {"city": rng.choice(cities)[:2]},
+    "category, free": lambda rng, cities, categories: {"category": rng.choice(categories), "free": True},
+    "online, free": lambda rng, cities, categories: {"online": True, "free": rng.random() < 0.5},
+    "city, category, month": lambda rng, cities, categories: {
+        "city": rng.choice(cities),
+        "category": rng.choice(categories),
+        "end_date": NOW + timedelta(days=30),
+    },
+}
+
+
+def events(count: int, seed: int) -> tuple[list[dict], list[str], list[str]]:
+    rng = random.Random(seed)
+    words = vocabulary(rng, 5000)
+    cities = [word.title() for word in rng.sample(words, 200)]
+    generated = []
+    for _ in range(count):
+        event = synthetic_event(rng, words, cities)
+        event["_id"] = ObjectId()
+        if rng.random() < 0.5:
+            event["ticket_summary"].update(min_price=0, max_price=0, is_free=True)
+        else:
+            event["ticket_summary"].update(min_price=rng.randint(5, 500), is_free=False)
+        event["normalized"] = {
+            "city": fold(event["location"]["city"]), "category": fold(event["basic_info"]["category"])
+        }
+        generated.append(event)
+    categories = sorted({event["basic_info"]["category"] for event in generated})
+    return generated, cities, categories
+
+
+def brute_force(events: list[dict], search: dict, after: list, size: int) -> list[ObjectId]:
+    start = search.get("start_date", NOW) or datetime(1970, 1, 1)
+    end = search.get("end_date", datetime.max)
+    matched = [
+        event for event in events
+        if start <= event["date_and_time"]["start_date_time"] <= end
+        and event["normalized"]["city"].startswith(fold(search.get("city", "")))
+        and event["normalized"]["category"].startswith(fold(search.get("category", "")))
+        and search.get("online", event["location"]["is_online"]) == event["location"]["is_online"]
+        and search.get("free", event["ticket_summary"]["is_free"]) == event["ticket_summary"]["is_free"]
+        and (after is None or (event["date_and_time"]["start_date_time"], event["_id"]) > tuple(after))
+    ]
+    matched.sort(key=lambda event: (event["date_and_time"]["start_date_time"], event["_id"]))
+    return [event["_id"] for event in matched[:size]]
+
+
+def search_page(index: EventIndex, search: dict, after: list, size: int):
+    return index.search(
+        search.get("city", ""),
+        search.get("online"),
+        search.get("free"),
+        search.get("start_date", NOW),
+        search.get("end_date"),
+        search.get("category"),
+        after,
+        size,
+    )
+
+
+async def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description="In-process event index benchmark")
+    parser.add_argument("--events", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--checks", type=int, default=5, help="searches per combination checked by brute force")
+    parser.add_argument("--size", type=int, default=20)
+    parser.add_argument("--changes", type=int, default=1000, help="events inserted then deleted")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    if np is None:
+        print("numpy is not installed")
+        return 1
+
+    generated, cities, categories = events(args.events, args.seed)
+    index = EventIndex(enabled=True)
+    start = time.perf_counter()
+    index.build(generated)
+    print(f"{len(index)} events indexed in {time.perf_counter() - start:.1f}s")
+    print(f"memory: {index.memory() / 2 ** 20:.1f} MiB, {index.memory() / max(1, len(index)):.1f} bytes per event")
+
+    rng = random.Random(args.seed + 1)
+    mismatches = 0
+    print(f"{'search':>22} {'page':>5} {'p50 ms':>9} {'p95 ms':>9}")
+    for name, draw in SEARCHES.items():
+        first_ms, next_ms = [], []
+        for query in range(args.queries):
+            search = draw(rng, cities, categories)
+            started = time.perf_counter()
+            ids, after = search_page(index, search, None, args.size)
+            first_ms.append((time.perf_counter() - started) * 1000)
+            next_ids = []
+            if after is not None:
+                started = time.perf_counter()
+                next_ids, _ = search_page(index, search, after, args.size)
+                next_ms.append((time.perf_counter() - started) * 1000)
+            if query < args.checks:
+                expected = brute_force(generated, search, None, 2 * args.size)
+                mismatches += ids + next_ids != expected
+        for page, values in (("first", first_ms), ("next", next_ms)):
+            if values:
+                print(f"{name:>22} {page:>5} {statistics.median(values):>9.3f} {percentile(values, 0.95):>9.3f}")
+
+    added = [synthetic_event(rng, vocabulary(rng, 10), cities) for _ in range(args.changes)]
+    for event in added:
+        event["_id"] = ObjectId()
+        event["date_and_time"]["start_date_time"] = NOW + timedelta(days=rng.randint(0, 365))
+        event["normalized"] = {"city": fold(event["location"]["city"]), "category": None}
+    timings = {}
+    for operation in ("insert", "delete"):
+        start = time.perf_counter()
+        for event in added:
+            index.apply({"operationType": operation, "documentKey": {"_id": event["_id"]}, "fullDocument": event})
+        index.flush()
+        timings[operation] = (time.perf_counter() - start) * 1000 / len(added)
+    print(f"{len(added)} changes: insert {timings['insert']:.3f} ms, delete {timings['delete']:.3f} ms per event")
+    mismatches += len(index) != len([event for event in generated if event["state"]["is_public"]])
+
+    print(f"pages differing from brute force: {mismatches}")
+    return 0 if mismatches == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(sys.argv[1:])))
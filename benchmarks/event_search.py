@@ -0,0 +1,144 @@
+import sys
+import time
+import random
+import asyncio
+import argparse
+import statistics
+from datetime import datetime
+from datetime import timedelta
+
+from dependencies.db.events import EventDriver
+from dependencies.db.indexes import IndexRegistry
+from dependencies.db.search import EventSearchDriver
+from dependencies.utils.pagination import KeysetParams
+
+"""
+This module contains a benchmark of the event search: the text index of EventSearchDriver against the unanchored
+case-insensitive regular expressions of EventDriver.search_events, on a synthetic corpus of public events.
+
+The corpus is `--events` events (a million by default) whose title, summary, organizer, category and city are drawn
+from a fixed vocabulary, plus `--markers` events with a word found nowhere else in their title. It is inserted once,
+flagged with `benchmark_corpus`, and deleted after the run unless `--keep` is given (a kept corpus of the same size is
+reused by the next run). The declared indexes, the text index included, are created before measuring.
+
+Each of `--queries` random vocabulary words is searched in the titles with both engines, and the time to read the first
+page of `--size` events is reported. Both engines must then find every marker event and nothing else.
+
+Usage:
+    MONGO_URI=... MONGO_DB=eventbrite_bench python -m benchmarks.event_search --events 1000000 --queries 50
+
+    Building the corpus and its indexes takes a few minutes. Exits with 1 if an engine misses or adds a marker event.
+"""
+
+MARKER = "zyqxmarker"
+SYLLABLES = ["ka", "lo", "mi", "ra", "te", "su", "no", "vi", "de", "pa", "ro", "zu", "fe", "ha", "ni", "go"]
+CATEGORIES = ["Music", "Business", "Food & Drink", "Community", "Arts", "Film", "Sports", "Health", "Science", "Travel"]
+
+
+def vocabulary(rng: random.Random, size: int) -> list[str]:
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def synthetic_event(rng: random.Random, words: list[str], cities: list[str], title: str = None) -> dict:
+    start = datetime(2023, 1, 1) + timedelta(minutes=rng.randrange(3 * 365 * 24 * 60))
+    category = rng.choice(CATEGORIES)
+    return {
+        "creator_id": "benchmark",
+        "benchmark_corpus": True,
+        "basic_info": {
+            "title": title or " ".join(rng.choice(words) for _ in range(rng.randint(2, 5))).title(),
+            "organizer": f"{rng.choice(words).title()} Events",
+            "category": category,
+            "sub_category": category,
+        },
+        "image_link": "https://www.example.com/image.png",
+        "summary": " ".join(rng.choice(words) for _ in range(12)),
+        "description": "",
+        "state": {"is_public": True, "publish_date_time": start - timedelta(days=30)},
+        "date_and_time": {
+            "start_date_time": start,
+            "end_date_time": start + timedelta(hours=3),
+            "is_display_start_date": True,
+            "is_display_end_date": True,
+            "time_zone": "UTC",
+            "event_page_language": "en",
+        },
+        "location": {"is_online": rng.random() < 0.2, "city": rng.choice(cities)},
+        "ticket_summary": {
+            "min_price": None, "max_price": None, "is_free": False,
+            "total_quantity": 0, "available_quantity": 0, "ticket_types": 0,
+        },
+    }
+
+
+async def build_corpus(driver: EventDriver, events: int, markers: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    words = vocabulary(rng, 5000)
+    cities = [word.title() for word in rng.sample(words, 200)]
+    if await driver.collection.count_documents({"benchmark_corpus": True}) == events + markers:
+        return words
+    await driver.collection.delete_many({"benchmark_corpus": True})
+    for start in range(0, events, 10000):
+        await driver.collection.insert_many(
+            [synthetic_event(rng, words, cities) for _ in range(min(10000, events - start))], ordered=False
+        )
+    await driver.collection.insert_many(
+        [synthetic_event(rng, words, cities, f"The {MARKER} Night") for _ in range(markers)], ordered=False
+    )
+    return words
+
+
+async def timed(search) -> float:
+    start = time.perf_counter()
+    await search
+    return (time.perf_counter() - start) * 1000
+
+
+def percentile(values: list[float], p: float) -> float:
+    return sorted(values)[min(len(values) - 1, int(len(values) * p))]
+
+
+async def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description="Event search benchmark")
+    parser.add_argument("--events", type=int, default=1000000)
+    parser.add_argument("--markers", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--size", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--keep", action="store_true", help="keep the corpus for the next run")
+    args = parser.parse_args(argv)
+
+    events = EventDriver()
+    search = EventSearchDriver()
+    start = time.perf_counter()
+    words = await build_corpus(events, args.events, args.markers, args.seed)
+    await IndexRegistry().reconcile()
+    print(f"corpus and indexes ready in {time.perf_counter() - start:.0f}s")
+
+    rng = random.Random(args.seed + 1)
+    regex_ms, text_ms = [], []
+    for word in rng.sample(words, args.queries):
+        params = KeysetParams(size=args.size)
+        regex_ms.append(await timed(events.search_events("", title=word, params=params)))
+        text_ms.append(await timed(search.search(word, params)))
+
+    print(f"{'engine':>6} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    for name, values in (("regex", regex_ms), ("text", text_ms)):
+        print(
+            f"{name:>6} {statistics.median(values):>9.1f} {percentile(values, 0.95):>9.1f} {max(values):>9.1f}"
+        )
+
+    regex_found = await events.collection.count_documents(events.build_search_query("", title=MARKER))
+    text_found = await search.collection.count_documents({"$text": {"$search": MARKER}, "state.is_public": True})
+    print(f"marker events found: regex {regex_found}, text {text_found}, expected {args.markers}")
+
+    if not args.keep:
+        await events.collection.delete_many({"benchmark_corpus": True})
+    return 0 if regex_found == text_found == args.markers else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(sys.argv[1:])))
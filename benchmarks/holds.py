@@ -0,0 +1,97 @@
+import sys
+import time
+import asyncio
+import argparse
+from datetime import datetime
+
+from bson import ObjectId
+from fastapi import HTTPException
+
+from dependencies.db.holds import HoldDriver
+from dependencies.models.tickets import TicketIn
+
+"""
+This module contains a benchmark of the ticket holds: how many holds per second can be created on one ticket by
+concurrent buyers, and how many expired holds per second the reclaimer gives back.
+
+Every round creates a ticket with `--stock` tickets on a throwaway event, creates `--holds` holds of one ticket with
+at most `--concurrency` of them in flight, expires them all, reclaims them in batches of `--batch` holds, checks that
+the available quantity is back to `stock`, and deletes the ticket and the holds.
+
+Usage:
+    MONGO_URI=... MONGO_DB=eventbrite_bench python -m benchmarks.holds --holds 5000 --stock 5000
+
+    The database must be a replica set (holds are written in transactions). Exits with 1 if any round lost or
+    duplicated tickets.
+"""
+
+
+async def run_round(driver: HoldDriver, holds: int, stock: int, concurrency: int, batch: int) -> dict:
+    event_id = str(ObjectId())
+    ticket = (await driver.tickets.create_tickets(event_id, [TicketIn(
+        name="Benchmark", type="Paid", price=10, max_quantity=stock,
+        sales_start_date_time="2023-01-01T00:00:00", sales_end_date_time="2099-01-01T00:00:00",
+    )]))[0]
+    semaphore = asyncio.Semaphore(concurrency)
+    held = 0
+
+    async def hold():
+        nonlocal held
+        async with semaphore:
+            try:
+                await driver.create_hold(ticket.id, 1, "benchmark")
+                held += 1
+            except HTTPException:
+                pass
+
+    start = time.perf_counter()
+    await asyncio.gather(*(hold() for _ in range(holds)))
+    hold_seconds = time.perf_counter() - start
+    after_holds = (await driver.tickets.get_ticket_by_id(ticket.id)).available_quantity
+
+    await driver.collection.update_many({"ticket_id": ticket.id}, {"$set": {"expires_at": datetime.utcnow()}})
+    start = time.perf_counter()
+    reclaimed = 0
+    while True:
+        count = await driver.reclaim_expired(batch)
+        reclaimed += count
+        if count < batch:
+            break
+    reclaim_seconds = time.perf_counter() - start
+    available = (await driver.tickets.get_ticket_by_id(ticket.id)).available_quantity
+
+    await driver.tickets.delete_tickets_by_event_id(event_id)
+    await driver.collection.delete_many({"ticket_id": ticket.id})
+    return {
+        "held": held,
+        "reclaimed": reclaimed,
+        "consistent": after_holds == stock - held and reclaimed == held and available == stock,
+        "holds_per_second": holds / hold_seconds,
+        "reclaims_per_second": reclaimed / reclaim_seconds if reclaim_seconds else 0,
+    }
+
+
+async def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description="Ticket holds benchmark")
+    parser.add_argument("--holds", type=int, default=5000)
+    parser.add_argument("--stock", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    driver = HoldDriver()
+    failed = False
+    print(f"{'round':>5} {'held':>6} {'reclaimed':>9} {'holds/s':>9} {'reclaims/s':>10}")
+    for i in range(args.rounds):
+        result = await run_round(driver, args.holds, args.stock, args.concurrency, args.batch)
+        failed |= not result["consistent"]
+        print(
+            f"{i + 1:>5} {result['held']:>6} {result['reclaimed']:>9} {result['holds_per_second']:>9.0f} "
+            f"{result['reclaims_per_second']:>10.0f}"
+        )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(sys.argv[1:])))
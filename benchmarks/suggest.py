@@ -0,0 +1,98 @@
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tracemalloc
+
+from bson import ObjectId
+
+from benchmarks.event_search import CATEGORIES, percentile, synthetic_event, vocabulary
+from dependencies.db.suggestions import Suggestions, build_completions
+from dependencies.utils.text import fold
+
+"""
+This module contains a benchmark of the search box autocomplete: the memory used by the completions and the latency
+of the suggestions, on a synthetic set of upcoming events kept in memory. No database is needed.
+
+`--events` events (a million by default) are drawn like the corpus of the event search benchmark, with random likes,
+and the completions are built from them. `--queries` prefixes of one to four characters, drawn from the titles and
+cities, are then completed twice: the first time computes the answer (cold), the second reads it from the cache
+(warm). The p50 and p99 latencies of both are reported.
+
+The completions of `--checks` prefixes are also computed by brute force over the kept names, and must be the same.
+
+Usage:
+    python -m benchmarks.suggest --events 1000000 --queries 2000
+
+    Exits with 1 if a completion differs from the brute force result.
+"""
+
+
+def brute_force(completions, prefix: str, limit: int) -> list[str]:
+    matched = sorted(
+        (position for position, key in enumerate(completions.keys) if key.startswith(prefix)),
+        key=lambda position: (-completions.weights[position], position),
+    )
+    return [completions.texts[position] for position in matched[:limit]]
+
+
+async def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description="Search autocomplete benchmark")
+    parser.add_argument("--events", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--checks", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    words = vocabulary(rng, 5000)
+    cities = [word.title() for word in rng.sample(words, 200)]
+    events = []
+    likes = {}
+    for _ in range(args.events):
+        event = synthetic_event(rng, words, cities)
+        event["_id"] = ObjectId()
+        likes[str(event["_id"])] = int(rng.paretovariate(1.5)) - 1
+        events.append(event)
+
+    suggestions = Suggestions()
+    tracemalloc.start()
+    start = time.perf_counter()
+    suggestions.replace(*build_completions(events, CATEGORIES, likes))
+    built = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    kept = len(suggestions.titles) + len(suggestions.cities) + len(suggestions.categories)
+    print(f"{kept} names kept from {args.events} events in {built:.1f}s, {memory / 2 ** 20:.1f} MiB")
+
+    names = [event["basic_info"]["title"] for event in events[:10000]] + cities
+    prefixes = [rng.choice(names)[:rng.randint(1, 4)] for _ in range(args.queries)]
+    cold_ms, warm_ms = [], []
+    for prefix in prefixes:
+        suggestions.answers.clear()
+        for values in (cold_ms, warm_ms):
+            start = time.perf_counter()
+            suggestions.suggest(prefix, args.limit)
+            values.append((time.perf_counter() - start) * 1000)
+
+    print(f"{'answer':>6} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for name, values in (("cold", cold_ms), ("warm", warm_ms)):
+        print(f"{name:>6} {percentile(values, 0.5):>9.3f} {percentile(values, 0.99):>9.3f} {max(values):>9.3f}")
+
+    mismatches = 0
+    for prefix in prefixes[:args.checks]:
+        answer = suggestions.suggest(prefix, args.limit)
+        for completions, found in (
+                (suggestions.titles, answer.titles),
+                (suggestions.cities, answer.cities),
+                (suggestions.categories, answer.categories),
+        ):
+            mismatches += found != brute_force(completions, fold(prefix), args.limit)
+    print(f"completions differing from brute force: {mismatches}")
+    return 0 if mismatches == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(sys.argv[1:])))
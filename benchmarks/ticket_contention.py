@@ -0,0 +1,96 @@
+import sys
+import time
+import asyncio
+import argparse
+
+from bson import ObjectId
+from fastapi import HTTPException
+
+from dependencies.db.tickets import TicketDriver
+from dependencies.models.tickets import TicketIn
+
+"""
+This module contains a contention benchmark of the ticket reservations: thousands of buyers try to reserve tickets of
+the same ticket type at once, as during the first seconds of an on-sale.
+
+Every round creates a ticket with `--stock` tickets on a throwaway event, fires `--buyers` reservations of one ticket
+each with at most `--concurrency` of them in flight, checks that exactly `min(buyers, stock)` succeeded and that the
+available quantity ended at `stock - sold`, and deletes the ticket. With `--naive`, the reservations read the ticket
+and then decrement it, as the tickets router used to, to show the overselling of that approach.
+
+Usage:
+    MONGO_URI=... MONGO_DB=eventbrite_bench python -m benchmarks.ticket_contention --buyers 5000 --stock 1000
+
+    Exits with 1 if any round sold more tickets than it had, or lost count of them.
+"""
+
+
+async def naive_reserve(driver: TicketDriver, ticket_id: str, quantity: int):
+    ticket = await driver.get_ticket_by_id(ticket_id)
+    if ticket.available_quantity < quantity:
+        raise HTTPException(detail="Not enough tickets available", status_code=400)
+    await driver.collection.update_one({"_id": ObjectId(ticket_id)}, {"$inc": {"available_quantity": -quantity}})
+
+
+async def run_round(driver: TicketDriver, buyers: int, stock: int, concurrency: int, naive: bool) -> dict:
+    event_id = str(ObjectId())
+    ticket = (await driver.create_tickets(event_id, [TicketIn(
+        name="Benchmark", type="Paid", price=10, max_quantity=stock,
+        sales_start_date_time="2023-01-01T00:00:00", sales_end_date_time="2099-01-01T00:00:00",
+    )]))[0]
+    semaphore = asyncio.Semaphore(concurrency)
+    sold = 0
+    refused = 0
+
+    async def buy():
+        nonlocal sold, refused
+        async with semaphore:
+            try:
+                if naive:
+                    await naive_reserve(driver, ticket.id, 1)
+                else:
+                    await driver.reserve(ticket.id, 1)
+                sold += 1
+            except HTTPException:
+                refused += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(buy() for _ in range(buyers)))
+    elapsed = time.perf_counter() - start
+
+    available = (await driver.get_ticket_by_id(ticket.id)).available_quantity
+    await driver.delete_tickets_by_event_id(event_id)
+    return {
+        "sold": sold,
+        "refused": refused,
+        "available": available,
+        "oversold": max(0, sold - stock) + max(0, -available),
+        "consistent": sold == min(buyers, stock) and available == stock - sold,
+        "ops_per_second": buyers / elapsed,
+    }
+
+
+async def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description="Ticket reservation contention benchmark")
+    parser.add_argument("--buyers", type=int, default=5000)
+    parser.add_argument("--stock", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--naive", action="store_true", help="read the ticket, then decrement it")
+    args = parser.parse_args(argv)
+
+    driver = TicketDriver()
+    failed = False
+    print(f"{'round':>5} {'sold':>6} {'refused':>8} {'available':>9} {'oversold':>8} {'ops/s':>9}")
+    for i in range(args.rounds):
+        result = await run_round(driver, args.buyers, args.stock, args.concurrency, args.naive)
+        failed |= not result["consistent"]
+        print(
+            f"{i + 1:>5} {result['sold']:>6} {result['refused']:>8} {result['available']:>9} "
+            f"{result['oversold']:>8} {result['ops_per_second']:>9.0f}"
+        )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(sys.argv[1:])))
@@ -1,16 +1,33 @@
+from pymongo import ASCENDING
+from pymongo import IndexModel
+from pymongo import UpdateOne
 from dependencies.models.attendees import Attendee, AttendeeOut
-from dependencies.db.client import Client
+from dependencies.db.client import AsyncClient
 from bson.objectid import ObjectId
 from dependencies.utils.bson import convert_to_object_id
+from dependencies.utils.bson import document_exists
+from dependencies.utils.bson import find_one_or_404
+from dependencies.utils.pagination import KeysetPage, KeysetParams, find_page
 from fastapi import HTTPException
 from fastapi import status
 
+
+# attendees are listed in the order they were added
+ATTENDEES_SORT = [("_id", ASCENDING)]
+
+
 class AttendeeDriver:
+    collection_name = "attendees"
+    indexes = [
+        IndexModel([("order_id", ASCENDING), ("_id", ASCENDING)], name="order_id__id"),
+        IndexModel([("event_id", ASCENDING), ("_id", ASCENDING)], name="event_id__id"),
+    ]
+
     def __init__(self):
-        self.db = Client().get_instance().get_db()
-        self.collection = self.db["attendees"]#Attendees collection
+        self.db = AsyncClient.get_instance().get_db()
+        self.collection = self.db[self.collection_name]#Attendees collection
 
-    def handle_nonexistent_attendee(self, attendee_id):
+    async def handle_nonexistent_attendee(self, attendee_id):
         """
         Handles the case when an attendee does not exist.
 
@@ -25,12 +42,12 @@ class AttendeeDriver:
             HTTPException: If the attendee with the given attendee_id does not exist.
 
         """
-        if not self.collection.find_one({"_id": convert_to_object_id(attendee_id)}):
+        if not await document_exists(self.collection, {"_id": convert_to_object_id(attendee_id)}):
             raise HTTPException(
                 detail="attendee not found", status_code=status.HTTP_404_NOT_FOUND
             )
 
-    def add_attendee(self, event_id:str, attendee: Attendee):
+    async def add_attendee(self, event_id:str, attendee: Attendee):
         """
         Adds an attendee to the collection.
 
@@ -47,15 +64,40 @@ class AttendeeDriver:
 
         """
         attendee.event_id = event_id
-        inserted_id=self.collection.insert_one(attendee.dict()).inserted_id
+        inserted_id=(await self.collection.insert_one(attendee.dict())).inserted_id
+        await self.update_tickets_count(attendee.order_id, 1)
         return AttendeeOut(id=str(inserted_id), **attendee.dict())
 
-    def get_attendee(self, attendee_id):
+    async def add_attendees(self, event_id:str, attendees: list[Attendee], session=None):
+        """
+        Adds the attendees of a new order to the collection with a single insert.
+
+        Unlike add_attendee, the `tickets_count` counter of the order is left alone: the order is inserted with its
+        final count in the same transaction.
+
+        Args:
+            event_id (str): The ID of the event to which the attendees are being added.
+            attendees (list[Attendee]): The attendees to add.
+            session (AsyncIOMotorClientSession, optional): The session of the transaction the insert is part of.
+
+        Returns:
+            list[AttendeeOut]: The newly added attendees, in the given order.
+
+        """
+        for attendee in attendees:
+            attendee.event_id = event_id
+        inserted_ids = (await self.collection.insert_many(
+            [attendee.dict() for attendee in attendees], session=session
+        )).inserted_ids
+        return [AttendeeOut(id=str(i), **attendee.dict()) for i, attendee in zip(inserted_ids, attendees)]
+
+    async def get_attendee(self, attendee_id):
         """
         Retrieves an attendee from the collection.
 
         This method retrieves an attendee from the collection based on the provided attendee_id.
-        It returns the attendee as an AttendeeOut object.
+        It returns the attendee as an AttendeeOut object, or raises an HTTPException with a 404 Not Found status code
+        if the attendee does not exist.
 
         Args:
             self: The instance of the class.
@@ -65,69 +107,84 @@ class AttendeeDriver:
             AttendeeOut: The retrieved attendee as an AttendeeOut object.
 
         """
-        attendee = self.collection.find_one({"_id": convert_to_object_id(attendee_id)})
+        attendee = await find_one_or_404(self.collection, attendee_id, "attendee not found")
         return AttendeeOut(id=str(attendee["_id"]), **attendee)
 
-    def get_attendees(self, event_id):
+    async def get_attendees(self, event_id, params: KeysetParams) -> KeysetPage[AttendeeOut]:
         """
         Retrieves attendees from the collection for a specific event.
 
-        This method retrieves all attendees from the collection that belong to the specified event_id.
-        It returns a list of AttendeeOut objects representing the retrieved attendees.
+        This method retrieves one page of the attendees from the collection that belong to the specified event_id.
+        It returns a page of AttendeeOut objects representing the retrieved attendees.
 
         Args:
             self: The instance of the class.
             event_id (str): The ID of the event for which attendees are being retrieved.
+            params (KeysetParams): The cursor and size of the requested page.
 
         Returns:
-            list[AttendeeOut]: A list of AttendeeOut objects representing the retrieved attendees.
+            KeysetPage[AttendeeOut]: A page of AttendeeOut objects representing the retrieved attendees.
 
         """
-        res = []
-        for attendee in self.collection.find({"event_id": event_id}):
-            res.append(AttendeeOut(id=str(attendee["_id"]), **attendee))
-        return res
+        attendees, next_cursor = await find_page(self.collection, {"event_id": event_id}, ATTENDEES_SORT, params)
+        res = [AttendeeOut(id=str(attendee["_id"]), **attendee) for attendee in attendees]
+        return KeysetPage.create(res, params, next_=next_cursor)
 
-    def get_attendees_by_order_id(self, order_id):
+    async def get_attendees_by_order_id(self, order_id, params: KeysetParams) -> KeysetPage[AttendeeOut]:
         """
-        Retrieves attendees from the collection based on the order ID.
+        Retrieves one page of the attendees from the collection based on the order ID.
 
         Args:
             order_id (str): The ID of the order associated with the attendees.
+            params (KeysetParams): The cursor and size of the requested page.
 
         Returns:
-            list[AttendeeOut]: A list of AttendeeOut objects representing the retrieved attendees.
+            KeysetPage[AttendeeOut]: A page of AttendeeOut objects representing the retrieved attendees.
         """
-        res = []
-        for attendee in self.collection.find({"order_id": order_id}):
-            res.append(AttendeeOut(id=str(attendee["_id"]), **attendee))
-        return res
+        attendees, next_cursor = await find_page(self.collection, {"order_id": order_id}, ATTENDEES_SORT, params)
+        res = [AttendeeOut(id=str(attendee["_id"]), **attendee) for attendee in attendees]
+        return KeysetPage.create(res, params, next_=next_cursor)
 
-    def update_attendee(self, attendee_id,updated_attributes):
+    async def update_attendee(self, attendee_id,updated_attributes):
         """
         Updates an attendee with the specified attributes.
+        If the attendee is moved to another order, the tickets count of both orders is updated. The target order is
+        checked first, so an invalid one leaves the attendee unchanged.
 
         Args:
             attendee_id (str): The ID of the attendee to update.
             updated_attributes (dict): A dictionary containing the updated attributes of the attendee.
 
+        Raises:
+            HTTPException: 400 if the target order ID is invalid, 404 if the order does not exist.
+
         """
-        self.collection.update_one(
+        order_id = updated_attributes.get("order_id")
+        if order_id is not None and not await document_exists(
+                self.db["orders"], {"_id": convert_to_object_id(order_id)}
+        ):
+            raise HTTPException(detail="order not found", status_code=status.HTTP_404_NOT_FOUND)
+        attendee = await self.collection.find_one_and_update(
             {"_id": convert_to_object_id(attendee_id)},
             {"$set": updated_attributes},
         )
+        if attendee and "order_id" in updated_attributes and updated_attributes["order_id"] != attendee.get("order_id"):
+            await self.update_tickets_count(attendee.get("order_id"), -1)
+            await self.update_tickets_count(updated_attributes["order_id"], 1)
 
-    def delete_attendee(self, attendee_id):
+    async def delete_attendee(self, attendee_id):
         """
-        Deletes an attendee from the collection.
+        Deletes an attendee from the collection, and decrements the tickets count of its order.
 
         Args:
             attendee_id (str): The ID of the attendee to delete.
 
         """
-        self.collection.delete_one({"_id": convert_to_object_id(attendee_id)})
+        attendee = await self.collection.find_one_and_delete({"_id": convert_to_object_id(attendee_id)})
+        if attendee:
+            await self.update_tickets_count(attendee.get("order_id"), -1)
 
-    def attendees_count(self, order_id):
+    async def attendees_count(self, order_id):
         """
         Counts the number of attendees for a specific order.
 
@@ -138,4 +195,53 @@ class AttendeeDriver:
             int: The number of attendees for the specified order.
 
         """
-        return self.collection.count_documents({"order_id": order_id})
+        return await self.collection.count_documents({"order_id": order_id})
+
+    async def attendees_counts(self, order_ids: list[str]) -> dict[str, int]:
+        """
+        Counts the number of attendees of many orders with a single aggregation.
+
+        Args:
+            order_ids (list[str]): The IDs of the orders for which to count the attendees.
+
+        Returns:
+            dict[str, int]: The number of attendees of every order. Orders without attendees are left out.
+        """
+        pipeline = [
+            {"$match": {"order_id": {"$in": order_ids}}},
+            {"$group": {"_id": "$order_id", "count": {"$sum": 1}}},
+        ]
+        return {group["_id"]: group["count"] async for group in self.collection.aggregate(pipeline)}
+
+    async def update_tickets_count(self, order_id, increment: int):
+        """
+        Atomically increments the `tickets_count` counter of an order.
+
+        Orders stored before the counter existed are left alone: their count is computed when they are read, until
+        `refresh_tickets_counts` stores it.
+
+        Args:
+            order_id (str): The ID of the order. Nothing is done if it is None.
+            increment (int): The number of attendees added (or removed, if negative).
+        """
+        if order_id is None:
+            return
+        await self.db["orders"].update_one(
+            {"_id": convert_to_object_id(order_id), "tickets_count": {"$exists": True}},
+            {"$inc": {"tickets_count": increment}},
+        )
+
+    async def refresh_tickets_counts(self, order_ids: list[str]):
+        """
+        Recounts the attendees of the given orders and stores the result in their `tickets_count` counter.
+
+        Args:
+            order_ids (list[str]): The IDs of the orders to refresh.
+        """
+        if not order_ids:
+            return
+        counts = await self.attendees_counts(order_ids)
+        await self.db["orders"].bulk_write([
+            UpdateOne({"_id": convert_to_object_id(order_id)}, {"$set": {"tickets_count": counts.get(order_id, 0)}})
+            for order_id in order_ids
+        ], ordered=False)
@@ -1,6 +1,9 @@
-import re
+from pymongo import ASCENDING
+from pymongo import IndexModel
 
-from dependencies.db.client import Client
+from dependencies.db.client import AsyncClient
+from dependencies.utils.text import fold
+from dependencies.utils.text import prefix_filter
 
 
 class CategoriesDriver:
@@ -8,11 +11,16 @@ class CategoriesDriver:
     A class for interacting with a MongoDB collection that stores categories data.
 
     Attributes:
-        client (MongoClient): The MongoDB client instance.
-        db (MongoDatabase): The MongoDB database instance.
-        collection (MongoCollection): The MongoDB collection instance for 'categories'.
+        client (AsyncIOMotorClient): The MongoDB client instance.
+        db (AsyncIOMotorDatabase): The MongoDB database instance.
+        collection (AsyncIOMotorCollection): The MongoDB collection instance for 'categories'.
     """
 
+    collection_name = "categories"
+    indexes = [
+        IndexModel([("name_key", ASCENDING)], name="name_key"),
+    ]
+
     def __init__(self):
         """
         Initializes a new instance of the CategoriesDriver class.
@@ -21,12 +29,12 @@ class CategoriesDriver:
         variable, selects the specified database using the MONGO_DB environment variable,
         and initializes the MongoDB collection instance for 'categories'.
         """
-        self.db = Client.get_instance().get_db()
-        self.collection = self.db.get_collection("categories")
+        self.db = AsyncClient.get_instance().get_db()
+        self.collection = self.db.get_collection(self.collection_name)
 
-    def insert(self, data):
+    async def insert(self, data):
         """
-        Inserts a single document into the 'categories' collection.
+        Inserts a single document into the 'categories' collection, with the folded name it is looked up by.
 
         Args:
             data (dict): The document to be inserted as a dictionary.
@@ -34,45 +42,52 @@ class CategoriesDriver:
         Returns:
             None
         """
-        self.collection.insert_one(data)
+        await self.collection.insert_one({**data, "name_key": fold(data["name"])})
 
-    def find_all(self):
+    async def find_all(self):
         """
         Retrieves all documents from the 'categories' collection.
 
         Returns:
-            cursor: A cursor to the result of the find operation.
+            list[dict]: The documents returned by the find operation.
+        """
+        return await self.collection.find().to_list(length=None)
+
+    @staticmethod
+    def name_query(name: str) -> dict:
+        """
+        Builds the query of the categories whose folded name starts with the folded `name`, served by the name_key
+        index. A blank name matches every category.
         """
-        return self.collection.find()
+        key = prefix_filter(name)
+        return {"name_key": key} if key is not None else {}
 
-    def find(self, query):
+    async def find(self, query):
         """
         Retrieves documents from the 'categories' collection that match a given query.
 
         Args:
             query (dict): A dictionary containing the query criteria.
-                The dictionary should have a 'name' key with the value to be matched as
-                a regular expression pattern.
+                The dictionary should have a 'name' key with the beginning of the names to match, ignoring case and
+                accents.
 
         Returns:
-            cursor: A cursor to the result of the find operation.
+            list[dict]: The documents returned by the find operation.
         """
-        pattern = re.compile(".*{}.*".format(re.escape(query["name"])), re.IGNORECASE)
-        query = {"name": {"$regex": pattern}}
-        return self.collection.find(query)
+        query = self.name_query(query["name"])
+        return await self.collection.find(query).to_list(length=None)
 
-    def count(self, query):
+    async def count(self, query):
         """
         Returns the count of documents in the 'categories' collection that match a given query.
 
         Args:
             query (dict): A dictionary containing the query criteria.
-                The dictionary should have a 'name' key with the value to be matched as
-                a regular expression pattern.
+                The dictionary should have a 'name' key with the beginning of the names to match, ignoring case and
+                accents.
 
         Returns:
             int: The count of documents that match the query.
         """
-        pattern = re.compile(".*{}.*".format(re.escape(query["name"])), re.IGNORECASE)
-        query = {"name": {"$regex": pattern}}
-        return self.collection.count_documents(query)
+        query = self.name_query(query["name"])
+        return await self.collection.count_documents(query)
@@ -0,0 +1,125 @@
+from collections import Counter
+from datetime import datetime
+
+from fastapi import HTTPException
+from fastapi import status
+
+from dependencies.db.attendees import AttendeeDriver
+from dependencies.db.client import AsyncClient
+from dependencies.db.holds import HoldDriver
+from dependencies.db.orders import OrderDriver
+from dependencies.db.promocodes import PromocodeDriver, apply_promocode, check_active
+from dependencies.db.tickets import TicketDriver
+from dependencies.models.attendees import Attendee
+from dependencies.models.events import EventOut
+from dependencies.models.orders import Checkout, CheckoutOut, Order
+
+"""
+This module contains the checkout of an order: reserving its tickets (or converting the holds of the buyer),
+redeeming its promocode and inserting the order with its attendees, all in one MongoDB transaction.
+
+Classes:
+    - CheckoutDriver: Validates a checkout and writes it in a transaction.
+
+Usage:
+    checkout_out = await CheckoutDriver().checkout(event, user_id, checkout)
+
+    Transactions need MongoDB to run as a replica set (a single-node one is enough for development).
+"""
+
+
+class CheckoutDriver:
+    """
+    Validates and writes checkouts.
+
+    Everything that can be checked without writing (the tickets belong to the event, the promocode is valid, the
+    price) is checked before the transaction starts, so that the transaction only holds the writes. If any write is
+    refused (sold out tickets, a promocode without uses left) the transaction is aborted and nothing is written.
+    """
+
+    def __init__(self):
+        self.client = AsyncClient.get_instance().client
+        self.tickets = TicketDriver()
+        self.orders = OrderDriver()
+        self.attendees = AttendeeDriver()
+        self.promocodes = PromocodeDriver()
+        self.holds = HoldDriver()
+
+    async def checkout(self, event: EventOut, user_id: str, checkout: Checkout) -> CheckoutOut:
+        """
+        Places an order for the given event.
+
+        Args:
+            event (EventOut): The event the tickets are bought for.
+            user_id (str): The ID of the buyer.
+            checkout (Checkout): The buyer, one entry per ticket bought, an optional promocode, and the holds whose
+                tickets are used (the remaining tickets are reserved).
+
+        Returns:
+            CheckoutOut: The order and its attendees.
+
+        Raises:
+            HTTPException: If a ticket, a hold or the promocode does not exist or belongs to another event or buyer
+                (404), if the promocode is not active, a hold holds more tickets than are bought or ended (400), or if
+                a ticket is sold out or the promocode has no uses left (400).
+        """
+        quantities = Counter(attendee.ticket_id for attendee in checkout.attendees)
+        tickets = await self.tickets.get_tickets_by_ids(list(quantities))
+        for ticket_id in quantities:
+            if ticket_id not in tickets or tickets[ticket_id].event_id != event.id:
+                raise HTTPException(detail="Ticket not found", status_code=status.HTTP_404_NOT_FOUND)
+
+        held = Counter()
+        holds = await self.holds.get_holds(checkout.hold_ids)
+        for hold_id in checkout.hold_ids:
+            if hold_id not in holds or holds[hold_id].user_id != user_id:
+                raise HTTPException(detail="hold not found", status_code=status.HTTP_404_NOT_FOUND)
+            held[holds[hold_id].ticket_id] += holds[hold_id].quantity
+        if any(quantity > quantities[ticket_id] for ticket_id, quantity in held.items()):
+            raise HTTPException(detail="holds do not match the attendees", status_code=status.HTTP_400_BAD_REQUEST)
+
+        price = sum(tickets[attendee.ticket_id].price for attendee in checkout.attendees)
+        promocode = None
+        if checkout.promocode_id is not None:
+            promocode = await self.promocodes.get_promocode_by_id(checkout.promocode_id, "Promocode ID is invalid")
+            if promocode.event_id != event.id:
+                raise HTTPException(detail="Promocode ID is invalid", status_code=status.HTTP_404_NOT_FOUND)
+            check_active(promocode)
+            price = apply_promocode(price, promocode)
+
+        order = Order(
+            first_name=checkout.first_name,
+            last_name=checkout.last_name,
+            email=checkout.email,
+            event_id=event.id,
+            created_date=datetime.utcnow(),
+            price=price,
+            user_id=user_id,
+            image_link=event.image_link,
+        )
+
+        async def write(session) -> CheckoutOut:
+            await self.holds.convert_holds(checkout.hold_ids, user_id, session)
+            for ticket_id, quantity in (quantities - held).items():
+                await self.tickets.reserve(ticket_id, quantity, session)
+            if promocode is not None and promocode.is_limited:
+                await self.promocodes.redeem(promocode.id, session)
+            order_out = await self.orders.add_order(event.id, order, len(checkout.attendees), session)
+            attendees = [
+                Attendee(
+                    first_name=attendee.first_name,
+                    last_name=attendee.last_name,
+                    email=attendee.email,
+                    type_of_reseved_ticket=tickets[attendee.ticket_id].type,
+                    order_id=order_out.id,
+                    event_id=event.id,
+                )
+                for attendee in checkout.attendees
+            ]
+            attendees = await self.attendees.add_attendees(event.id, attendees, session)
+            return CheckoutOut(order=order_out, attendees=attendees)
+
+        async with await self.client.start_session() as session:
+            # with_transaction retries the whole callback on transient errors (e.g. a write conflict with another
+            # checkout of the same ticket) and aborts it on any other exception
+            return await session.with_transaction(write)
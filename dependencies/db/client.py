@@ -1,5 +1,6 @@
 import os
 
+from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo import MongoClient
 from pymongo import errors as mongo_errors
 
@@ -54,3 +55,53 @@ class Client:
             Database: The `Database` instance used to interact with the MongoDB database.
         """
         return self.db
+
+
+class AsyncClient:
+    """
+    A class for connecting to a MongoDB database without blocking the event loop.
+
+    This class provides a single instance of a `motor` connection that can be accessed by calling the
+    `get_instance()` method. The drivers in `dependencies.db` use it so that awaiting a query yields the event loop
+    to other in-flight requests instead of stalling it.
+    """
+
+    _instance = None
+
+    @staticmethod
+    def get_instance():
+        """
+        Returns the single instance of the `AsyncClient` class that connects to the MongoDB database.
+
+        If an instance does not yet exist, this method creates one.
+
+        Returns:
+            AsyncClient: The `AsyncClient` instance used to connect to the database.
+        """
+        if not AsyncClient._instance:
+            AsyncClient()
+        return AsyncClient._instance
+
+    def __init__(self):
+        """
+        Initializes the `AsyncClient` instance by connecting to the MongoDB database.
+
+        Raises:
+            HTTPException: If there is an error connecting to the database.
+        """
+        if not AsyncClient._instance:
+            try:
+                AsyncClient._instance = self
+                self.client = AsyncIOMotorClient(os.environ.get("MONGO_URI"))
+                self.db = self.client[os.environ.get("MONGO_DB")]
+            except mongo_errors.PyMongoError:
+                raise HTTPException(detail="database error", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def get_db(self):
+        """
+        Returns the MongoDB database instance.
+
+        Returns:
+            AsyncIOMotorDatabase: The `AsyncIOMotorDatabase` instance used to interact with the MongoDB database.
+        """
+        return self.db
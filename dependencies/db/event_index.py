@@ -0,0 +1,385 @@
+import os
+import sys
+import asyncio
+import logging
+from bisect import bisect_left
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+from typing import Iterable, Optional
+
+from bson import ObjectId
+from pymongo import errors as mongo_errors
+
+from dependencies.db.client import AsyncClient
+from dependencies.utils.text import fold
+
+try:
+    import numpy as np
+except ImportError:  # the index is optional, and so is numpy
+    np = None
+
+"""
+This module contains an optional in-process index of the public events, so that `/events/search` on city,
+category, dates, online and free finds the IDs of a page without a database query, and then reads only the documents
+of that page.
+
+The index keeps one NumPy column per filtered field (start time, minimum price, online, free, and the folded city and
+category encoded as integer codes of a dictionary), all sorted by start time then ID like the search results. A date
+range is found by bisecting the start column, and the other filters are evaluated on the rows of that range as
+vectorized masks, a chunk at a time until the page is full.
+
+Every worker loads the index on startup, building the columns off the event loop, and keeps it up to date by following
+the change stream of the events collection, so the writes of every worker (events created or deleted, ticket summaries
+changed) reach it within milliseconds. Changes of the available quantity alone are filtered out by the server. The
+changes are buffered and merged into the columns EVENT_INDEX_BATCH at a time, or before the next search.
+
+By default the index covers every public event and answers the searches without dates as well, from 1970 to 3000 like
+EventDriver.build_search_query. With EVENT_INDEX_PAST_DAYS set, it only covers the events starting at most that many
+days before it was loaded, and searches starting before that horizon (including the searches without a start date) fall
+back to MongoDB. Title searches, and searches made while it loads, fall back to MongoDB as well, with the same results
+and cursors.
+
+Classes:
+    - Dictionary: The integer codes of the folded names of a column, and their prefix lookup.
+    - EventIndex: The columns, their maintenance and the search.
+
+Configuration:
+    EVENT_INDEX (1 to enable, default 0, requires numpy), EVENT_INDEX_PAST_DAYS (default unset, every event),
+    EVENT_INDEX_BATCH (changes merged at once, default 1000) and EVENT_INDEX_RETRY (seconds before following the change
+    stream again after an error, default 5) environment variables. The change stream needs MongoDB to run as a replica
+    set.
+"""
+
+EVENT_INDEX = os.environ.get("EVENT_INDEX", "0") == "1"
+EVENT_INDEX_PAST_DAYS = float(os.environ["EVENT_INDEX_PAST_DAYS"]) if "EVENT_INDEX_PAST_DAYS" in os.environ else None
+EVENT_INDEX_RETRY = float(os.environ.get("EVENT_INDEX_RETRY", 5))
+EVENT_INDEX_BATCH = int(os.environ.get("EVENT_INDEX_BATCH", 1000))
+
+EPOCH = datetime(1970, 1, 1)
+MISSING = -1
+NO_HORIZON = -2 ** 63
+
+# the fields of an event the index reads, and the updates it does not care about
+PROJECTION = {
+    "state.is_public": 1,
+    "date_and_time.start_date_time": 1,
+    "location.is_online": 1,
+    "ticket_summary.is_free": 1,
+    "ticket_summary.min_price": 1,
+    "normalized": 1,
+}
+IGNORED_UPDATES = ["ticket_summary.available_quantity"]
+CHANGES = [{"$match": {"$or": [
+    {"operationType": {"$in": ["insert", "replace", "delete"]}},
+    {"operationType": "update", "updateDescription.removedFields.0": {"$exists": True}},
+    {"operationType": "update", "$expr": {"$gt": [{"$size": {"$setDifference": [
+        {"$map": {"input": {"$objectToArray": "$updateDescription.updatedFields"}, "in": "$$this.k"}},
+        IGNORED_UPDATES,
+    ]}}, 0]}},
+]}}]
+
+# rows filtered at once when searching: small enough to stop early on unselective filters, doubled on selective ones
+FIRST_CHUNK = 4096
+
+logger = logging.getLogger(__name__)
+
+
+def to_ms(moment: datetime) -> int:
+    if moment.tzinfo is not None:
+        # like the driver, which stores aware datetimes in UTC
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return (moment - EPOCH) // timedelta(milliseconds=1)
+
+
+def from_ms(ms: int) -> datetime:
+    return EPOCH + timedelta(milliseconds=int(ms))
+
+
+class Dictionary:
+    """
+    The integer codes of the folded names of a column, with the names kept sorted to find the codes of every name
+    starting with a prefix by bisection.
+    """
+
+    def __init__(self):
+        self.codes: dict[str, int] = {}
+        self.sorted_names: list[str] = []
+        self.sorted_codes: list[int] = []
+
+    def code(self, name: Optional[str]) -> int:
+        if name is None:
+            return MISSING
+        code = self.codes.get(name)
+        if code is None:
+            code = self.codes[name] = len(self.codes)
+            position = bisect_left(self.sorted_names, name)
+            self.sorted_names.insert(position, name)
+            self.sorted_codes.insert(position, code)
+        return code
+
+    def prefix_codes(self, prefix: str) -> "np.ndarray":
+        start = bisect_left(self.sorted_names, prefix)
+        end = bisect_left(self.sorted_names, prefix + chr(sys.maxunicode))
+        return np.array(self.sorted_codes[start:end], dtype=np.int32)
+
+
+class EventIndex:
+    """
+    The in-process columnar index of the public events.
+
+    Attributes:
+        enabled (bool): Whether the index is loaded and followed, EVENT_INDEX by default.
+        ready (bool): Whether the index is loaded and can answer searches.
+        horizon (int): The earliest start time covered, in milliseconds since the epoch.
+        columns (dict[str, np.ndarray]): The columns, all sorted by start time then ID.
+        pending (dict[bytes, tuple | None]): The changes not merged yet, the new row of each changed event ID or None.
+    """
+    collection_name = "events"
+    dtypes = {
+        "start": "int64",
+        "oid": "S12",
+        "min_price": "int64",
+        "online": "int8",
+        "free": "int8",
+        "city": "int32",
+        "category": "int32",
+    }
+
+    def __init__(self, enabled: bool = EVENT_INDEX, past_days: Optional[float] = EVENT_INDEX_PAST_DAYS):
+        if enabled and np is None:
+            raise RuntimeError("EVENT_INDEX=1 requires numpy (pip install numpy)")
+        self.enabled = enabled
+        self.past_days = past_days
+        self.ready = False
+        self.horizon = 0
+        self.cities = Dictionary()
+        self.categories = Dictionary()
+        self.columns = {}
+        self.pending: dict[bytes, Optional[tuple]] = {}
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.enabled and self.task is None:
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        self.ready = False
+
+    async def run(self):
+        collection = AsyncClient.get_instance().get_db()[self.collection_name]
+        while True:
+            try:
+                # the stream is opened before loading, so that no write made during the load is missed
+                async with collection.watch(CHANGES, full_document="updateLookup") as stream:
+                    await self.load(collection)
+                    async for change in stream:
+                        self.apply(change)
+            except mongo_errors.PyMongoError as e:
+                self.ready = False
+                logger.error("event index stopped following the events: %r", e)
+            await asyncio.sleep(EVENT_INDEX_RETRY)
+
+    async def load(self, collection):
+        query = {"state.is_public": True}
+        horizon = None
+        if self.past_days is not None:
+            horizon = datetime.utcnow() - timedelta(days=self.past_days)
+            query["date_and_time.start_date_time"] = {"$gte": horizon}
+        documents = await collection.find(query, PROJECTION).to_list(length=None)
+        # building the columns of a million events takes seconds, the requests are served meanwhile
+        loaded = EventIndex(enabled=False, past_days=self.past_days)
+        await asyncio.to_thread(loaded.build, documents, horizon)
+        self.replace(loaded)
+        logger.info("event index loaded %d events", len(self))
+
+    def replace(self, loaded: "EventIndex"):
+        self.columns, self.cities, self.categories = loaded.columns, loaded.cities, loaded.categories
+        self.horizon = loaded.horizon
+        self.pending = {}
+        self.ready = True
+
+    def build(self, events: Iterable[dict], horizon: Optional[datetime] = None):
+        """
+        Replaces the content of the index with the given event documents, and marks it ready.
+
+        Args:
+            events (Iterable[dict]): The event documents.
+            horizon (datetime | None): The earliest start time covered, None to cover every public event.
+        """
+        self.horizon = to_ms(horizon) if horizon is not None else NO_HORIZON
+        self.pending = {}
+        self.cities = Dictionary()
+        self.categories = Dictionary()
+        rows = [row for row in map(self.row, events) if row is not None]
+        columns = {
+            name: np.array([row[i] for row in rows], dtype=dtype) for i, (name, dtype) in enumerate(self.dtypes.items())
+        }
+        order = np.lexsort((columns["oid"], columns["start"]))
+        self.columns = {name: column[order] for name, column in columns.items()}
+        self.ready = True
+
+    def row(self, event: dict) -> Optional[tuple]:
+        """
+        Returns the values of the columns for an event document, or None if the index does not cover the event.
+        """
+        start = (event.get("date_and_time") or {}).get("start_date_time")
+        if not (event.get("state") or {}).get("is_public") or not isinstance(start, datetime):
+            return None
+        if to_ms(start) < self.horizon:
+            return None
+        summary = event.get("ticket_summary")
+        online = (event.get("location") or {}).get("is_online")
+        normalized = event.get("normalized") or {}
+        return (
+            to_ms(start),
+            event["_id"].binary,
+            summary["min_price"] if summary and summary.get("min_price") is not None else MISSING,
+            int(online) if online is not None else MISSING,
+            int(summary["is_free"]) if summary and summary.get("is_free") is not None else MISSING,
+            self.cities.code(normalized.get("city")),
+            self.categories.code(normalized.get("category")),
+        )
+
+    def apply(self, change: dict):
+        """
+        Records a change of the events collection: the event is replaced by what it is now, or removed.
+        """
+        if change["operationType"] != "delete" and change.get("fullDocument") is not None:
+            self.add(change["fullDocument"])
+        else:
+            self.remove(change["documentKey"]["_id"])
+        if len(self.pending) >= EVENT_INDEX_BATCH:
+            self.flush()
+
+    def add(self, event: dict):
+        """
+        Records that an event was created or changed. An event the index does not cover (anymore) is removed.
+        """
+        self.pending[event["_id"].binary] = self.row(event)
+
+    def remove(self, event_id: ObjectId):
+        """
+        Records that an event was deleted.
+        """
+        self.pending[event_id.binary] = None
+
+    def flush(self):
+        """
+        Merges the recorded changes into the columns: the changed and deleted rows are dropped, and the new rows are
+        inserted at their place, with one copy of each column for the whole batch.
+        """
+        if not self.pending:
+            return
+        changes, self.pending = self.pending, {}
+        changed = np.array(list(changes), dtype=self.dtypes["oid"])
+        kept = ~np.isin(self.columns["oid"], changed)
+        columns = {name: column[kept] for name, column in self.columns.items()}
+
+        rows = sorted(row for row in changes.values() if row is not None)
+        if rows:
+            start, oid = columns["start"], columns["oid"]
+            positions = []
+            for row in rows:
+                first = np.searchsorted(start, row[0], "left")
+                last = np.searchsorted(start, row[0], "right")
+                positions.append(first + np.searchsorted(oid[first:last], row[1]))
+            for i, (name, dtype) in enumerate(self.dtypes.items()):
+                columns[name] = np.insert(columns[name], positions, np.array([row[i] for row in rows], dtype=dtype))
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns.get("start", ()))
+
+    def memory(self) -> int:
+        """
+        Returns the approximate number of bytes used by the columns and the dictionaries.
+        """
+        names = sum(
+            sys.getsizeof(name) + 2 * sys.getsizeof(0)
+            for dictionary in (self.cities, self.categories) for name in dictionary.codes
+        )
+        return sum(column.nbytes for column in self.columns.values()) + 3 * names
+
+    def search(
+            self,
+            city: str,
+            online: Optional[bool],
+            free: Optional[bool],
+            start_date: Optional[datetime],
+            end_date: Optional[datetime],
+            category: Optional[str],
+            after: Optional[list],
+            size: int,
+    ) -> Optional[tuple[list[ObjectId], Optional[list]]]:
+        """
+        Finds a page of the events matching a search, with the same filters and order as EventDriver.search_events.
+
+        Args:
+            city (str): The beginning of the city, empty for any city.
+            online (bool | None): Whether the events are online.
+            free (bool | None): Whether the events are free.
+            start_date (datetime | None): Earliest start of the events.
+            end_date (datetime | None): Latest start of the events.
+            category (str | None): The beginning of the category.
+            after (list | None): The start time and ID of the last event of the previous page.
+            size (int): The size of the page.
+
+        Returns:
+            tuple[list[ObjectId], list | None] | None: The IDs of the events of the page and the start time and ID of
+                its last event if there is a next page, or None if the index cannot answer the search.
+        """
+        # the same bounds as EventDriver.build_search_query when no date is given
+        start_date = start_date if start_date is not None else datetime(1970, 1, 1)
+        end_date = end_date if end_date is not None else datetime(3000, 1, 1)
+        if not self.ready or not isinstance(start_date, datetime) or not isinstance(end_date, datetime):
+            return None
+        if to_ms(start_date) < self.horizon:
+            return None
+        if after is not None and not (isinstance(after[0], datetime) and isinstance(after[1], ObjectId)):
+            return None
+
+        codes = {}
+        for name, dictionary, prefix in (("city", self.cities, city), ("category", self.categories, category)):
+            key = fold(prefix) if prefix is not None else None
+            if key:
+                codes[name] = dictionary.prefix_codes(key)
+                if not codes[name].size:
+                    return [], None
+
+        self.flush()
+        start = self.columns["start"]
+        first = np.searchsorted(start, to_ms(start_date), "left")
+        last = np.searchsorted(start, to_ms(end_date), "right")
+        if after is not None:
+            after_start, after_id = to_ms(after[0]), after[1].binary
+            ties = np.searchsorted(start, after_start, "left")
+            ties_end = np.searchsorted(start, after_start, "right")
+            first = max(first, ties + np.searchsorted(self.columns["oid"][ties:ties_end], after_id, "right"))
+
+        rows = []
+        chunk = FIRST_CHUNK
+        while first < last and len(rows) <= size:
+            end = min(last, first + chunk)
+            mask = np.ones(end - first, dtype=bool)
+            if online is not None:
+                mask &= self.columns["online"][first:end] == int(online)
+            if free is not None:
+                mask &= self.columns["free"][first:end] == int(free)
+            for name, column_codes in codes.items():
+                mask &= np.isin(self.columns[name][first:end], column_codes)
+            rows.extend((first + np.flatnonzero(mask))[:size + 1 - len(rows)].tolist())
+            first = end
+            chunk *= 2
+
+        ids = [ObjectId(self.columns["oid"][row].ljust(12, b"\0")) for row in rows[:size]]
+        if len(rows) <= size:
+            return ids, None
+        return ids, [from_ms(self.columns["start"][rows[size - 1]]), ids[-1]]
+
+
+event_index = EventIndex()
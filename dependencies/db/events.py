@@ -1,16 +1,91 @@
 import datetime
+import os
 import re
 from typing import Optional
 
+from bson import json_util
 from fastapi import status
 from fastapi import HTTPException
 
+from pymongo import ASCENDING
+from pymongo import IndexModel
 from pymongo import errors as mongo_errors
 
-from dependencies.db.client import Client
+from dependencies.db.client import AsyncClient
+from dependencies.db.event_index import event_index
 import dependencies.models.events as models
 from dependencies.db.tickets import TicketDriver
+from dependencies.db.tickets import EMPTY_SUMMARY
 from dependencies.utils.bson import convert_to_object_id
+from dependencies.utils.bson import document_exists
+from dependencies.utils.bson import find_one_or_404
+from dependencies.utils.cache import TTLCache
+from dependencies.utils.pagination import KeysetPage, KeysetParams, find_page
+from dependencies.utils.text import fold, prefix_filter, search_terms
+
+
+# events are listed by start date, _id breaks the ties so that pages never overlap
+EVENTS_SORT = [("date_and_time.start_date_time", ASCENDING), ("_id", ASCENDING)]
+
+# the facet counts of a search are computed in one aggregation and cached per normalized search for FACET_CACHE_TTL
+# seconds (default 30), for at most FACET_CACHE_SIZE searches (1000). The FACET_LIMIT (20) most frequent categories
+# and cities are counted, and the minimum ticket prices are counted in bands starting at FACET_PRICE_BANDS.
+FACET_CACHE_TTL = float(os.environ.get("FACET_CACHE_TTL", 30))
+FACET_CACHE_SIZE = int(os.environ.get("FACET_CACHE_SIZE", 1000))
+FACET_LIMIT = int(os.environ.get("FACET_LIMIT", 20))
+FACET_PRICE_BANDS = [int(price) for price in os.environ.get("FACET_PRICE_BANDS", "0,1,25,50,100,250").split(",")]
+
+facet_counts = TTLCache(max_size=FACET_CACHE_SIZE, ttl=FACET_CACHE_TTL)
+
+
+def value_counts(folded_field: str, display_field: str) -> list[dict]:
+    return [
+        {"$match": {folded_field: {"$type": "string"}}},
+        {"$group": {"_id": f"${folded_field}", "value": {"$first": f"${display_field}"}, "count": {"$sum": 1}}},
+        {"$sort": {"count": -1, "_id": 1}},
+        {"$limit": FACET_LIMIT},
+    ]
+
+
+FACETS = {
+    "total": [{"$count": "count"}],
+    "categories": value_counts("normalized.category", "basic_info.category"),
+    "cities": value_counts("normalized.city", "location.city"),
+    "online": [{"$group": {"_id": "$location.is_online", "count": {"$sum": 1}}}],
+    "free": [{"$group": {"_id": "$ticket_summary.is_free", "count": {"$sum": 1}}}],
+    "price_bands": [
+        {"$match": {"ticket_summary.min_price": {"$type": "number"}}},
+        {"$bucket": {
+            "groupBy": "$ticket_summary.min_price",
+            "boundaries": FACET_PRICE_BANDS,
+            # prices from the last boundary up fall in the default bucket, named after that boundary
+            "default": FACET_PRICE_BANDS[-1],
+            "output": {"count": {"$sum": 1}},
+        }},
+    ],
+}
+
+
+def to_facets(result: dict) -> models.EventFacets:
+    """
+    Converts the result of the FACETS stage into the facet counts of a search.
+    """
+    online = {group["_id"]: group["count"] for group in result["online"]}
+    free = {group["_id"]: group["count"] for group in result["free"]}
+    bands = dict(zip(FACET_PRICE_BANDS, FACET_PRICE_BANDS[1:]))
+    return models.EventFacets(
+        total=result["total"][0]["count"] if result["total"] else 0,
+        categories=result["categories"],
+        cities=result["cities"],
+        online=online.get(True, 0),
+        offline=online.get(False, 0),
+        free=free.get(True, 0),
+        paid=free.get(False, 0),
+        price_bands=[
+            {"min_price": band["_id"], "max_price": bands.get(band["_id"]), "count": band["count"]}
+            for band in sorted(result["price_bands"], key=lambda band: band["_id"])
+        ],
+    )
 
 
 class EventDriver:
@@ -18,15 +93,43 @@ class EventDriver:
     This class provides methods for interacting with the events collection in MongoDB.
     """
 
+    collection_name = "events"
+    indexes = [
+        IndexModel(
+            [("creator_id", ASCENDING), ("date_and_time.start_date_time", ASCENDING), ("_id", ASCENDING)],
+            name="creator_id_start_date_time__id",
+        ),
+        IndexModel(
+            [("date_and_time.start_date_time", ASCENDING), ("_id", ASCENDING)],
+            name="public_start_date_time__id",
+            partialFilterExpression={"state.is_public": True},
+        ),
+        IndexModel(
+            [("normalized.city", ASCENDING), ("date_and_time.start_date_time", ASCENDING), ("_id", ASCENDING)],
+            name="public_normalized_city_start_date_time__id",
+            partialFilterExpression={"state.is_public": True},
+        ),
+        IndexModel(
+            [("normalized.category", ASCENDING), ("date_and_time.start_date_time", ASCENDING), ("_id", ASCENDING)],
+            name="public_normalized_category_start_date_time__id",
+            partialFilterExpression={"state.is_public": True},
+        ),
+        IndexModel(
+            [("ticket_summary.is_free", ASCENDING), ("date_and_time.start_date_time", ASCENDING), ("_id", ASCENDING)],
+            name="public_is_free_start_date_time__id",
+            partialFilterExpression={"state.is_public": True},
+        ),
+    ]
+
     def __init__(self):
         """
         Initializes the EventDriver instance.
         """
-        self.db = Client.get_instance().get_db()
-        self.collection = self.db["events"]
+        self.db = AsyncClient.get_instance().get_db()
+        self.collection = self.db[self.collection_name]
         self.tickets_driver = TicketDriver()
 
-    def handle_nonexistent_event(self, event_id: str):
+    async def handle_nonexistent_event(self, event_id: str):
         """
         Handles the case where an event with the given ID does not exist in the database.
 
@@ -36,10 +139,10 @@ class EventDriver:
         Raises:
             - HTTPException: If the event does not exist, raises a 404 error with the message "event not found".
         """
-        if not self.event_exists(event_id):
+        if not await self.event_exists(event_id):
             raise HTTPException(detail="event not found", status_code=status.HTTP_404_NOT_FOUND)
 
-    def event_exists(self, event_id: str) -> bool:
+    async def event_exists(self, event_id: str) -> bool:
         """
         Checks whether an event with the given ID exists in the database.
 
@@ -49,10 +152,9 @@ class EventDriver:
         Returns:
             - bool: True if an event with the given ID exists in the database, False otherwise.
         """
-        event_id = convert_to_object_id(event_id)
-        return self.collection.find_one({"_id": event_id}) is not None
+        return await document_exists(self.collection, {"_id": convert_to_object_id(event_id)})
 
-    def create_new_event(self, event: models.EventDB):
+    async def create_new_event(self, event: models.EventDB):
         """
         Inserts a new event into the database.
 
@@ -66,11 +168,58 @@ class EventDriver:
             - HTTPException: If there is an error inserting the event into the database, raises a 500 error with the message "database error".
         """
         try:
-            return str(self.collection.insert_one(event.dict()).inserted_id)
+            event = event.dict()
+            event = {**event, "ticket_summary": EMPTY_SUMMARY, "normalized": self.normalized_fields(event)}
+            return str((await self.collection.insert_one(event)).inserted_id)
         except mongo_errors.PyMongoError:
             raise HTTPException(detail="database error", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    def get_event_by_id(self, event_id: str) -> models.EventOut:
+    @staticmethod
+    def normalized_fields(event: dict) -> dict:
+        """
+        Builds the `normalized` sub-document of an event: its city and category folded (see utils.text.fold), so that
+        searches filter them with index range scans whatever their case and accents.
+
+        Parameters:
+            - event (dict): The event document.
+
+        Returns:
+            - dict: The folded `city` and `category` of the event.
+        """
+        return {
+            "city": fold((event.get("location") or {}).get("city")),
+            "category": fold((event.get("basic_info") or {}).get("category")),
+        }
+
+    async def to_events_out(self, events: list[dict]) -> list[models.EventOut]:
+        """
+        Builds the output models of a page of event documents, taking the price and free flag of each event from its
+        `ticket_summary` sub-document.
+
+        Events stored before the summary existed are summarized with a single aggregation over the tickets
+        collection for the whole page.
+
+        Parameters:
+            - events (list[dict]): The event documents, as returned by the events collection.
+
+        Returns:
+            - list[models.EventOut]: The events in the same order, with their price and free flag.
+        """
+        missing = [str(event["_id"]) for event in events if "ticket_summary" not in event]
+        summaries = await self.tickets_driver.get_ticket_summaries(missing)
+        events_out = []
+        for event in events:
+            summary = models.TicketSummary(**event.pop("ticket_summary", None) or summaries[str(event["_id"])])
+            events_out.append(models.EventOut(
+                price=summary.min_price if summary.min_price is not None else -1,
+                is_free=summary.is_free,
+                ticket_summary=summary,
+                id=str(event["_id"]),
+                **event
+            ))
+        return events_out
+
+    async def get_event_by_id(self, event_id: str) -> models.EventOut:
         """
         Retrieves an event from the database by its ID.
 
@@ -83,19 +232,50 @@ class EventDriver:
         Raises:
             - HTTPException: If there is an error retrieving the event from the database, raises a 500 error with the message "database error".
         """
-        self.handle_nonexistent_event(event_id)
         try:
-            event = self.collection.find_one({"_id": convert_to_object_id(event_id)})
-            return models.EventOut(
-                price=self.tickets_driver.get_minimum_price(event_id),
-                is_free=self.tickets_driver.is_free_event(event_id),
-                id=str(event["_id"]),
-                **event
-            )
+            event = await find_one_or_404(self.collection, event_id, "event not found")
+            return (await self.to_events_out([event]))[0]
         except mongo_errors.PyMongoError:
             raise HTTPException(detail="database error", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    def delete_event_by_id(self, event_id: str):
+    async def get_events_by_ids(self, event_ids: list[str]) -> list[models.EventOut]:
+        """
+        Retrieves many events from the database with a single query.
+
+        Parameters:
+            - event_ids (list[str]): The IDs of the events to retrieve.
+
+        Returns:
+            - list[models.EventOut]: The events in the order of `event_ids`. IDs of events that do not exist are skipped.
+
+        Raises:
+            - HTTPException: If there is an error retrieving the events from the database, raises a 500 error with the message "database error".
+        """
+        events_out = await self.get_events_map(event_ids)
+        return [events_out[event_id] for event_id in event_ids if event_id in events_out]
+
+    async def get_events_map(self, event_ids: list[str]) -> dict[str, models.EventOut]:
+        """
+        Retrieves many events from the database with a single query, keyed by ID.
+
+        Parameters:
+            - event_ids (list[str]): The IDs of the events to retrieve.
+
+        Returns:
+            - dict[str, models.EventOut]: The retrieved events keyed by ID. IDs of events that do not exist are left out.
+
+        Raises:
+            - HTTPException: If there is an error retrieving the events from the database, raises a 500 error with the message "database error".
+        """
+        try:
+            events = await self.collection.find(
+                {"_id": {"$in": [convert_to_object_id(event_id) for event_id in event_ids]}}
+            ).to_list(length=None)
+            return {event.id: event for event in await self.to_events_out(events)}
+        except mongo_errors.PyMongoError:
+            raise HTTPException(detail="database error", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    async def delete_event_by_id(self, event_id: str):
         """
         Deletes the event with the given event ID.
 
@@ -105,13 +285,13 @@ class EventDriver:
         Raises:
             HTTPException: If there is an error with the database.
         """
-        self.handle_nonexistent_event(event_id)
+        await self.handle_nonexistent_event(event_id)
         try:
-            self.collection.delete_one({"_id": convert_to_object_id(event_id)})
+            await self.collection.delete_one({"_id": convert_to_object_id(event_id)})
         except mongo_errors.PyMongoError:
             raise HTTPException(detail="database error", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    def search_events(
+    def build_search_query(
             self,
             city: str,
             online: Optional[bool] = None,
@@ -120,10 +300,90 @@ class EventDriver:
             start_date: Optional[str] = None,
             end_date: Optional[str] = None,
             category: Optional[str] = None,
-    ) -> list[models.EventOut]:
+    ) -> dict:
+        """
+        Builds the MongoDB filter of an event search. Every criterion, including `free`, is evaluated by the server.
+
+        The city and the category match the events whose folded city or category starts with the folded search, so
+        "cairo", "Cairo" and "CAIRO" read the same range of an index. Events stored before the `normalized` fields
+        existed only match once they are backfilled.
+
+        The title matches the events whose title contains it, ignoring case. When it has words of at least
+        SEARCH_MIN_TERM_LENGTH characters, the text index of the events first narrows the search down to the events
+        sharing one of them (in any of their indexed fields, stemmed), and only those are matched against the title:
+        a title made only of the stop words of SEARCH_LANGUAGE ("the") or of parts of words ("conc") then finds
+        nothing. A title without such words is matched against every public event.
+
+        Args:
+            city (str): Name of the city where the event is taking place, or its beginning. Empty for any city.
+            online (bool, optional): Whether the event is online or not. Defaults to None.
+            free (bool, optional): Whether the event is free or not, read from the event ticket summary. Events
+                stored before the summary existed only match once it is rebuilt. Defaults to None.
+            title (str, optional): Part of the title of the event. Defaults to None.
+            start_date (str, optional): Start date of the event (format: YYYY-MM-DD). Defaults to None.
+            end_date (str, optional): End date of the event (format: YYYY-MM-DD). Defaults to None.
+            category (str, optional): Category of the event, or its beginning. Defaults to None.
+
+        Returns:
+            dict: The filter to pass to the events collection.
+        """
+
+        query = {"state.is_public": True}
+        city_filter = prefix_filter(city)
+        if city_filter is not None:
+            query["normalized.city"] = city_filter
+
+        if online is not None:
+            query["location.is_online"] = online
+
+        if free is not None:
+            query["ticket_summary.is_free"] = free
+
+        if title is not None:
+            terms = search_terms(title)
+            if terms:
+                query["$text"] = {"$search": " ".join(terms)}
+            title_pattern = re.compile(".*{}.*".format(re.escape(title)), re.IGNORECASE)
+            query["basic_info.title"] = {"$regex": title_pattern}
+
+        if start_date is not None:
+            inner_start_date = start_date
+        else:
+            inner_start_date = datetime.datetime(1970, 1, 1, 0, 0, 0, 0)
+
+        if end_date is not None:
+            inner_end_date = end_date
+        else:
+            inner_end_date = datetime.datetime(3000, 1, 1, 0, 0, 0, 0)
+
+        query["date_and_time.start_date_time"] = {"$gte": inner_start_date, "$lte": inner_end_date}
+
+        if category is not None:
+            category_filter = prefix_filter(category)
+            if category_filter is not None:
+                query["normalized.category"] = category_filter
+
+        return query
+
+    async def search_events(
+            self,
+            city: str,
+            online: Optional[bool] = None,
+            free: Optional[bool] = None,
+            title: Optional[str] = None,
+            start_date: Optional[str] = None,
+            end_date: Optional[str] = None,
+            category: Optional[str] = None,
+            params: Optional[KeysetParams] = None,
+            facets: bool = False,
+    ) -> models.EventSearchPage:
         """
         Searches for events in the database that match the specified criteria.
 
+        Only the requested page of matching events is read, ordered by start date. When the in-process event index is
+        enabled and covers the search, it finds the IDs of the page and only those events are read. With `facets`, the
+        page also holds the counts of every matching event per category, city, online, free and price band.
+
         Args:
             city (str): Name of the city where the event is taking place.
             online (bool, optional): Whether the event is online or not. Defaults to None.
@@ -132,87 +392,79 @@ class EventDriver:
             start_date (str, optional): Start date of the event (format: YYYY-MM-DD). Defaults to None.
             end_date (str, optional): End date of the event (format: YYYY-MM-DD). Defaults to None.
             category (str, optional): Category of the event. Defaults to None.
+            params (KeysetParams, optional): The cursor and size of the requested page. Defaults to the first page.
+            facets (bool, optional): Whether to count the matching events per facet. Defaults to False.
 
         Returns:
-            list[models.EventOut]: A list of events that match the specified criteria.
+            models.EventSearchPage: A page of events that match the specified criteria, and their facet counts.
 
         Raises:
             HTTPException: If there is an error accessing the database.
         """
-
-        def get_pattern(str_in: str):
-            return re.compile(".*{}.*".format(re.escape(str_in)), re.IGNORECASE)
-
         try:
-            city_pattern = get_pattern(city)
-            query = {
-                "state.is_public": True,
-                "location.city": {"$regex": city_pattern},
-            }
-
-            if online is not None:
-                query["location.is_online"] = online
-
-            if title is not None:
-                title_pattern = get_pattern(title)
-                query["basic_info.title"] = {"$regex": title_pattern}
-
-            if start_date is not None:
-                inner_start_date = start_date
-            else:
-                inner_start_date = datetime.datetime(1970, 1, 1, 0, 0, 0, 0)
-
-            if end_date is not None:
-                inner_end_date = end_date
+            query = self.build_search_query(city, online, free, title, start_date, end_date, category)
+            params = params or KeysetParams()
+            hit = None
+            if title is None:
+                hit = event_index.search(
+                    city, online, free, start_date, end_date, category, params.sort_values(EVENTS_SORT), params.size
+                )
+            if hit is None:
+                events, next_cursor = await find_page(self.collection, query, EVENTS_SORT, params)
             else:
-                inner_end_date = datetime.datetime(3000, 1, 1, 0, 0, 0, 0)
+                ids, next_values = hit
+                found = {event["_id"]: event async for event in self.collection.find({"_id": {"$in": ids}})}
+                events = [found[event_id] for event_id in ids if event_id in found]
+                next_cursor = json_util.dumps(next_values) if next_values is not None else None
+            counts = None
+            if facets:
+                key = (fold(city) or None, online, free, title.casefold() if title is not None else None, start_date,
+                       end_date, fold(category) or None)
+                counts = await self.count_facets(query, key)
+            return models.EventSearchPage.create(
+                await self.to_events_out(events), params, next_=next_cursor, facets=counts
+            )
 
-            query["date_and_time.start_date_time"] = {"$gte": inner_start_date, "$lte": inner_end_date}
+        except mongo_errors.PyMongoError:
+            raise HTTPException(detail="database error", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-            if category is not None:
-                category_pattern = get_pattern(category)
-                query["basic_info.category"] = {"$regex": category_pattern}
+    async def count_facets(self, query: dict, key: tuple) -> models.EventFacets:
+        """
+        Counts the events matching a search per category, city, online, free and price band, in one aggregation
+        whose result is cached for FACET_CACHE_TTL seconds.
 
-            events_out = [
-                models.EventOut(
-                    price=self.tickets_driver.get_minimum_price(str(event["_id"])),
-                    is_free=self.tickets_driver.is_free_event(str(event["_id"])),
-                    id=str(event["_id"]),
-                    **event
-                )
-                for event in self.collection.find(query)
-            ]
+        Args:
+            query (dict): The filter of the search, from build_search_query.
+            key (tuple): The normalized search, so that searches matching the same events share their counts.
 
-            if free is not None:
-                events_out = [event for event in events_out if event.is_free == free]
-            return events_out
+        Returns:
+            models.EventFacets: The counts.
+        """
+        counts = facet_counts.get(key)
+        if counts is not None:
+            return counts
 
-        except mongo_errors.PyMongoError:
-            raise HTTPException(detail="database error", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        result = await self.collection.aggregate([{"$match": query}, {"$facet": FACETS}]).to_list(length=1)
+        counts = to_facets(result[0])
+        facet_counts.set(key, counts)
+        return counts
 
-    def get_events_by_creator_id(self, creator_id):
+    async def get_events_by_creator_id(self, creator_id, params: KeysetParams) -> KeysetPage[models.EventOut]:
         """
-        Get events created by a specific creator.
+        Get one page of the events created by a specific creator, ordered by start date.
 
         Args:
         - creator_id (str): ID of the creator.
+        - params (KeysetParams): The cursor and size of the requested page.
 
         Returns:
-        - list[models.EventOut]: A list of EventOut models representing the events created by the specified creator.
+        - KeysetPage[models.EventOut]: A page of EventOut models representing the events created by the specified creator.
 
         Raises:
         - HTTPException: If a PyMongoError occurs while accessing the database.
         """
         try:
-            events = self.collection.find({"creator_id": creator_id})
-            return [
-                models.EventOut(
-                    price=self.tickets_driver.get_minimum_price(str(event["_id"])),
-                    is_free=self.tickets_driver.is_free_event(str(event["_id"])),
-                    id=str(event["_id"]),
-                    **event
-                )
-                for event in events
-            ]
+            events, next_cursor = await find_page(self.collection, {"creator_id": creator_id}, EVENTS_SORT, params)
+            return KeysetPage.create(await self.to_events_out(events), params, next_=next_cursor)
         except mongo_errors.PyMongoError:
             raise HTTPException(detail="database error", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
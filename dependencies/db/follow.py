@@ -1,7 +1,15 @@
 from fastapi import HTTPException
 from fastapi import status
 
-from dependencies.db.client import Client
+from pymongo import ASCENDING
+from pymongo import IndexModel
+
+from dependencies.db.client import AsyncClient
+from dependencies.utils.pagination import KeysetPage, KeysetParams, find_page
+
+
+# followed users are listed in the order they were followed
+FOLLOWS_SORT = [("_id", ASCENDING)]
 
 
 class FollowsDriver:
@@ -17,16 +25,22 @@ class FollowsDriver:
     is_user_followed(follower_id: str, followed_id: str) -> bool
         Returns `True` if the user with the given `follower_id` follows the user with the given `followed_id`.
         Otherwise, returns `False`.
-    get_followed_users(follower_id: str) -> list[str]
-        Returns a list of IDs of users followed by the user with the given `follower_id`.
+    get_followed_users(follower_id: str, params: KeysetParams) -> KeysetPage[str]
+        Returns one page of the IDs of users followed by the user with the given `follower_id`.
     """
 
+    collection_name = "follow"
+    indexes = [
+        IndexModel([("follower_id", ASCENDING), ("followed_id", ASCENDING)], name="follower_id_followed_id", unique=True),
+        IndexModel([("follower_id", ASCENDING), ("_id", ASCENDING)], name="follower_id__id"),
+    ]
+
     def __init__(self):
         """Initializes the FollowsDriver object."""
-        self.db = Client().get_instance().get_db()
-        self.collection = self.db["follow"]
+        self.db = AsyncClient.get_instance().get_db()
+        self.collection = self.db[self.collection_name]
 
-    def follow_user(self, follower_id: str, followed_id: str):
+    async def follow_user(self, follower_id: str, followed_id: str):
         """
         Follows a user with the given `followed_id` by the user with the given `follower_id`.
 
@@ -49,11 +63,11 @@ class FollowsDriver:
                        "it might feel nice, but it's not really the same as a hug from someone else!",
                 status_code=status.HTTP_403_FORBIDDEN
             )
-        if self.is_user_followed(follower_id, followed_id):
+        if await self.is_user_followed(follower_id, followed_id):
             raise HTTPException(detail="user is already followed", status_code=status.HTTP_400_BAD_REQUEST)
-        self.collection.insert_one({"follower_id": follower_id, "followed_id": followed_id})
+        await self.collection.insert_one({"follower_id": follower_id, "followed_id": followed_id})
 
-    def unfollow_user(self, follower_id: str, followed_id: str):
+    async def unfollow_user(self, follower_id: str, followed_id: str):
         """
         Unfollows a user with the given `followed_id` by the user with the given `follower_id`.
 
@@ -69,11 +83,11 @@ class FollowsDriver:
         HTTPException
             If the `follower_id` is not following the `followed_id`, an appropriate exception is raised.
         """
-        if not self.is_user_followed(follower_id, followed_id):
+        if not await self.is_user_followed(follower_id, followed_id):
             raise HTTPException(detail="user is not followed", status_code=status.HTTP_400_BAD_REQUEST)
-        self.collection.delete_one({"follower_id": follower_id, "followed_id": followed_id})
+        await self.collection.delete_one({"follower_id": follower_id, "followed_id": followed_id})
 
-    def is_user_followed(self, follower_id: str, followed_id: str):
+    async def is_user_followed(self, follower_id: str, followed_id: str):
         """
         Checks if the follower is following the followed user.
 
@@ -84,16 +98,20 @@ class FollowsDriver:
         Returns:
             bool: True if the follower is following the followed user, False otherwise
         """
-        return self.collection.find_one({"follower_id": follower_id, "followed_id": followed_id}) is not None
+        return await self.collection.find_one({"follower_id": follower_id, "followed_id": followed_id}) is not None
 
-    def get_followed_users(self, follower_id: str) -> list[str]:
+    async def get_followed_users(self, follower_id: str, params: KeysetParams) -> KeysetPage[str]:
         """
-        Retrieves a list of user IDs that the follower is following.
+        Retrieves one page of the user IDs that the follower is following.
 
         Args:
             follower_id (str): The ID of the user that is following other users
+            params (KeysetParams): The cursor and size of the requested page
 
         Returns:
-            list[str]: A list of user IDs that the follower is following
+            KeysetPage[str]: A page of user IDs that the follower is following
         """
-        return [follow["followed_id"] for follow in self.collection.find({"follower_id": follower_id})]
+        follows, next_cursor = await find_page(
+            self.collection, {"follower_id": follower_id}, FOLLOWS_SORT, params, {"followed_id": 1}
+        )
+        return KeysetPage.create([follow["followed_id"] for follow in follows], params, next_=next_cursor)
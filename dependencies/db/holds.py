@@ -0,0 +1,228 @@
+import os
+import asyncio
+import logging
+from datetime import datetime
+from datetime import timedelta
+from typing import Optional
+
+from fastapi import HTTPException
+from fastapi import status
+from pymongo import ASCENDING
+from pymongo import IndexModel
+from pymongo import ReturnDocument
+from pymongo import errors as mongo_errors
+
+from dependencies.db.client import AsyncClient
+from dependencies.db.tickets import TicketDriver
+from dependencies.models.holds import HoldDB, HoldOut
+from dependencies.utils.bson import convert_to_object_id, find_one_or_404
+
+"""
+This module contains the ticket holds: tickets set aside for a buyer for a few minutes while they fill in the details
+of their order, so that they are neither sold to someone else meanwhile nor locked forever if the buyer leaves.
+
+A hold takes its tickets off the available quantity when it is created. It then ends in one of three ways, each
+giving the tickets to exactly one place: converted to an order by the checkout, released by the buyer (the tickets
+are given back), or expired (the reclaimer gives the tickets back). Ended holds are kept for HOLD_RETENTION seconds
+and then deleted by a TTL index.
+
+Classes:
+    - HoldDriver: Creates, reads, releases, converts and reclaims holds.
+    - HoldReclaimer: The background task giving back the tickets of expired holds.
+
+Configuration:
+    HOLD_TTL (seconds a hold lasts, default 600), HOLD_RETENTION (seconds ended holds are kept, 86400),
+    HOLD_RECLAIM_INTERVAL (seconds between two reclaims, 5) and HOLD_RECLAIM_BATCH (holds per reclaim batch, 500)
+    environment variables.
+"""
+
+HOLD_TTL = int(os.environ.get("HOLD_TTL", 600))
+HOLD_RETENTION = int(os.environ.get("HOLD_RETENTION", 86400))
+HOLD_RECLAIM_INTERVAL = float(os.environ.get("HOLD_RECLAIM_INTERVAL", 5))
+HOLD_RECLAIM_BATCH = int(os.environ.get("HOLD_RECLAIM_BATCH", 500))
+
+logger = logging.getLogger(__name__)
+
+
+class HoldDriver:
+    """
+    A class used to interact with the holds collection in the database.
+
+    Every change of a hold and of the ticket quantities it affects is made in one transaction, so a hold is never
+    counted twice nor lost, whatever the number of workers doing it concurrently.
+    """
+    collection_name = "holds"
+    indexes = [
+        IndexModel([("state", ASCENDING), ("expires_at", ASCENDING)], name="state_expires_at"),
+        IndexModel([("purge_at", ASCENDING)], name="purge_at_ttl", expireAfterSeconds=0),
+    ]
+
+    def __init__(self):
+        self.client = AsyncClient.get_instance().client
+        self.db = AsyncClient.get_instance().get_db()
+        self.collection = self.db[self.collection_name]
+        self.tickets = TicketDriver()
+
+    async def create_hold(self, ticket_id: str, quantity: int, user_id: str) -> HoldOut:
+        """
+        Holds tickets for a buyer for HOLD_TTL seconds.
+
+        Args:
+            ticket_id (str): The ID of the ticket to hold.
+            quantity (int): The number of tickets to hold.
+            user_id (str): The ID of the buyer.
+
+        Returns:
+            HoldOut: The created hold.
+
+        Raises:
+            HTTPException: If the ticket does not exist or has fewer than `quantity` tickets available.
+        """
+        async def write(session) -> HoldOut:
+            ticket = await self.tickets.reserve(ticket_id, quantity, session)
+            hold = HoldDB(
+                ticket_id=ticket_id,
+                event_id=ticket["event_id"],
+                user_id=user_id,
+                quantity=quantity,
+                expires_at=datetime.utcnow() + timedelta(seconds=HOLD_TTL),
+            )
+            inserted_id = (await self.collection.insert_one(hold.dict(), session=session)).inserted_id
+            return HoldOut(id=str(inserted_id), **hold.dict())
+
+        async with await self.client.start_session() as session:
+            return await session.with_transaction(write)
+
+    async def get_hold(self, hold_id: str, user_id: str) -> HoldOut:
+        """
+        Retrieves a hold of a buyer.
+
+        Raises:
+            HTTPException: If the hold does not exist or belongs to another buyer.
+        """
+        hold = await find_one_or_404(self.collection, hold_id, "hold not found")
+        if hold["user_id"] != user_id:
+            raise HTTPException(detail="hold not found", status_code=status.HTTP_404_NOT_FOUND)
+        return HoldOut(id=hold_id, **hold)
+
+    async def get_holds(self, hold_ids: list[str]) -> dict[str, HoldOut]:
+        """
+        Retrieves many holds with a single query, keyed by ID. IDs of holds that do not exist are left out.
+        """
+        return {
+            str(hold["_id"]): HoldOut(id=str(hold["_id"]), **hold)
+            async for hold in self.collection.find({"_id": {"$in": [convert_to_object_id(i) for i in hold_ids]}})
+        }
+
+    async def release_hold(self, hold_id: str, user_id: str) -> HoldOut:
+        """
+        Ends an active hold of a buyer and gives its tickets back.
+
+        Raises:
+            HTTPException: If the hold does not exist, belongs to another buyer (404) or already ended (400).
+        """
+        async def write(session) -> HoldOut:
+            hold = await self.end_hold(hold_id, user_id, "released", session)
+            await self.tickets.release_many([hold], session)
+            return HoldOut(id=hold_id, **hold)
+
+        async with await self.client.start_session() as session:
+            return await session.with_transaction(write)
+
+    async def convert_holds(self, hold_ids: list[str], user_id: str, session):
+        """
+        Ends active holds of a buyer because their tickets were ordered. Meant to be called by the checkout, in its
+        transaction: the tickets stay taken, by the order now.
+
+        Raises:
+            HTTPException: If a hold does not exist, belongs to another buyer (404), already ended or expired (400).
+                The checkout transaction is then aborted.
+        """
+        for hold_id in hold_ids:
+            await self.end_hold(hold_id, user_id, "converted", session)
+
+    async def end_hold(self, hold_id: str, user_id: str, state: str, session) -> dict:
+        now = datetime.utcnow()
+        hold = await self.collection.find_one_and_update(
+            {"_id": convert_to_object_id(hold_id), "user_id": user_id, "state": "active", "expires_at": {"$gt": now}},
+            {"$set": {"state": state, "purge_at": now + timedelta(seconds=HOLD_RETENTION)}},
+            return_document=ReturnDocument.AFTER,
+            session=session,
+        )
+        if hold is None:
+            # the update matched nothing, a second read tells a missing hold from an ended one
+            hold = await self.collection.find_one({"_id": convert_to_object_id(hold_id)}, session=session)
+            if hold is None or hold["user_id"] != user_id:
+                raise HTTPException(detail="hold not found", status_code=status.HTTP_404_NOT_FOUND)
+            if hold["state"] != "active":
+                raise HTTPException(detail=f"hold already {hold['state']}", status_code=status.HTTP_400_BAD_REQUEST)
+            raise HTTPException(detail="hold expired", status_code=status.HTTP_400_BAD_REQUEST)
+        return hold
+
+    async def reclaim_expired(self, batch_size: int = HOLD_RECLAIM_BATCH) -> int:
+        """
+        Ends a batch of expired holds and gives their tickets back: one read, one update and one bulk write per
+        collection, in a transaction.
+
+        Args:
+            batch_size (int, optional): The maximum number of holds reclaimed. Defaults to HOLD_RECLAIM_BATCH.
+
+        Returns:
+            int: The number of holds reclaimed, less than `batch_size` once every expired hold is reclaimed.
+        """
+        async def write(session) -> int:
+            now = datetime.utcnow()
+            holds = await self.collection.find(
+                {"state": "active", "expires_at": {"$lte": now}},
+                {"ticket_id": 1, "event_id": 1, "quantity": 1},
+                session=session,
+            ).limit(batch_size).to_list(length=batch_size)
+            if not holds:
+                return 0
+            await self.collection.update_many(
+                {"_id": {"$in": [hold["_id"] for hold in holds]}},
+                {"$set": {"state": "expired", "purge_at": now + timedelta(seconds=HOLD_RETENTION)}},
+                session=session,
+            )
+            await self.tickets.release_many(holds, session)
+            return len(holds)
+
+        async with await self.client.start_session() as session:
+            return await session.with_transaction(write)
+
+
+class HoldReclaimer:
+    """
+    Reclaims the expired holds every `interval` seconds, in batches of `batch_size` holds until none is left.
+
+    Every worker of the application runs one: the transactions of HoldDriver.reclaim_expired make them safe to run
+    concurrently.
+    """
+
+    def __init__(self, interval: float = HOLD_RECLAIM_INTERVAL, batch_size: int = HOLD_RECLAIM_BATCH):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def run(self):
+        driver = HoldDriver()
+        while True:
+            try:
+                while await driver.reclaim_expired(self.batch_size) == self.batch_size:
+                    pass
+            except (mongo_errors.PyMongoError, HTTPException) as e:
+                logger.error("failed to reclaim expired holds: %r", e)
+            await asyncio.sleep(self.interval)
+
+
+hold_reclaimer = HoldReclaimer()
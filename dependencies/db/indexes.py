@@ -0,0 +1,241 @@
+import sys
+import asyncio
+import logging
+from typing import Optional
+
+from pymongo import TEXT
+from pymongo import IndexModel
+from pymongo import errors as mongo_errors
+
+from dependencies.db.client import AsyncClient
+from dependencies.db.attendees import AttendeeDriver
+from dependencies.db.categories import CategoriesDriver
+from dependencies.db.events import EventDriver
+from dependencies.db.follow import FollowsDriver
+from dependencies.db.holds import HoldDriver
+from dependencies.db.likes import LikesDriver
+from dependencies.db.orders import OrderDriver
+from dependencies.db.promocodes import PromocodeDriver
+from dependencies.db.search import EventSearchDriver
+from dependencies.db.tickets import TicketDriver
+from dependencies.db.users import UsersDriver
+
+"""
+This module contains the index catalog of the database. Every driver declares the indexes its queries need in a
+`collection_name` / `indexes` pair of class attributes, and the IndexRegistry class collects them and reconciles them
+with the indexes that actually exist on the server.
+
+Classes:
+    - IndexDrift: The difference between the declared and the existing indexes of one collection.
+    - IndexRegistry: Collects the declared indexes and creates or verifies them.
+
+Usage:
+    The application reconciles the catalog on startup (see main.py). It can also be run from the command line:
+
+        python -m dependencies.db.indexes          # create missing indexes and report drift
+        python -m dependencies.db.indexes --check  # only report drift, exit with 1 if there is any
+"""
+
+logger = logging.getLogger(__name__)
+
+DRIVERS = [
+    AttendeeDriver,
+    CategoriesDriver,
+    EventDriver,
+    EventSearchDriver,
+    FollowsDriver,
+    HoldDriver,
+    LikesDriver,
+    OrderDriver,
+    PromocodeDriver,
+    TicketDriver,
+    UsersDriver,
+]
+
+# index options that change the behaviour of an index, anything else (like "v" or "ns") is ignored when comparing.
+COMPARED_OPTIONS = ["unique", "sparse", "partialFilterExpression", "expireAfterSeconds", "collation"]
+
+# the server stores the collation of an index with every option filled in (the ICU defaults below) and its version
+COLLATION_DEFAULTS = {
+    "caseLevel": False,
+    "caseFirst": "off",
+    "strength": 3,
+    "numericOrdering": False,
+    "alternate": "non-ignorable",
+    "maxVariable": "punct",
+    "normalization": False,
+    "backwards": False,
+}
+
+
+class IndexDrift:
+    """
+    The difference between the declared and the existing indexes of one collection.
+
+    Attributes:
+        collection (str): The name of the collection.
+        missing (list[str]): Declared indexes that do not exist on the server.
+        changed (list[str]): Indexes that exist with the declared name but a different key or options.
+        extra (list[str]): Indexes that exist on the server but are not declared by any driver.
+        failed (dict[str, str]): Declared indexes that could not be created, mapped to the server error.
+    """
+
+    def __init__(self, collection: str):
+        self.collection = collection
+        self.missing: list[str] = []
+        self.changed: list[str] = []
+        self.extra: list[str] = []
+        self.failed: dict[str, str] = {}
+
+    def has_drift(self) -> bool:
+        return bool(self.missing or self.changed or self.extra or self.failed)
+
+    def __str__(self):
+        parts = [
+            f"{label}: {', '.join(names)}"
+            for label, names in (
+                ("missing", self.missing),
+                ("changed", self.changed),
+                ("extra", self.extra),
+                ("failed", [f"{name} ({error})" for name, error in self.failed.items()]),
+            )
+            if names
+        ]
+        return f"{self.collection}: " + ("; ".join(parts) if parts else "in sync")
+
+
+class IndexRegistry:
+    """
+    Collects the indexes declared by the drivers and reconciles them with the database.
+
+    Attributes:
+        db (AsyncIOMotorDatabase): The MongoDB database instance.
+        catalog (dict[str, list[IndexModel]]): The declared indexes, keyed by collection name.
+    """
+
+    def __init__(self, drivers=None):
+        """
+        Initializes the registry with the indexes declared by the given driver classes.
+
+        Args:
+            drivers (list[type], optional): Driver classes exposing `collection_name` and `indexes`.
+                Defaults to every driver in `dependencies.db`.
+        """
+        self.db = AsyncClient.get_instance().get_db()
+        self.catalog: dict[str, list[IndexModel]] = {}
+        for driver in drivers if drivers is not None else DRIVERS:
+            self.register(driver.collection_name, driver.indexes)
+
+    def register(self, collection: str, indexes: list[IndexModel]):
+        """
+        Adds indexes to the catalog of a collection.
+
+        Args:
+            collection (str): The name of the collection.
+            indexes (list[IndexModel]): The indexes to declare. Every index must have an explicit name.
+        """
+        for index in indexes:
+            if "name" not in index.document:
+                raise ValueError(f"index on {collection} must be named: {index.document['key']}")
+        self.catalog.setdefault(collection, []).extend(indexes)
+
+    async def diff(self, collection: str) -> IndexDrift:
+        """
+        Compares the declared indexes of a collection with the ones that exist on the server.
+
+        Args:
+            collection (str): The name of the collection.
+
+        Returns:
+            IndexDrift: The differences found.
+        """
+        drift = IndexDrift(collection)
+        existing = await self.db[collection].index_information()
+        declared = {index.document["name"]: index.document for index in self.catalog.get(collection, [])}
+
+        for name, document in declared.items():
+            if name not in existing:
+                drift.missing.append(name)
+            elif not self._same_index(document, existing[name]):
+                drift.changed.append(name)
+
+        drift.extra = [name for name in existing if name != "_id_" and name not in declared]
+        return drift
+
+    async def reconcile(self, create: bool = True) -> list[IndexDrift]:
+        """
+        Verifies every collection in the catalog and, optionally, creates the missing indexes.
+
+        Changed and extra indexes are only reported: rebuilding or dropping an index on a large collection is left to
+        whoever reads the report.
+
+        Args:
+            create (bool): Whether to create the missing indexes. Defaults to True.
+
+        Returns:
+            list[IndexDrift]: The drift of every collection after reconciling.
+        """
+        report = []
+        for collection, indexes in self.catalog.items():
+            drift = await self.diff(collection)
+            if create and drift.missing:
+                for index in indexes:
+                    name = index.document["name"]
+                    if name not in drift.missing:
+                        continue
+                    try:
+                        await self.db[collection].create_indexes([index])
+                        drift.missing.remove(name)
+                    except mongo_errors.OperationFailure as e:
+                        drift.missing.remove(name)
+                        drift.failed[name] = e.details.get("errmsg", str(e)) if e.details else str(e)
+            report.append(drift)
+        return report
+
+    @staticmethod
+    def _same_index(declared: dict, existing: dict) -> bool:
+        declared_key = list(declared["key"].items())
+        existing_key = [tuple(key) for key in existing["key"]]
+        if TEXT in declared["key"].values():
+            # the server stores the text fields of an index as {"_fts": "text", "_ftsx": 1} and their weights
+            text_fields = [field for field, kind in declared_key if kind == TEXT]
+            weights = {field: declared.get("weights", {}).get(field, 1) for field in text_fields}
+            if weights != dict(existing.get("weights", {})):
+                return False
+            declared_key = [key for key in declared_key if key[1] != TEXT]
+            existing_key = [key for key in existing_key if key[0] not in ("_fts", "_ftsx")]
+        if declared_key != existing_key:
+            return False
+        declared = {**declared, "collation": IndexRegistry._server_collation(declared.get("collation"))}
+        existing = {**existing, "collation": IndexRegistry._server_collation(existing.get("collation"))}
+        return all(declared.get(option) == existing.get(option) for option in COMPARED_OPTIONS)
+
+    @staticmethod
+    def _server_collation(collation: Optional[dict]) -> Optional[dict]:
+        if not collation or collation.get("locale") == "simple":
+            return None
+        return {**COLLATION_DEFAULTS, **{option: value for option, value in collation.items() if option != "version"}}
+
+
+async def ensure_indexes():
+    """
+    Creates the missing indexes of every driver and logs any drift. Meant to run on application startup.
+    """
+    try:
+        for drift in await IndexRegistry().reconcile():
+            if drift.has_drift():
+                logger.warning("index drift in %s", drift)
+    except mongo_errors.PyMongoError as e:
+        logger.error("could not reconcile indexes: %s", e)
+
+
+async def main(argv: list[str]) -> int:
+    check_only = "--check" in argv
+    report = await IndexRegistry().reconcile(create=not check_only)
+    for drift in report:
+        print(drift)
+    return 1 if any(drift.has_drift() for drift in report) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(sys.argv[1:])))
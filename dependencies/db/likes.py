@@ -1,5 +1,12 @@
 from fastapi import HTTPException, status
-from dependencies.db.client import Client
+from pymongo import ASCENDING
+from pymongo import IndexModel
+from dependencies.db.client import AsyncClient
+from dependencies.utils.pagination import KeysetPage, KeysetParams, find_page
+
+
+# liked events are listed in the order they were liked
+LIKES_SORT = [("_id", ASCENDING)]
 
 
 class LikesDriver:
@@ -7,14 +14,21 @@ class LikesDriver:
     Driver for handling likes on events
     """
 
+    collection_name = "likes"
+    indexes = [
+        IndexModel([("user_id", ASCENDING), ("event_id", ASCENDING)], name="user_id_event_id", unique=True),
+        IndexModel([("user_id", ASCENDING), ("_id", ASCENDING)], name="user_id__id"),
+        IndexModel([("event_id", ASCENDING)], name="event_id"),
+    ]
+
     def __init__(self):
         """
         Initializes LikesDriver
         """
-        self.db = Client().get_instance().get_db()
-        self.collection = self.db["likes"]
+        self.db = AsyncClient.get_instance().get_db()
+        self.collection = self.db[self.collection_name]
 
-    def like_event(self, user_id: str, event_id: str):
+    async def like_event(self, user_id: str, event_id: str):
         """
         Adds a like to the event for the user with the given user_id.
 
@@ -24,12 +38,12 @@ class LikesDriver:
         :type event_id: str
         :raises HTTPException: If the event is already liked
         """
-        if self.is_event_liked(user_id, event_id):
+        if await self.is_event_liked(user_id, event_id):
             raise HTTPException(detail="event is already liked",
                                 status_code=status.HTTP_400_BAD_REQUEST)
-        self.collection.insert_one({"user_id": user_id, "event_id": event_id})
+        await self.collection.insert_one({"user_id": user_id, "event_id": event_id})
 
-    def unlike_event(self, user_id: str, event_id: str):
+    async def unlike_event(self, user_id: str, event_id: str):
         """
         Removes a like from the event for the user with the given user_id.
 
@@ -39,11 +53,11 @@ class LikesDriver:
         :type event_id: str
         :raises HTTPException: If the event is not liked
         """
-        if not self.is_event_liked(user_id, event_id):
+        if not await self.is_event_liked(user_id, event_id):
             raise HTTPException(detail="event is not liked", status_code=status.HTTP_400_BAD_REQUEST)
-        self.collection.delete_one({"user_id": user_id, "event_id": event_id})
+        await self.collection.delete_one({"user_id": user_id, "event_id": event_id})
 
-    def is_event_liked(self, user_id: str, event_id: str) -> bool:
+    async def is_event_liked(self, user_id: str, event_id: str) -> bool:
         """
         Returns True if the event with the given event_id is liked by the user with the given user_id.
 
@@ -54,25 +68,29 @@ class LikesDriver:
         :return: True if the event is liked by the user, False otherwise
         :rtype: bool
         """
-        return self.collection.find_one({"user_id": user_id, "event_id": event_id}) is not None
+        return await self.collection.find_one({"user_id": user_id, "event_id": event_id}) is not None
 
-    def get_liked_events(self, user_id: str) -> list[str]:
+    async def get_liked_events(self, user_id: str, params: KeysetParams) -> KeysetPage[str]:
         """
-        Returns a list of event IDs that are liked by the given user.
+        Returns one page of the event IDs that are liked by the given user.
 
         Args:
             user_id: A string representing the ID of the user whose liked events are to be retrieved.
+            params: The cursor and size of the requested page.
 
         Returns:
-            A list of strings representing the event IDs that are liked by the given user.
+            A page of strings representing the event IDs that are liked by the given user.
         """
-        return [like["event_id"] for like in self.collection.find({"user_id": user_id})]
+        likes, next_cursor = await find_page(
+            self.collection, {"user_id": user_id}, LIKES_SORT, params, {"event_id": 1}
+        )
+        return KeysetPage.create([like["event_id"] for like in likes], params, next_=next_cursor)
 
-    def delete_likes_by_event_id(self, event_id: str):
+    async def delete_likes_by_event_id(self, event_id: str):
         """
         Deletes all likes associated with the given event ID.
 
         Args:
             event_id: A string representing the ID of the event whose associated likes are to be deleted.
         """
-        self.collection.delete_many({"event_id": event_id})
+        await self.collection.delete_many({"event_id": event_id})
@@ -0,0 +1,55 @@
+from fastapi import Request
+
+from dependencies.db.events import EventDriver
+from dependencies.db.orders import OrderDriver
+from dependencies.db.tickets import TicketDriver
+from dependencies.db.users import UsersDriver
+from dependencies.models.events import EventOut
+from dependencies.models.orders import OrderOut
+from dependencies.models.tickets import TicketOut
+from dependencies.models.users import UserInfo
+from dependencies.utils.bson import convert_to_object_id
+from dependencies.utils.dataloader import DataLoader
+
+"""
+This module contains the request-scoped loaders of the documents most endpoints look up by ID.
+
+Classes:
+    - Loaders: One DataLoader per collection, batching the lookups of a request into one `$in` query per collection.
+
+Functions:
+    - get_loaders: FastAPI dependency returning the loaders of the current request.
+
+Usage:
+    @router.get("/...")
+    async def endpoint(loaders: Annotated[Loaders, Depends(get_loaders)]):
+        event = await loaders.events.load(event_id)
+"""
+
+
+class Loaders:
+    """
+    The loaders of one request. Ids that are not valid ObjectIds are rejected with a 400 by `load` itself, ids that
+    do not exist are loaded as None.
+
+    Attributes:
+        users (DataLoader[str, UserInfo]): Users by ID.
+        events (DataLoader[str, EventOut]): Events by ID.
+        tickets (DataLoader[str, TicketOut]): Tickets by ID.
+        orders (DataLoader[str, OrderOut]): Orders by ID, with their attendee counts.
+    """
+
+    def __init__(self):
+        self.users: DataLoader[str, UserInfo] = DataLoader(UsersDriver().get_users_by_ids, convert_to_object_id)
+        self.events: DataLoader[str, EventOut] = DataLoader(EventDriver().get_events_map, convert_to_object_id)
+        self.tickets: DataLoader[str, TicketOut] = DataLoader(TicketDriver().get_tickets_by_ids, convert_to_object_id)
+        self.orders: DataLoader[str, OrderOut] = DataLoader(OrderDriver().get_orders_by_ids, convert_to_object_id)
+
+
+def get_loaders(request: Request) -> Loaders:
+    """
+    Returns the loaders of the current request, creating them on first use.
+    """
+    if not hasattr(request.state, "loaders"):
+        request.state.loaders = Loaders()
+    return request.state.loaders
@@ -0,0 +1,119 @@
+import sys
+import asyncio
+
+from pymongo import UpdateOne
+
+from dependencies.db.attendees import AttendeeDriver
+from dependencies.db.client import AsyncClient
+from dependencies.db.events import EventDriver
+from dependencies.db.tickets import TicketDriver
+from dependencies.utils.text import fold
+
+"""
+This module contains maintenance commands that repair or backfill data derived from other collections.
+
+Commands:
+    - rebuild-ticket-summaries: Recomputes the `ticket_summary` sub-document of every event from its tickets.
+    - rebuild-order-ticket-counts: Recounts the `tickets_count` counter of every order from its attendees.
+    - backfill-normalized-fields: Stores the folded city and category of every event, and the folded name of every
+      category, that searches and lookups filter on.
+
+Usage:
+    python -m dependencies.db.maintenance <command>
+"""
+
+BATCH_SIZE = 500
+
+
+async def rebuild_ticket_summaries() -> int:
+    """
+    Recomputes the ticket summary of every event, in batches of BATCH_SIZE events.
+
+    Returns:
+        int: The number of events that were rebuilt.
+    """
+    db = AsyncClient.get_instance().get_db()
+    tickets_driver = TicketDriver()
+    rebuilt = 0
+    batch = []
+    async for event in db["events"].find({}, {"_id": 1}):
+        batch.append(str(event["_id"]))
+        if len(batch) == BATCH_SIZE:
+            await tickets_driver.refresh_event_summaries(batch)
+            rebuilt += len(batch)
+            batch = []
+    if batch:
+        await tickets_driver.refresh_event_summaries(batch)
+        rebuilt += len(batch)
+    return rebuilt
+
+
+async def rebuild_order_ticket_counts() -> int:
+    """
+    Recounts the attendees of every order, in batches of BATCH_SIZE orders.
+
+    Returns:
+        int: The number of orders that were rebuilt.
+    """
+    db = AsyncClient.get_instance().get_db()
+    attendee_driver = AttendeeDriver()
+    rebuilt = 0
+    batch = []
+    async for order in db["orders"].find({}, {"_id": 1}):
+        batch.append(str(order["_id"]))
+        if len(batch) == BATCH_SIZE:
+            await attendee_driver.refresh_tickets_counts(batch)
+            rebuilt += len(batch)
+            batch = []
+    if batch:
+        await attendee_driver.refresh_tickets_counts(batch)
+        rebuilt += len(batch)
+    return rebuilt
+
+
+async def backfill_normalized_fields() -> int:
+    """
+    Recomputes the folded fields of every event and category, with one bulk write per BATCH_SIZE documents.
+
+    Returns:
+        int: The number of documents that were updated.
+    """
+    db = AsyncClient.get_instance().get_db()
+    jobs = [
+        (
+            db["events"],
+            {"location.city": 1, "basic_info.category": 1},
+            lambda event: {"normalized": EventDriver.normalized_fields(event)},
+        ),
+        (db["categories"], {"name": 1}, lambda category: {"name_key": fold(category.get("name"))}),
+    ]
+    updated = 0
+    for collection, projection, fields in jobs:
+        batch = []
+        async for document in collection.find({}, projection):
+            batch.append(UpdateOne({"_id": document["_id"]}, {"$set": fields(document)}))
+            if len(batch) == BATCH_SIZE:
+                updated += (await collection.bulk_write(batch, ordered=False)).modified_count
+                batch = []
+        if batch:
+            updated += (await collection.bulk_write(batch, ordered=False)).modified_count
+    return updated
+
+
+COMMANDS = {
+    "rebuild-ticket-summaries": rebuild_ticket_summaries,
+    "rebuild-order-ticket-counts": rebuild_order_ticket_counts,
+    "backfill-normalized-fields": backfill_normalized_fields,
+}
+
+
+async def main(argv: list[str]) -> int:
+    if len(argv) != 1 or argv[0] not in COMMANDS:
+        print(f"usage: python -m dependencies.db.maintenance {{{','.join(COMMANDS)}}}")
+        return 2
+    print(f"{argv[0]}: {await COMMANDS[argv[0]]()} documents updated")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(sys.argv[1:])))
@@ -1,20 +1,35 @@
+from pymongo import ASCENDING
+from pymongo import IndexModel
 from dependencies.models.orders import Order, OrderOut
 #import attendeedriver
 from dependencies.db.attendees import AttendeeDriver
-from dependencies.db.client import Client
+from dependencies.db.client import AsyncClient
 from bson.objectid import ObjectId
 from dependencies.utils.bson import convert_to_object_id
+from dependencies.utils.bson import document_exists
+from dependencies.utils.bson import find_one_or_404
+from dependencies.utils.pagination import KeysetPage, KeysetParams, find_page
 from fastapi import HTTPException
 from fastapi import status
 
 
+# orders are listed in the order they were placed
+ORDERS_SORT = [("_id", ASCENDING)]
+
+
 class OrderDriver:
+    collection_name = "orders"
+    indexes = [
+        IndexModel([("user_id", ASCENDING), ("_id", ASCENDING)], name="user_id__id"),
+        IndexModel([("event_id", ASCENDING), ("_id", ASCENDING)], name="event_id__id"),
+    ]
+
     def __init__(self):
-        self.db = Client().get_instance().get_db()
-        self.collection = self.db["orders"]
+        self.db = AsyncClient.get_instance().get_db()
+        self.collection = self.db[self.collection_name]
         # self.atteendee_collection = self.db["attendees"]
 
-    def handle_nonexistent_order(self, order_id:str):
+    async def handle_nonexistent_order(self, order_id:str):
         """
         Handles the case when an order does not exist.
 
@@ -28,58 +43,56 @@ class OrderDriver:
             HTTPException: If the order with the given order_id does not exist.
 
         """
-        if not self.collection.find_one({"_id": convert_to_object_id(order_id)}):
+        if not await document_exists(self.collection, {"_id": convert_to_object_id(order_id)}):
             raise HTTPException(detail="order not found", status_code=status.HTTP_404_NOT_FOUND)
 
-    def get_user_orders(self, user_id):
+    async def get_user_orders(self, user_id, params: KeysetParams) -> KeysetPage[OrderOut]:
         """
         Retrieves orders for a specific user.
 
-        This method retrieves all orders from the collection that belong to the specified user_id.
-        It also calculates the count of attendees associated with each order using the AttendeeDriver's attendees_count method.
-        The retrieved orders, along with their attendee counts, are returned as a list of OrderOut objects.
+        This method retrieves one page of the orders from the collection that belong to the specified user_id,
+        in the order they were placed.
+        The attendee count of each order is read from its `tickets_count` counter.
+        The retrieved orders, along with their attendee counts, are returned as a page of OrderOut objects.
 
         Args:
             user_id (str): The ID of the user for which orders are being retrieved.
+            params (KeysetParams): The cursor and size of the requested page.
 
         Returns:
-            list[OrderOut]: A list of OrderOut objects representing the retrieved orders with attendee counts.
+            KeysetPage[OrderOut]: A page of OrderOut objects representing the retrieved orders with attendee counts.
 
         """
-        res = []
-        for order in self.collection.find({"user_id": user_id}):
-            count = AttendeeDriver().attendees_count(str(order["_id"]))
-            res.append(OrderOut(id=str(order["_id"]),tickets_count=count ,**order))
-        return res
+        orders, next_cursor = await find_page(self.collection, {"user_id": user_id}, ORDERS_SORT, params)
+        return KeysetPage.create(await self.to_orders_out(orders), params, next_=next_cursor)
 
-    def get_event_orders(self, event_id):
+    async def get_event_orders(self, event_id, params: KeysetParams) -> KeysetPage[OrderOut]:
         """
         Retrieves orders for a specific event.
 
-        This method retrieves all orders from the collection that belong to the specified event_id.
-        It also calculates the count of attendees associated with each order using the AttendeeDriver's attendees_count method.
-        The retrieved orders, along with their attendee counts, are returned as a list of OrderOut objects.
+        This method retrieves one page of the orders from the collection that belong to the specified event_id,
+        in the order they were placed.
+        The attendee count of each order is read from its `tickets_count` counter.
+        The retrieved orders, along with their attendee counts, are returned as a page of OrderOut objects.
 
         Args:
             event_id (str): The ID of the event for which orders are being retrieved.
+            params (KeysetParams): The cursor and size of the requested page.
 
         Returns:
-            list[OrderOut]: A list of OrderOut objects representing the retrieved orders with attendee counts.
+            KeysetPage[OrderOut]: A page of OrderOut objects representing the retrieved orders with attendee counts.
 
         """
-        res = []
-        for order in self.collection.find({"event_id": event_id}):
-            count = AttendeeDriver().attendees_count(str(order["_id"]))
-            res.append(OrderOut(id=str(order["_id"]),tickets_count=count, **order))
-        return res
+        orders, next_cursor = await find_page(self.collection, {"event_id": event_id}, ORDERS_SORT, params)
+        return KeysetPage.create(await self.to_orders_out(orders), params, next_=next_cursor)
 
-    def get_order(self, order_id):
+    async def get_order(self, order_id):
         """
         Retrieves an order by its ID.
 
-        This method retrieves an order from the collection based on the provided order_id.
-        It first checks if the order exists by calling the handle_nonexistent_order method.
-        If the order exists, it calculates the count of attendees associated with the order using the AttendeeDriver's attendees_count method.
+        This method retrieves an order from the collection based on the provided order_id, and raises an
+        HTTPException with a 404 Not Found status code if it does not exist.
+        Its attendee count is read from its `tickets_count` counter.
         The retrieved order, along with its attendee count, is returned as an OrderOut object.
 
         Args:
@@ -89,39 +102,81 @@ class OrderDriver:
             OrderOut: An OrderOut object representing the retrieved order with attendee count.
 
         """
-        self.handle_nonexistent_order(order_id)
-        count = AttendeeDriver().attendees_count(order_id)
-        order= self.collection.find_one({"_id": convert_to_object_id(order_id)})
-        return OrderOut(id=str(order["_id"]),tickets_count=count, **order)
+        order = await find_one_or_404(self.collection, order_id, "order not found")
+        return (await self.to_orders_out([order]))[0]
 
-    def add_order(self, event_id, order):
+    async def get_orders_by_ids(self, order_ids: list[str]) -> dict[str, OrderOut]:
+        """
+        Retrieves many orders by their IDs.
+
+        The orders are read with a single query and their attendees are counted with a single aggregation.
+
+        Args:
+            order_ids (list[str]): The IDs of the orders to retrieve.
+
+        Returns:
+            dict[str, OrderOut]: The retrieved orders keyed by ID. IDs of orders that do not exist are left out.
+
+        """
+        orders = await self.collection.find(
+            {"_id": {"$in": [convert_to_object_id(order_id) for order_id in order_ids]}}
+        ).to_list(length=None)
+        return {order.id: order for order in await self.to_orders_out(orders)}
+
+    async def to_orders_out(self, orders: list[dict]) -> list[OrderOut]:
+        """
+        Builds the output models of a list of order documents, taking the attendee count of each order from its
+        `tickets_count` counter.
+
+        Orders stored before the counter existed are counted with a single aggregation for the whole list.
+
+        Args:
+            orders (list[dict]): The order documents, as returned by the orders collection.
+
+        Returns:
+            list[OrderOut]: The orders in the same order, with their attendee counts.
+
+        """
+        missing = [str(order["_id"]) for order in orders if "tickets_count" not in order]
+        counts = await AttendeeDriver().attendees_counts(missing) if missing else {}
+        return [
+            OrderOut(**{"tickets_count": counts.get(str(order["_id"]), 0), **order, "id": str(order["_id"])})
+            for order in orders
+        ]
+
+    async def add_order(self, event_id, order, tickets_count=0, session=None):
         """
         Adds an order to the collection.
 
         This method adds a new order to the collection with the provided event_id.
         It assigns the event_id to the order and inserts the order as a dictionary into the collection.
-        After inserting the order, it calculates the count of attendees associated with the order using the AttendeeDriver's attendees_count method.
-        The inserted order, along with its attendee count, is returned as an OrderOut object.
+        A new order usually has no attendees yet: its `tickets_count` counter starts at 0 and is kept up to date by the
+        AttendeeDriver. A checkout inserts the order and its attendees together, and passes their count instead.
+        The inserted order is returned as an OrderOut object.
 
         Args:
             event_id (str): The ID of the event associated with the order.
             order (Order): The order to add to the collection.
+            tickets_count (int, optional): The number of attendees inserted with the order. Defaults to 0.
+            session (AsyncIOMotorClientSession, optional): The session of the transaction the order is part of.
 
         Returns:
             OrderOut: An OrderOut object representing the inserted order with attendee count.
 
         """
         order.event_id = event_id
-        inserted_id=self.collection.insert_one(order.dict()).inserted_id
-        count = AttendeeDriver().attendees_count(str(inserted_id))
-        return OrderOut(id=str(inserted_id),tickets_count=count ,**order.dict())
+        inserted_id=(await self.collection.insert_one(
+            {**order.dict(), "tickets_count": tickets_count}, session=session
+        )).inserted_id
+        return OrderOut(id=str(inserted_id),tickets_count=tickets_count ,**order.dict())
 
-    def edit_order(self, order_id, updated_attributes):
+    async def edit_order(self, order_id, updated_attributes):
         """
         Edits an order with the specified updated attributes.
 
         This method updates an order in the collection based on the provided order_id.
         It uses the updated_attributes dictionary to update the corresponding fields of the order.
+        The `tickets_count` counter is maintained by the AttendeeDriver and cannot be edited.
         The order is updated using the update_one method of the collection.
 
         Args:
@@ -129,9 +184,11 @@ class OrderDriver:
             updated_attributes (dict): A dictionary containing the updated attributes of the order.
 
         """
-        self.collection.update_one({"_id": convert_to_object_id(order_id)}, {"$set": updated_attributes})
+        updated_attributes = {key: value for key, value in updated_attributes.items() if key != "tickets_count"}
+        if updated_attributes:
+            await self.collection.update_one({"_id": convert_to_object_id(order_id)}, {"$set": updated_attributes})
 
-    def delete_order(self, order_id):
+    async def delete_order(self, order_id):
         """
         Deletes an order from the collection.
 
@@ -142,9 +199,4 @@ class OrderDriver:
             order_id (str): The ID of the order to delete.
 
         """
-        self.collection.delete_one({"_id": convert_to_object_id(order_id)})
-
-    # def upate_tickets_count(self, order_id, increment:int):
-    #     order = self.collection.find_one({"_id": convert_to_object_id(order_id)})
-    #     tickets_count = order["tickets_count"] + increment
-    #     self.collection.update_one({"_id": convert_to_object_id(order_id)}, {"$set": {"tickets_count": tickets_count}})
+        await self.collection.delete_one({"_id": convert_to_object_id(order_id)})
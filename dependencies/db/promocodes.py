@@ -1,7 +1,84 @@
-from bson import ObjectId
+import os
+import secrets
+from datetime import datetime
+from typing import AsyncIterator, Optional
+
+from fastapi import HTTPException
+from fastapi import status
+from pymongo import ASCENDING
+from pymongo import IndexModel
+from pymongo import ReturnDocument
+from pymongo import errors as mongo_errors
+from pymongo.collation import Collation
+from pymongo.collation import CollationStrength
+
+from dependencies.db.client import AsyncClient
+from dependencies.models.promocodes import PromocodeBatch, PromocodeDB, PromoCode, PromocodeOut
+from dependencies.utils.bson import convert_to_object_id, document_exists, find_one_or_404
+from dependencies.utils.cache import TTLCache
+from dependencies.utils.pagination import KeysetPage, KeysetParams, find_page
+
+
+# promocodes of an event are listed in the order they were created
+PROMOCODES_SORT = [("_id", ASCENDING)]
+
+# names of promocodes are unique per event and compared case-insensitively, so "SALE10" and "sale10" are one code.
+# Queries by name must use the same collation as the index to be served by it.
+NAME_COLLATION = Collation(locale="en", strength=CollationStrength.SECONDARY)
+
+# the promocodes looked up by name are cached per event for PROMOCODE_CACHE_TTL seconds (default 30), for at most
+# PROMOCODE_CACHE_EVENTS events (1000) and PROMOCODE_CACHE_NAMES names per event (1000), unknown names included.
+# Writes through this driver drop the event from the cache of the worker; the other workers see them within the TTL.
+promocode_tables = TTLCache(
+    max_size=int(os.environ.get("PROMOCODE_CACHE_EVENTS", 1000)),
+    ttl=float(os.environ.get("PROMOCODE_CACHE_TTL", 30)),
+)
+PROMOCODE_CACHE_NAMES = int(os.environ.get("PROMOCODE_CACHE_NAMES", 1000))
+
+# generated promocodes are the prefix followed by CODE_LENGTH characters of an alphabet without look-alikes (0/O, 1/I)
+# nor lowercase, 50 random bits, and are inserted PROMOCODE_BATCH_CHUNK (default 1000) at a time
+CODE_ALPHABET = "23456789ABCDEFGHJKLMNPQRSTUVWXYZ"
+CODE_LENGTH = 10
+PROMOCODE_BATCH_CHUNK = int(os.environ.get("PROMOCODE_BATCH_CHUNK", 1000))
+# a chunk whose codes keep colliding with existing ones is given up after this many attempts
+GENERATE_ATTEMPTS = 5
+
+
+def check_active(promocode: PromocodeOut):
+    """
+    Raises an HTTPException (400) if a promocode cannot be used now: outside of its date window, or limited without
+    uses left. The remaining uses may be a few seconds stale; redeeming is what actually guards them.
+    """
+    if not promocode.start_date_time <= datetime.utcnow() <= promocode.end_date_time:
+        raise HTTPException(detail="Promocode is not active", status_code=status.HTTP_400_BAD_REQUEST)
+    if promocode.is_limited and not promocode.current_amount:
+        raise HTTPException(detail="Not enough promocodes available", status_code=status.HTTP_400_BAD_REQUEST)
 
-from dependencies.db.client import Client
-from dependencies.models.promocodes import PromocodeDB, PromoCode, PromocodeOut
+
+def apply_promocode(price: int, promocode: PromocodeOut) -> int:
+    """
+    Returns the price after the discount of a promocode. A percentage discount is a fraction of the price (0.1 is 10%),
+    an amount discount is subtracted from it. The price never goes below 0.
+    """
+    if promocode.is_percentage:
+        return max(0, round(price * (1 - promocode.discount_amount)))
+    return max(0, round(price - promocode.discount_amount))
+
+
+
+def generate_codes(prefix: str, count: int) -> list[str]:
+    """
+    Returns `count` distinct random promocode names starting with `prefix`. Unique among themselves only: the unique
+    index of the collection catches the (unlikely) collisions with existing names.
+    """
+    codes = set()
+    while len(codes) < count:
+        # 256 is a multiple of the 32 letters of the alphabet, so every letter is equally likely
+        codes.update(
+            prefix + "".join(CODE_ALPHABET[byte % len(CODE_ALPHABET)] for byte in secrets.token_bytes(CODE_LENGTH))
+            for _ in range(count - len(codes))
+        )
+    return list(codes)
 
 
 class PromocodeDriver:
@@ -10,34 +87,46 @@ class PromocodeDriver:
 
     Attributes
     ----------
-    db : pymongo.database.Database
+    db : motor.motor_asyncio.AsyncIOMotorDatabase
         an instance of the database
-    collection : pymongo.collection.Collection
+    collection : motor.motor_asyncio.AsyncIOMotorCollection
         the promocode collection in the database
 
     Methods
     -------
-    is_valid_event_id(event_id: str) -> int:
+    is_valid_event_id(event_id: str) -> bool:
         Check if the given event_id is valid and exists in the database.
 
-    update_promocode(promocode_id: str, updated_attributes: dict) -> pymongo.results.UpdateResult:
+    update_promocode(promocode_id: str, updated_attributes: dict) -> bool:
         Update the given promocode with the given attributes.
 
-    update_promocode_amount(promocode_id: str, amount: int) -> pymongo.results.UpdateResult:
+    update_promocode_amount(promocode_id: str, amount: int) -> bool:
         Increment the current amount of the given promocode with the given amount.
 
+    redeem(promocode_id: str, session=None):
+        Use one of the remaining uses of the given limited promocode.
+
     is_valid_promocode_id(promocode_id: str) -> bool:
         Check if the given promocode_id is valid and exists in the database.
 
     get_promocodes(event_id: str) -> list[PromocodeOut]:
         Get all the promocodes for a given event_id.
 
+    get_promocodes_page(event_id: str, params: KeysetParams) -> KeysetPage[PromocodeOut]:
+        Get one page of the promocodes for a given event_id.
+
     get_promocode_by_id(promocode_id: str) -> PromocodeOut:
         Get the promocode with the given promocode_id.
 
+    get_promocode_by_name(event_id: str, name: str) -> PromocodeOut:
+        Get the promocode of an event with the given name, ignoring case. Cached per event.
+
     create_promocodes(event_id, promocodes: list[PromoCode]) -> list[PromocodeOut]:
         Create new promocodes for the given event_id.
 
+    generate_promocodes(event_id: str, batch: PromocodeBatch) -> AsyncIterator[list[dict]]:
+        Generate unique single-use promocodes for the given event_id, one chunk at a time.
+
     delete_promocodes_by_event_id(event_id: str) -> pymongo.results.DeleteResult:
         Delete all the promocodes for a given event_id.
 
@@ -45,14 +134,22 @@ class PromocodeDriver:
         Delete the promocode with the given promocode_id.
 
     """
+    collection_name = "promocodes"
+    indexes = [
+        IndexModel([("event_id", ASCENDING), ("_id", ASCENDING)], name="event_id__id"),
+        IndexModel(
+            [("event_id", ASCENDING), ("name", ASCENDING)], name="event_id_name", unique=True, collation=NAME_COLLATION
+        ),
+    ]
+
     def __init__(self):
         """
             Initialize a new instance of the PromocodeDriver class.
         """
-        self.db = Client().get_instance().get_db()
-        self.collection = self.db["promocodes"]
+        self.db = AsyncClient.get_instance().get_db()
+        self.collection = self.db[self.collection_name]
 
-    def is_valid_event_id(self, event_id: str):
+    async def is_valid_event_id(self, event_id: str):
         """
         Check if the given event_id is valid and exists in the database.
 
@@ -63,11 +160,11 @@ class PromocodeDriver:
 
         Returns
         -------
-        int: 0 if the event_id is invalid, 1 otherwise.
+        bool: True if the event exists, False otherwise.
         """
-        return self.db["events"].count_documents({"_id": ObjectId(event_id)})
+        return await document_exists(self.db["events"], {"_id": convert_to_object_id(event_id)})
 
-    def update_promocode(self, promocode_id: str, updated_attributes: dict):
+    async def update_promocode(self, promocode_id: str, updated_attributes: dict) -> bool:
         """
         Update the given promocode with the given attributes.
 
@@ -80,12 +177,22 @@ class PromocodeDriver:
 
         Returns
         -------
-        pymongo.results.UpdateResult
-            The result of the update operation.
-        """
-        return self.collection.update_one({"_id": ObjectId(promocode_id)}, {"$set": updated_attributes})
+        bool: True if the promocode exists, False otherwise.
 
-    def update_promocode_amount(self, promocode_id: str, amount: int):
+        Raises
+        ------
+        HTTPException
+            If the new name is the name of another promocode of the event.
+        """
+        try:
+            promocode = await self.collection.find_one_and_update(
+                {"_id": convert_to_object_id(promocode_id)}, {"$set": updated_attributes}, {"event_id": 1}
+            )
+        except mongo_errors.DuplicateKeyError:
+            raise HTTPException(detail="Promocode name already exists", status_code=status.HTTP_400_BAD_REQUEST)
+        return self.forget(promocode)
+
+    async def update_promocode_amount(self, promocode_id: str, amount: int) -> bool:
         """
         Increment the current amount of the given promocode with the given amount.
 
@@ -98,12 +205,52 @@ class PromocodeDriver:
 
         Returns
         -------
-        pymongo.results.UpdateResult
-            The result of the update operation.
+        bool: True if the promocode exists, False otherwise.
+        """
+        promocode = await self.collection.find_one_and_update(
+            {"_id": convert_to_object_id(promocode_id)}, {"$inc": {"current_amount": amount}}, {"event_id": 1}
+        )
+        return self.forget(promocode)
+
+    @staticmethod
+    def forget(promocode: Optional[dict]) -> bool:
         """
-        return self.collection.update_one({"_id": ObjectId(promocode_id)}, {"$inc": {"current_amount": amount}})
+        Drops the event of a written promocode from the cache of the worker. Returns whether the promocode exists.
+        """
+        if promocode is None:
+            return False
+        promocode_tables.pop(promocode["event_id"])
+        return True
+
+    async def redeem(self, promocode_id: str, session=None):
+        """
+        Uses one of the remaining uses of a limited promocode, with a single conditional update so that concurrent
+        checkouts cannot use it more times than it allows.
 
-    def is_valid_promocode_id(self, promocode_id: str):
+        Parameters
+        ----------
+        promocode_id : str
+            The id of the promocode to redeem.
+        session : AsyncIOMotorClientSession, optional
+            The session of the transaction the redemption is part of.
+
+        Raises
+        ------
+        HTTPException
+            If the promocode has no uses left.
+        """
+        promocode = await self.collection.find_one_and_update(
+            {"_id": convert_to_object_id(promocode_id), "current_amount": {"$gte": 1}},
+            {"$inc": {"current_amount": -1}},
+            {"_id": 1},
+            session=session,
+        )
+        # the cached promocodes are not dropped here: redemptions are too frequent on a hot event, and this update is
+        # what guards the remaining uses, whatever the cache says
+        if promocode is None:
+            raise HTTPException(detail="Not enough promocodes available", status_code=status.HTTP_400_BAD_REQUEST)
+
+    async def is_valid_promocode_id(self, promocode_id: str):
         """
         Check if the given promocode_id is valid and exists in the database.
 
@@ -117,9 +264,9 @@ class PromocodeDriver:
         bool: True if the promocode_id is valid, False otherwise.
 
         """
-        return self.collection.count_documents({"_id": ObjectId(promocode_id)}) > 0
+        return await document_exists(self.collection, {"_id": convert_to_object_id(promocode_id)})
 
-    def get_promocodes(self, event_id: str) -> list[PromocodeOut]:
+    async def get_promocodes(self, event_id: str) -> list[PromocodeOut]:
         """
          Retrieves all the promocodes associated with the given event_id.
 
@@ -130,23 +277,74 @@ class PromocodeDriver:
              list[PromocodeOut]: A list of PromocodeOut objects representing the retrieved promocodes.
          """
         res = []
-        for promocode in self.collection.find({"event_id": event_id}):
+        async for promocode in self.collection.find({"event_id": event_id}):
             res.append(PromocodeOut(id=str(promocode["_id"]), **promocode))
         return res
 
-    def get_promocode_by_id(self, promocode_id: str) -> PromocodeOut:
+    async def get_promocodes_page(self, event_id: str, params: KeysetParams) -> KeysetPage[PromocodeOut]:
+        """
+        Retrieves one page of the promocodes associated with the given event_id.
+
+        Args:
+            event_id (str): The ID of the event to retrieve promocodes for.
+            params (KeysetParams): The cursor and size of the requested page.
+
+        Returns:
+            KeysetPage[PromocodeOut]: A page of PromocodeOut objects representing the retrieved promocodes.
+        """
+        promocodes, next_cursor = await find_page(self.collection, {"event_id": event_id}, PROMOCODES_SORT, params)
+        res = [PromocodeOut(id=str(promocode["_id"]), **promocode) for promocode in promocodes]
+        return KeysetPage.create(res, params, next_=next_cursor)
+
+    async def get_promocode_by_id(self, promocode_id: str, not_found: str = "Promocode ID not found") -> PromocodeOut:
         """
         Retrieves the promocode with the given ID.
 
         Args:
             promocode_id (str): The ID of the promocode to retrieve.
+            not_found (str, optional): The detail of the 404 raised when the promocode does not exist.
 
         Returns:
             PromocodeOut: A PromocodeOut object representing the retrieved promocode.
         """
-        return PromocodeOut(id=promocode_id, **self.collection.find_one({"_id": ObjectId(promocode_id)}))
+        return PromocodeOut(id=promocode_id, **await find_one_or_404(self.collection, promocode_id, not_found))
 
-    def create_promocodes(self, event_id, promocodes: list[PromoCode]):
+    async def get_promocode_by_name(self, event_id: str, name: str) -> PromocodeOut:
+        """
+        Retrieves the promocode of an event with the given name, ignoring case, the way a buyer types it.
+
+        The lookups of an event, found or not, are cached for PROMOCODE_CACHE_TTL seconds, so a hot event does not
+        query the database for every buyer trying the same code.
+
+        Args:
+            event_id (str): The ID of the event of the promocode.
+            name (str): The name of the promocode.
+
+        Returns:
+            PromocodeOut: A PromocodeOut object representing the retrieved promocode.
+
+        Raises:
+            HTTPException: If the event has no promocode with this name.
+        """
+        table = promocode_tables.get(event_id)
+        if table is None:
+            table = {}
+            promocode_tables.set(event_id, table)
+        key = name.casefold()
+        if key in table:
+            promocode = table[key]
+        else:
+            promocode = await self.collection.find_one(
+                {"event_id": event_id, "name": name}, collation=NAME_COLLATION
+            )
+            promocode = PromocodeOut(id=str(promocode["_id"]), **promocode) if promocode is not None else None
+            if len(table) < PROMOCODE_CACHE_NAMES:
+                table[key] = promocode
+        if promocode is None:
+            raise HTTPException(detail="Promocode not found", status_code=status.HTTP_404_NOT_FOUND)
+        return promocode
+
+    async def create_promocodes(self, event_id, promocodes: list[PromoCode]):
         """
         Creates new promocodes for the given event.
 
@@ -156,19 +354,81 @@ class PromocodeDriver:
 
         Returns:
             list[PromocodeOut]: A list of PromocodeOut objects representing the created promocodes.
+
+        Raises:
+            HTTPException: If two promocodes of the event would have the same name, ignoring case.
         """
+        names = [promocode.name.casefold() for promocode in promocodes]
+        if len(set(names)) != len(names) or await document_exists(
+            self.collection, {"event_id": event_id, "name": {"$in": [promocode.name for promocode in promocodes]}},
+            collation=NAME_COLLATION,
+        ):
+            raise HTTPException(detail="Promocode name already exists", status_code=status.HTTP_400_BAD_REQUEST)
         promocodes = [
             PromocodeDB(
                 event_id=event_id, **promocode.dict()
                 ).dict() for promocode in promocodes
             ]
-        inserted = self.collection.insert_many(promocodes).inserted_ids
-        inserted = [
-            PromocodeOut(id=str(code), **self.collection.find_one({"_id": code})) for code in inserted
-        ]
-        return inserted
+        promocode_tables.pop(event_id)
+        try:
+            await self.collection.insert_many(promocodes)
+        except mongo_errors.BulkWriteError:
+            # another request created a promocode with one of the names meanwhile
+            raise HTTPException(detail="Promocode name already exists", status_code=status.HTTP_400_BAD_REQUEST)
+        # insert_many sets the _id of the documents it inserts, there is nothing else to read back
+        return [PromocodeOut(id=str(promocode["_id"]), **promocode) for promocode in promocodes]
+
+    async def generate_promocodes(self, event_id: str, batch: PromocodeBatch) -> AsyncIterator[list[dict]]:
+        """
+        Generates unique single-use promocodes for the given event, and yields them as they are inserted.
 
-    def delete_promocodes_by_event_id(self, event_id: str):
+        The codes are generated in memory and inserted PROMOCODE_BATCH_CHUNK at a time with unordered bulk writes, so
+        that a collision with an existing name only fails its own document: the unique index rejects it, and it is
+        generated again with the next attempt of the chunk.
+
+        Args:
+            event_id (str): The ID of the event to generate promocodes for.
+            batch (PromocodeBatch): The prefix and number of the promocodes, and their discount.
+
+        Yields:
+            list[dict]: The inserted documents of each chunk, with their _id.
+
+        Raises:
+            mongo_errors.PyMongoError: If a chunk cannot be inserted, or keeps colliding after GENERATE_ATTEMPTS
+                attempts. The chunks yielded before stay inserted, and so do the documents of the failed bulk write
+                that the server accepted: they are yielded before the error is raised.
+        """
+        template = PromocodeDB(
+            event_id=event_id,
+            name=batch.prefix,
+            is_limited=True,
+            limited_amount=1,
+            current_amount=1,
+            **batch.dict(exclude={"prefix", "count"}),
+        ).dict()
+        promocode_tables.pop(event_id)
+        for start in range(0, batch.count, PROMOCODE_BATCH_CHUNK):
+            pending = min(PROMOCODE_BATCH_CHUNK, batch.count - start)
+            for attempt in range(GENERATE_ATTEMPTS):
+                promocodes = [{**template, "name": name} for name in generate_codes(batch.prefix, pending)]
+                failure = None
+                try:
+                    await self.collection.insert_many(promocodes, ordered=False)
+                    failed = set()
+                except mongo_errors.BulkWriteError as e:
+                    errors = e.details["writeErrors"]
+                    failed = {error["index"] for error in errors}
+                    if any(error["code"] != 11000 for error in errors) or attempt == GENERATE_ATTEMPTS - 1:
+                        failure = e
+                # the other documents of an unordered insert are inserted even when it fails, they are yielded first
+                yield [promocode for index, promocode in enumerate(promocodes) if index not in failed]
+                if failure is not None:
+                    raise failure
+                pending = len(failed)
+                if not pending:
+                    break
+
+    async def delete_promocodes_by_event_id(self, event_id: str):
         """
         Deletes all the promocodes associated with the given event_id.
 
@@ -179,9 +439,10 @@ class PromocodeDriver:
             pymongo.results.DeleteResult: The result of the delete operation.
 
         """
-        return self.collection.delete_many({"event_id": event_id})
+        promocode_tables.pop(event_id)
+        return await self.collection.delete_many({"event_id": event_id})
 
-    def delete_promocode_by_id(self, promocode_id: str):
+    async def delete_promocode_by_id(self, promocode_id: str):
         """
         Deletes the promocode with the given ID.
 
@@ -189,7 +450,9 @@ class PromocodeDriver:
             promocode_id (str): The ID of the promocode to delete.
 
         Returns:
-            pymongo.results.DeleteResult: The result of the delete operation.
+            bool: True if the promocode existed, False otherwise.
 
         """
-        return self.collection.delete_one({"_id": ObjectId(promocode_id)})
+        promocode = await self.collection.find_one_and_delete({"_id": convert_to_object_id(promocode_id)}, {"event_id": 1})
+        self.forget(promocode)
+        return promocode is not None
@@ -0,0 +1,127 @@
+import os
+import datetime
+from typing import Optional
+
+from fastapi import HTTPException
+from fastapi import status
+from pymongo import ASCENDING
+from pymongo import DESCENDING
+from pymongo import TEXT
+from pymongo import IndexModel
+from pymongo import errors as mongo_errors
+
+import dependencies.models.events as models
+from dependencies.db.client import AsyncClient
+from dependencies.db.events import EventDriver
+from dependencies.utils.pagination import KeysetPage, KeysetParams, aggregate_page
+from dependencies.utils.text import SEARCH_MIN_TERM_LENGTH
+from dependencies.utils.text import search_terms
+
+"""
+This module contains the full-text search of public events, served by a MongoDB text index over their title, summary,
+organizer, category and city instead of scanning every event with unanchored regular expressions.
+
+The index stems words in SEARCH_LANGUAGE ("concerts" finds "concert"), ignores its stop words and case, and weights
+the fields so that a match in the title ranks above one in the summary. Results are ordered by relevance, then by ID.
+
+The title filter of `/events/search` uses the same index to find its candidates (see EventDriver.build_search_query).
+
+Classes:
+    - EventSearchDriver: Declares the text index of the events and searches them.
+
+Configuration:
+    SEARCH_MIN_TERM_LENGTH (shorter terms are ignored, default 3, read by dependencies.utils.text) and
+    SEARCH_LANGUAGE (stemming and stop words, default english) environment variables. Changing the language changes
+    the index: drop it and restart.
+"""
+
+SEARCH_LANGUAGE = os.environ.get("SEARCH_LANGUAGE", "english")
+
+# a title match counts ten times a summary match
+SEARCH_WEIGHTS = {
+    "basic_info.title": 10,
+    "basic_info.category": 5,
+    "basic_info.organizer": 3,
+    "location.city": 3,
+    "summary": 1,
+}
+
+# the score is computed by the pipeline, _id breaks the ties so that pages never overlap
+SEARCH_SORT = [("_score", DESCENDING), ("_id", ASCENDING)]
+
+class EventSearchDriver:
+    """
+    A class used to search the public events with the text index of the events collection.
+
+    A collection can only have one text index, so every full-text query of the events goes through this driver.
+    """
+    collection_name = "events"
+    indexes = [
+        IndexModel(
+            [(field, TEXT) for field in SEARCH_WEIGHTS],
+            name="public_text",
+            weights=SEARCH_WEIGHTS,
+            default_language=SEARCH_LANGUAGE,
+            partialFilterExpression={"state.is_public": True},
+        ),
+    ]
+
+    def __init__(self):
+        self.db = AsyncClient.get_instance().get_db()
+        self.collection = self.db[self.collection_name]
+        self.events = EventDriver()
+
+    async def search(
+            self,
+            text: str,
+            params: KeysetParams,
+            online: Optional[bool] = None,
+            free: Optional[bool] = None,
+            start_date: Optional[datetime.datetime] = None,
+            end_date: Optional[datetime.datetime] = None,
+    ) -> KeysetPage[models.EventOut]:
+        """
+        Searches the public events matching any term of a search, the most relevant first.
+
+        Args:
+            text (str): The search, as typed by the user.
+            params (KeysetParams): The cursor and size of the requested page.
+            online (bool, optional): Whether the event is online or not. Defaults to None.
+            free (bool, optional): Whether the event is free or not. Defaults to None.
+            start_date (datetime, optional): Earliest start of the events. Defaults to None.
+            end_date (datetime, optional): Latest start of the events. Defaults to None.
+
+        Returns:
+            KeysetPage[models.EventOut]: A page of the matching events.
+
+        Raises:
+            HTTPException: If the search has no term long enough (400), or if there is an error accessing the database.
+        """
+        terms = search_terms(text)
+        if not terms:
+            raise HTTPException(
+                detail=f"search terms must be at least {SEARCH_MIN_TERM_LENGTH} characters long",
+                status_code=status.HTTP_400_BAD_REQUEST,
+            )
+        query = {"$text": {"$search": " ".join(terms)}, "state.is_public": True}
+        if online is not None:
+            query["location.is_online"] = online
+        if free is not None:
+            query["ticket_summary.is_free"] = free
+        if start_date is not None or end_date is not None:
+            query["date_and_time.start_date_time"] = {
+                key: value for key, value in (("$gte", start_date), ("$lte", end_date)) if value is not None
+            }
+
+        try:
+            events, next_cursor = await aggregate_page(
+                self.collection,
+                [{"$match": query}, {"$addFields": {"_score": {"$meta": "textScore"}}}],
+                SEARCH_SORT,
+                params,
+            )
+        except mongo_errors.PyMongoError:
+            raise HTTPException(detail="database error", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        for event in events:
+            del event["_score"]
+        return KeysetPage.create(await self.events.to_events_out(events), params, next_=next_cursor)
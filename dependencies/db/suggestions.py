@@ -0,0 +1,273 @@
+import os
+import sys
+import heapq
+import asyncio
+import logging
+from bisect import bisect_left
+from datetime import datetime
+from typing import Iterable, Optional
+
+from pymongo import errors as mongo_errors
+
+from dependencies.db.client import AsyncClient
+from dependencies.models.events import SuggestionsOut
+from dependencies.utils.cache import TTLCache
+from dependencies.utils.text import fold
+
+"""
+This module contains the autocomplete of the search box: completions of the titles, cities and categories of the
+public upcoming events for what the user typed so far, served from memory instead of a regex scan of the events.
+
+Each kind of completion is a sorted array of folded names, so the names starting with a prefix are a contiguous range
+found by bisection, from which the heaviest are returned: titles weigh one plus the likes of their events, cities and
+categories the number of their upcoming events. Only the SUGGEST_MAX_ENTRIES heaviest names of each kind are kept,
+which bounds the memory used whatever the number of events, and answers are cached for SUGGEST_CACHE_TTL seconds.
+
+Every worker rebuilds the completions from the events, likes and categories every SUGGEST_REFRESH seconds. Between two
+rebuilds it follows the change stream of the database when MongoDB runs as a replica set, so new events and categories
+are suggested within milliseconds; deleted events and new likes are only taken into account by the next rebuild.
+
+Classes:
+    - Completions: The sorted names of one kind and their weights.
+    - Suggestions: The completions of every kind, their rebuilds and the suggestions.
+
+Functions:
+    - build_completions: Builds the completions of every kind from the events and categories.
+
+Configuration:
+    SUGGEST_REFRESH (seconds between two rebuilds, default 300), SUGGEST_MAX_ENTRIES (names kept per kind, 20000) and
+    SUGGEST_CACHE_TTL (seconds an answer is cached, 5) environment variables.
+"""
+
+SUGGEST_REFRESH = float(os.environ.get("SUGGEST_REFRESH", 300))
+SUGGEST_MAX_ENTRIES = int(os.environ.get("SUGGEST_MAX_ENTRIES", 20000))
+SUGGEST_CACHE_TTL = float(os.environ.get("SUGGEST_CACHE_TTL", 5))
+
+# the fields of an event the completions read, and the changes that may add a name
+PROJECTION = {"basic_info.title": 1, "basic_info.category": 1, "location.city": 1}
+CHANGES = [{"$match": {
+    "ns.coll": {"$in": ["events", "categories"]},
+    "$or": [
+        {"operationType": {"$in": ["insert", "replace"]}},
+        {"operationType": "update", "$expr": {"$anyElementTrue": [{"$map": {
+            "input": {"$objectToArray": "$updateDescription.updatedFields"},
+            "in": {"$regexMatch": {"input": "$$this.k", "regex": "^(basic_info|location|state|date_and_time)"}},
+        }}]}},
+    ],
+}}]
+CHANGE_STREAMS_UNSUPPORTED = 40573
+
+logger = logging.getLogger(__name__)
+
+
+class Completions:
+    """
+    The names of one kind of completion, sorted by their folded form, with the name to display and the weight of each
+    kept in parallel lists.
+    """
+
+    def __init__(self, max_entries: int = SUGGEST_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.keys: list[str] = []
+        self.texts: list[str] = []
+        self.weights: list[int] = []
+
+    @classmethod
+    def build(cls, entries: dict[str, list], max_entries: int = SUGGEST_MAX_ENTRIES) -> "Completions":
+        """
+        Builds the completions of the `max_entries` heaviest of the given names.
+
+        Args:
+            entries (dict[str, list]): The name to display and the weight of each folded name.
+            max_entries (int): The number of names kept.
+        """
+        completions = cls(max_entries)
+        keys = entries
+        if len(entries) > max_entries:
+            keys = heapq.nlargest(max_entries, entries, key=lambda key: entries[key][1])
+        completions.keys = sorted(keys)
+        completions.texts = [entries[key][0] for key in completions.keys]
+        completions.weights = [entries[key][1] for key in completions.keys]
+        return completions
+
+    def add(self, text: Optional[str], weight: int = 1, grow: bool = True):
+        """
+        Adds `weight` to a name, or adds the name if there is room left. With `grow` False the weight of a known name
+        is left unchanged, for names seen again in an updated document.
+        """
+        key = fold(text)
+        if not key:
+            return
+        position = bisect_left(self.keys, key)
+        if position < len(self.keys) and self.keys[position] == key:
+            self.weights[position] += weight if grow else 0
+        elif len(self.keys) < self.max_entries:
+            self.keys.insert(position, key)
+            self.texts.insert(position, text.strip())
+            self.weights.insert(position, weight)
+
+    def complete(self, prefix: str, limit: int) -> list[str]:
+        """
+        Returns the `limit` heaviest names whose folded form starts with the folded `prefix`, heaviest first.
+        """
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + chr(sys.maxunicode), start)
+        best = heapq.nlargest(limit, range(start, end), key=self.weights.__getitem__)
+        return [self.texts[position] for position in best]
+
+    def __len__(self):
+        return len(self.keys)
+
+
+def count_names(entries: dict[str, list], keys: dict[str, str], text: Optional[str], weight: int = 1):
+    key = keys.get(text)
+    if key is None and text is not None:
+        key = keys[text] = fold(text)
+    if key:
+        entries.setdefault(key, [text.strip(), 0])[1] += weight
+
+
+def build_completions(
+        events: Iterable[dict], categories: Iterable[str], likes: dict[str, int]
+) -> tuple[Completions, Completions, Completions]:
+    """
+    Builds the completions of the titles, cities and categories of the given public upcoming events and categories.
+
+    Args:
+        events (Iterable[dict]): The events, with their basic info and location.
+        categories (Iterable[str]): The names of the categories.
+        likes (dict[str, int]): The number of likes of each event ID.
+    """
+    titles, cities, category_names = {}, {}, {}
+    keys = {}
+    for event in events:
+        basic_info = event.get("basic_info") or {}
+        count_names(titles, keys, basic_info.get("title"), 1 + likes.get(str(event["_id"]), 0))
+        count_names(cities, keys, (event.get("location") or {}).get("city"))
+        count_names(category_names, keys, basic_info.get("category"))
+    for name in categories:
+        count_names(category_names, keys, name)
+    return Completions.build(titles), Completions.build(cities), Completions.build(category_names)
+
+
+class Suggestions:
+    """
+    The completions of the titles, cities and categories, rebuilt in the background by every worker.
+
+    Attributes:
+        ready (bool): Whether the completions were built at least once.
+        watch (bool): Whether the change stream is followed between rebuilds, False if MongoDB does not support it.
+    """
+
+    def __init__(self):
+        self.titles = Completions()
+        self.cities = Completions()
+        self.categories = Completions()
+        self.answers = TTLCache(max_size=10000, ttl=SUGGEST_CACHE_TTL)
+        self.ready = False
+        self.watch = True
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def run(self):
+        db = AsyncClient.get_instance().get_db()
+        while True:
+            try:
+                if not self.watch:
+                    await self.load(db)
+                    await asyncio.sleep(SUGGEST_REFRESH)
+                    continue
+                # the stream is opened before loading, so that no name written during the load is missed
+                async with db.watch(CHANGES, full_document="updateLookup") as stream:
+                    await self.load(db)
+                    await asyncio.wait_for(self.follow(stream), SUGGEST_REFRESH)
+            except asyncio.TimeoutError:
+                pass
+            except mongo_errors.PyMongoError as e:
+                if isinstance(e, mongo_errors.OperationFailure) and e.code == CHANGE_STREAMS_UNSUPPORTED:
+                    logger.info("suggestions are only rebuilt every %s seconds: %s", SUGGEST_REFRESH, e)
+                    self.watch = False
+                    continue
+                logger.error("failed to rebuild the suggestions: %r", e)
+                await asyncio.sleep(SUGGEST_REFRESH)
+
+    async def follow(self, stream):
+        async for change in stream:
+            self.apply(change)
+
+    async def load(self, db):
+        now = datetime.utcnow()
+        events = await db.events.find(
+            {"state.is_public": True, "date_and_time.start_date_time": {"$gte": now}}, PROJECTION
+        ).to_list(length=None)
+        likes = {
+            group["_id"]: group["count"]
+            async for group in db.likes.aggregate([{"$group": {"_id": "$event_id", "count": {"$sum": 1}}}])
+        }
+        categories = await db.categories.find({}, {"name": 1}).to_list(length=None)
+        # folding a million names takes seconds, the requests are served meanwhile
+        self.replace(*await asyncio.to_thread(
+            build_completions, events, [category.get("name") for category in categories], likes
+        ))
+
+    def replace(self, titles: Completions, cities: Completions, categories: Completions):
+        self.titles, self.cities, self.categories = titles, cities, categories
+        self.answers.clear()
+        self.ready = True
+
+    def apply(self, change: dict):
+        """
+        Adds the names of an inserted or updated document. Names are only counted when a document is inserted.
+        """
+        document = change.get("fullDocument")
+        if document is None:
+            return
+        grow = change["operationType"] == "insert"
+        if change["ns"]["coll"] == "categories":
+            self.categories.add(document.get("name"), grow=grow)
+            return
+        start = (document.get("date_and_time") or {}).get("start_date_time")
+        if not (document.get("state") or {}).get("is_public") or not isinstance(start, datetime):
+            return
+        if start < datetime.utcnow():
+            return
+        basic_info = document.get("basic_info") or {}
+        self.titles.add(basic_info.get("title"), grow=grow)
+        self.cities.add((document.get("location") or {}).get("city"), grow=grow)
+        self.categories.add(basic_info.get("category"), grow=grow)
+
+    def suggest(self, text: str, limit: int) -> SuggestionsOut:
+        """
+        Returns the completions of every kind for what the user typed so far.
+
+        Args:
+            text (str): The beginning of a title, city or category, as typed by the user.
+            limit (int): The number of completions of each kind.
+
+        Returns:
+            SuggestionsOut: The heaviest titles, cities and categories starting with `text`, ignoring case and accents.
+        """
+        prefix = fold(text)
+        if not prefix or not self.ready:
+            return SuggestionsOut()
+        answer = self.answers.get((prefix, limit))
+        if answer is None:
+            answer = SuggestionsOut(
+                titles=self.titles.complete(prefix, limit),
+                cities=self.cities.complete(prefix, limit),
+                categories=self.categories.complete(prefix, limit),
+            )
+            self.answers.set((prefix, limit), answer)
+        return answer
+
+
+suggestions = Suggestions()
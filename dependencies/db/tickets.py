@@ -1,7 +1,42 @@
+from collections import Counter
+from typing import Optional
+
+from fastapi import HTTPException
+from fastapi import status
+from pymongo import ASCENDING
+from pymongo import IndexModel
+from pymongo import ReturnDocument
+from pymongo import UpdateOne
 from dependencies.models.tickets import TicketDB, TicketIn, TicketOut
-from dependencies.db.client import Client
-from bson.objectid import ObjectId
+from dependencies.db.client import AsyncClient
 from dependencies.utils.bson import convert_to_object_id
+from dependencies.utils.bson import document_exists
+from dependencies.utils.bson import find_one_or_404
+from dependencies.utils.pagination import KeysetPage, KeysetParams, find_page
+
+
+# summary of an event without tickets. min_price and max_price are left out on purpose: $min and $max set a missing
+# field to the given value, while a stored null would always win the comparison.
+EMPTY_SUMMARY = {"is_free": False, "total_quantity": 0, "available_quantity": 0, "ticket_types": 0}
+
+# the fields of the summary that can't be maintained incrementally when a ticket is updated or deleted
+PRICE_FIELDS = ["min_price", "max_price", "is_free"]
+
+
+def price_update(summary: dict) -> dict:
+    """
+    Builds the update storing the prices of a ticket summary. The prices missing from the summary of an event without
+    tickets are removed rather than set to null, see EMPTY_SUMMARY.
+    """
+    update = {"$set": {f"ticket_summary.{field}": summary[field] for field in PRICE_FIELDS if field in summary}}
+    missing = {f"ticket_summary.{field}": "" for field in PRICE_FIELDS if field not in summary}
+    if missing:
+        update["$unset"] = missing
+    return update
+
+
+# tickets of an event are listed from the cheapest one
+TICKETS_SORT = [("price", ASCENDING), ("_id", ASCENDING)]
 
 
 class TicketDriver:
@@ -10,9 +45,9 @@ class TicketDriver:
 
     Attributes
     ----------
-    db : pymongo.database.Database
+    db : motor.motor_asyncio.AsyncIOMotorDatabase
         an instance of the database
-    collection : pymongo.collection.Collection
+    collection : motor.motor_asyncio.AsyncIOMotorCollection
         the tickets collection in the database
 
     Methods
@@ -23,9 +58,15 @@ class TicketDriver:
     get_tickets(event_id) -> list[TicketOut]:
         Get all the tickets for a given event_id.
 
+    get_tickets_page(event_id, params: KeysetParams) -> KeysetPage[TicketOut]:
+        Get one page of the tickets for a given event_id, from the cheapest one.
+
     get_ticket_by_id(ticket_id: str) -> TicketOut:
         Get the ticket with the given ticket_id.
 
+    get_tickets_by_ids(ticket_ids: list[str]) -> dict[str, TicketOut]:
+        Get many tickets with one query, keyed by id.
+
     is_valid_event_id(event_id: str) -> int:
         Check if the given event_id is valid and exists in the database.
 
@@ -38,28 +79,57 @@ class TicketDriver:
     get_minimum_price(event_id: str) -> int:
         Get the minimum price of the tickets for the given event_id.
 
-    update_ticket(ticket_id: str, updated_attributes: dict) -> pymongo.results.UpdateResult:
+    get_ticket_summaries(event_ids: list[str]) -> dict[str, dict]:
+        Compute the ticket summary of many events with one aggregation.
+
+    refresh_event_summaries(event_ids: list[str]):
+        Recompute and store the ticket summary of the given events.
+
+    refresh_event_prices(event_ids: list[str]):
+        Recompute and store the prices of the ticket summary of the given events.
+
+    change_event_summary(before: dict | None, after: dict | None):
+        Apply the update or deletion of a ticket to the ticket summary of its event.
+
+    update_ticket(ticket_id: str, updated_attributes: dict) -> dict | None:
         Update the given ticket with the given attributes.
 
-    update_ticket_quantity(ticket_id: str, quantity: int) -> pymongo.results.UpdateResult:
-        Increment the current quantity of the given ticket with the given quantity.
+    reserve(ticket_id: str, quantity: int, session=None) -> dict:
+        Take the given quantity off the available quantity of the given ticket, if that many are left.
+
+    release(ticket_id: str, quantity: int) -> dict:
+        Give the given quantity back to the available quantity of the given ticket, up to its max quantity.
+
+    release_many(releases: list[dict], session=None):
+        Give back the quantities of many reservations (e.g. expired holds) with one bulk write per collection.
+
+    update_quantity(ticket_id: str, quantity: int) -> dict | None:
+        Reserve (negative quantity) or release (positive quantity) tickets of the given ticket.
 
     delete_tickets_by_event_id(event_id: str) -> pymongo.results.DeleteResult:
         Delete all the tickets for a given event_id.
 
-    delete_ticket_by_id(ticket_id: str) -> pymongo.results.DeleteResult:
+    delete_ticket_by_ticket_id(ticket_id: str) -> dict | None:
         Delete the ticket with the given ticket_id.
 
+    Every write keeps the `ticket_summary` sub-document of the event up to date, so reading an event never needs
+    the tickets collection.
+
 
     """
+    collection_name = "tickets"
+    indexes = [
+        IndexModel([("event_id", ASCENDING), ("price", ASCENDING), ("_id", ASCENDING)], name="event_id_price__id"),
+    ]
+
     def __init__(self):
         """
            Initializes a TicketDriver instance and sets up the database connection.
        """
-        self.db = Client().get_instance().get_db()
-        self.collection = self.db["tickets"]
+        self.db = AsyncClient.get_instance().get_db()
+        self.collection = self.db[self.collection_name]
 
-    def create_tickets(self, event_id, tickets: list[TicketIn]):
+    async def create_tickets(self, event_id, tickets: list[TicketIn]):
         """
         Creates tickets for a given event in the database.
 
@@ -75,13 +145,14 @@ class TicketDriver:
                 event_id=event_id, available_quantity=ticket.max_quantity, **ticket.dict()
             ).dict() for ticket in tickets
         ]
-        inserted = self.collection.insert_many(tickets).inserted_ids
+        inserted = (await self.collection.insert_many(tickets)).inserted_ids
         inserted = [
-            TicketOut(id=str(ticket), **self.collection.find_one({"_id": ticket})) for ticket in inserted
+            TicketOut(id=str(ticket), **await self.collection.find_one({"_id": ticket})) for ticket in inserted
         ]
+        await self.add_to_event_summary(event_id, tickets)
         return inserted
 
-    def get_tickets(self, event_id) -> list[TicketOut]:
+    async def get_tickets(self, event_id) -> list[TicketOut]:
         """
         Retrieves all tickets for a given event from the database.
 
@@ -92,11 +163,26 @@ class TicketDriver:
             list[TicketOut]: A list of TicketOut objects representing the retrieved tickets.
         """
         res = []
-        for ticket in self.collection.find({"event_id": event_id}):
+        async for ticket in self.collection.find({"event_id": event_id}):
             res.append(TicketOut(id=str(ticket["_id"]), **ticket))
         return res
 
-    def is_free_event(self, event_id):
+    async def get_tickets_page(self, event_id, params: KeysetParams) -> KeysetPage[TicketOut]:
+        """
+        Retrieves one page of the tickets for a given event from the database, from the cheapest one.
+
+        Args:
+            event_id (str): The ID of the event for which tickets are to be retrieved.
+            params (KeysetParams): The cursor and size of the requested page.
+
+        Returns:
+            KeysetPage[TicketOut]: A page of TicketOut objects representing the retrieved tickets.
+        """
+        tickets, next_cursor = await find_page(self.collection, {"event_id": event_id}, TICKETS_SORT, params)
+        res = [TicketOut(id=str(ticket["_id"]), **ticket) for ticket in tickets]
+        return KeysetPage.create(res, params, next_=next_cursor)
+
+    async def is_free_event(self, event_id):
         """
         Determines if a given event has any free tickets.
 
@@ -107,12 +193,12 @@ class TicketDriver:
             bool: True if the event has at least one free ticket, False otherwise.
         """
         tickets = self.collection.find({"event_id": event_id})
-        for ticket in tickets:
+        async for ticket in tickets:
             if ticket["price"] == 0:
                 return True
         return False
 
-    def get_minimum_price(self, event_id):
+    async def get_minimum_price(self, event_id):
         """
         Retrieves the minimum price for tickets for a given event.
 
@@ -122,7 +208,7 @@ class TicketDriver:
         Returns:
             int: The minimum ticket price for the event, or -1 if no tickets for the event are found.
         """
-        tickets = list(self.collection.find({"event_id": event_id}))
+        tickets = await self.collection.find({"event_id": event_id}).to_list(length=None)
         if tickets:
             minimum_price = tickets[0]["price"]
         else:
@@ -132,7 +218,126 @@ class TicketDriver:
                 minimum_price = ticket["price"]
         return minimum_price
 
-    def is_valid_event_id(self, event_id):
+    async def get_ticket_summaries(self, event_ids: list[str]) -> dict[str, dict]:
+        """
+        Computes the ticket summary of many events with one grouped aggregation over the tickets collection.
+
+        Args:
+            event_ids (list[str]): The IDs of the events to summarize.
+
+        Returns:
+            dict[str, dict]: Maps every given event ID to its summary (see models.events.TicketSummary). Events
+            without tickets get EMPTY_SUMMARY.
+        """
+        summaries = {event_id: dict(EMPTY_SUMMARY) for event_id in event_ids}
+        if not summaries:
+            return summaries
+        pipeline = [
+            {"$match": {"event_id": {"$in": list(summaries)}}},
+            {"$group": {
+                "_id": "$event_id",
+                "min_price": {"$min": "$price"},
+                "max_price": {"$max": "$price"},
+                "is_free": {"$max": {"$eq": ["$price", 0]}},
+                "total_quantity": {"$sum": "$max_quantity"},
+                "available_quantity": {"$sum": "$available_quantity"},
+                "ticket_types": {"$sum": 1},
+            }},
+        ]
+        async for summary in self.collection.aggregate(pipeline):
+            summaries[summary.pop("_id")] = summary
+        return summaries
+
+    async def refresh_event_summaries(self, event_ids: list[str]):
+        """
+        Recomputes the ticket summary of the given events and stores it on the event documents.
+
+        This replaces the whole summary, quantities included, so it is only used for events that have no summary yet
+        and to repair or backfill the summaries. Ticket writes update the summary with change_event_summary.
+
+        Args:
+            event_ids (list[str]): The IDs of the events to refresh.
+        """
+        summaries = await self.get_ticket_summaries(event_ids)
+        if summaries:
+            await self.db["events"].bulk_write([
+                UpdateOne({"_id": convert_to_object_id(event_id)}, {"$set": {"ticket_summary": summary}})
+                for event_id, summary in summaries.items()
+            ], ordered=False)
+
+    async def refresh_event_prices(self, event_ids: list[str]):
+        """
+        Recomputes the prices of the ticket summary of the given events (`min_price`, `max_price` and `is_free`).
+
+        The quantities are left alone: they are maintained with `$inc`, which a concurrent reservation can't overwrite.
+
+        Args:
+            event_ids (list[str]): The IDs of the events to refresh.
+        """
+        summaries = await self.get_ticket_summaries(event_ids)
+        if summaries:
+            await self.db["events"].bulk_write([
+                UpdateOne({"_id": convert_to_object_id(event_id)}, price_update(summary))
+                for event_id, summary in summaries.items()
+            ], ordered=False)
+
+    async def change_event_summary(self, before: Optional[dict], after: Optional[dict]):
+        """
+        Applies the update or deletion of a ticket to the ticket summary of its event: the quantities and the number
+        of tickets are incremented by the difference between the ticket before and after, atomically, then the prices
+        are recomputed. Events without a summary yet are recomputed entirely.
+
+        Args:
+            before (dict | None): The ticket document before the write, None if it was created.
+            after (dict | None): The ticket document after the write, None if it was deleted.
+        """
+        deltas = {}
+        for ticket, sign in ((before, -1), (after, 1)):
+            if ticket is None:
+                continue
+            delta = deltas.setdefault(ticket["event_id"], Counter())
+            delta["ticket_summary.total_quantity"] += sign * ticket["max_quantity"]
+            delta["ticket_summary.available_quantity"] += sign * ticket["available_quantity"]
+            delta["ticket_summary.ticket_types"] += sign
+        for event_id, delta in deltas.items():
+            result = await self.db["events"].update_one(
+                {"_id": convert_to_object_id(event_id), "ticket_summary": {"$exists": True}}, {"$inc": dict(delta)}
+            )
+            if result.matched_count == 0:
+                await self.refresh_event_summaries([event_id])
+            else:
+                await self.refresh_event_prices([event_id])
+
+    async def add_to_event_summary(self, event_id: str, tickets: list[dict]):
+        """
+        Adds newly created tickets to the ticket summary of their event with a single atomic update.
+
+        Events created before the summary existed have no `ticket_summary` yet, those are recomputed instead so the
+        older tickets are counted too.
+
+        Args:
+            event_id (str): The ID of the event the tickets belong to.
+            tickets (list[dict]): The created ticket documents.
+        """
+        if not tickets:
+            return
+        prices = [ticket["price"] for ticket in tickets]
+        result = await self.db["events"].update_one(
+            {"_id": convert_to_object_id(event_id), "ticket_summary": {"$exists": True}},
+            {
+                "$min": {"ticket_summary.min_price": min(prices)},
+                "$max": {"ticket_summary.max_price": max(prices), "ticket_summary.is_free": 0 in prices},
+                "$inc": {
+                    "ticket_summary.total_quantity": sum(ticket["max_quantity"] for ticket in tickets),
+                    "ticket_summary.available_quantity": sum(ticket["available_quantity"] for ticket in tickets),
+                    "ticket_summary.ticket_types": len(tickets),
+                },
+            },
+        )
+        if result.matched_count == 0:
+            await self.refresh_event_summaries([event_id])
+
+    async def is_valid_event_id(self, event_id):
         """
         Determines if a given event ID is valid.
 
@@ -142,9 +347,9 @@ class TicketDriver:
         Returns:
             bool: True if the event ID is valid, False otherwise.
         """
-        return self.db["events"].count_documents({"_id": convert_to_object_id(event_id)}) > 0
+        return await document_exists(self.db["events"], {"_id": convert_to_object_id(event_id)})
 
-    def is_valid_ticket_id(self, ticket_id):
+    async def is_valid_ticket_id(self, ticket_id):
         """
         Determines if a given ticket ID is valid.
 
@@ -154,9 +359,9 @@ class TicketDriver:
         Returns:
             bool: True if the ticket ID is valid, False otherwise
         """
-        return self.collection.count_documents({"_id": ObjectId(ticket_id)}) > 0
+        return await document_exists(self.collection, {"_id": convert_to_object_id(ticket_id)})
 
-    def get_ticket_by_id(self, ticket_id) -> TicketOut:
+    async def get_ticket_by_id(self, ticket_id) -> TicketOut:
         """
         Retrieves a ticket from the database by its ID.
 
@@ -165,10 +370,28 @@ class TicketDriver:
 
         Returns:
             TicketOut: A TicketOut object representing the retrieved ticket.
+
+        Raises:
+            HTTPException: If the ticket does not exist.
         """
-        return TicketOut(id=ticket_id, **self.collection.find_one({"_id": ObjectId(ticket_id)}))
+        return TicketOut(id=ticket_id, **await find_one_or_404(self.collection, ticket_id, "Ticket not found"))
 
-    def update_ticket(self, ticket_id: str, updated_attributes: dict):
+    async def get_tickets_by_ids(self, ticket_ids: list[str]) -> dict[str, TicketOut]:
+        """
+        Retrieves many tickets from the database with a single query.
+
+        Args:
+            ticket_ids (list[str]): The IDs of the tickets to retrieve.
+
+        Returns:
+            dict[str, TicketOut]: The retrieved tickets keyed by ID. IDs of tickets that do not exist are left out.
+        """
+        return {
+            str(ticket["_id"]): TicketOut(id=str(ticket["_id"]), **ticket)
+            async for ticket in self.collection.find({"_id": {"$in": [convert_to_object_id(i) for i in ticket_ids]}})
+        }
+
+    async def update_ticket(self, ticket_id: str, updated_attributes: dict):
         """
         Updates a ticket in the database with the given attributes.
 
@@ -177,24 +400,132 @@ class TicketDriver:
             updated_attributes (dict): A dictionary of attributes to update.
 
         Returns:
-            pymongo.results.UpdateResult: The result of the update operation.
+            dict | None: The updated ticket document, or None if the ticket doesn't exist.
+        """
+        before = await self.collection.find_one_and_update(
+            {"_id": convert_to_object_id(ticket_id)}, {"$set": updated_attributes}, return_document=ReturnDocument.BEFORE
+        )
+        if before is None:
+            return None
+        ticket = {**before, **updated_attributes}
+        await self.change_event_summary(before, ticket)
+        return ticket
+
+    async def reserve(self, ticket_id, quantity, session=None):
         """
-        return self.collection.update_one({"_id": ObjectId(ticket_id)}, {"$set": updated_attributes})
+        Takes tickets off the available quantity of a ticket.
 
-    def update_quantity(self, ticket_id, quantity):
+        The check and the decrement are a single conditional update, so concurrent buyers can never take more tickets
+        than are available. A successful reservation costs two round trips: the update of the ticket, then the `$inc` of
+        the available quantity in the ticket summary of its event. Without a session the two writes are not atomic, so
+        a failure between them leaves the summary off by `quantity` until `rebuild-ticket-summaries` is run; the
+        ticket itself, which the check reads, is always right.
+
+        Args:
+            ticket_id (str): The ID of the ticket to reserve.
+            quantity (int): The number of tickets to reserve, at least 1.
+            session (AsyncIOMotorClientSession, optional): The session of the transaction the reservation is part of.
+
+        Returns:
+            dict: The updated ticket document.
+
+        Raises:
+            HTTPException: If the ticket does not exist, or has fewer than `quantity` tickets available.
+        """
+        return await self.increment_quantity(
+            ticket_id, -quantity, {"available_quantity": {"$gte": quantity}}, "Not enough tickets available", session
+        )
+
+    async def release(self, ticket_id, quantity):
+        """
+        Gives tickets back to the available quantity of a ticket, e.g. when an attendee is removed.
+
+        Args:
+            ticket_id (str): The ID of the ticket to release.
+            quantity (int): The number of tickets to release, at least 1.
+
+        Returns:
+            dict: The updated ticket document.
+
+        Raises:
+            HTTPException: If the ticket does not exist, or releasing would exceed its max quantity.
+        """
+        return await self.increment_quantity(
+            ticket_id,
+            quantity,
+            {"$expr": {"$lte": [{"$add": ["$available_quantity", quantity]}, "$max_quantity"]}},
+            "Too many tickets",
+        )
+
+    async def increment_quantity(self, ticket_id, quantity, condition, conflict, session=None):
+        ticket_id = convert_to_object_id(ticket_id)
+        ticket = await self.collection.find_one_and_update(
+            {"_id": ticket_id, **condition}, {"$inc": {"available_quantity": quantity}},
+            return_document=ReturnDocument.AFTER, session=session,
+        )
+        if ticket is None:
+            # the update matched nothing, a second read tells a missing ticket from a refused one
+            if await self.collection.find_one({"_id": ticket_id}, {"_id": 1}, session=session) is None:
+                raise HTTPException(detail="Ticket not found", status_code=status.HTTP_404_NOT_FOUND)
+            raise HTTPException(detail=conflict, status_code=status.HTTP_400_BAD_REQUEST)
+        await self.db["events"].update_one(
+            {"_id": convert_to_object_id(ticket["event_id"]), "ticket_summary": {"$exists": True}},
+            {"$inc": {"ticket_summary.available_quantity": quantity}},
+            session=session,
+        )
+        return ticket
+
+    async def release_many(self, releases, session=None):
+        """
+        Gives back the quantities of many reservations at once, e.g. a batch of expired holds.
+
+        Unlike release, the max quantity is not checked: the quantities were reserved before, so giving them back
+        cannot exceed it.
+
+        Args:
+            releases (list[dict]): The reservations, with their `ticket_id`, `event_id` and `quantity`.
+            session (AsyncIOMotorClientSession, optional): The session of the transaction the release is part of.
+        """
+        tickets = Counter()
+        events = Counter()
+        for release in releases:
+            tickets[release["ticket_id"]] += release["quantity"]
+            events[release["event_id"]] += release["quantity"]
+        if not tickets:
+            return
+        await self.collection.bulk_write([
+            UpdateOne({"_id": convert_to_object_id(ticket_id)}, {"$inc": {"available_quantity": quantity}})
+            for ticket_id, quantity in tickets.items()
+        ], ordered=False, session=session)
+        await self.db["events"].bulk_write([
+            UpdateOne(
+                {"_id": convert_to_object_id(event_id), "ticket_summary": {"$exists": True}},
+                {"$inc": {"ticket_summary.available_quantity": quantity}},
+            )
+            for event_id, quantity in events.items()
+        ], ordered=False, session=session)
+
+    async def update_quantity(self, ticket_id, quantity):
         """
         Updates the quantity of a ticket in the database.
 
         Args:
             ticket_id (str): The ID of the ticket to update.
-            quantity (int): The quantity to increment the ticket by.
+            quantity (int): The quantity to increment the ticket by, negative to reserve tickets.
 
         Returns:
-            pymongo.results.UpdateResult: The result of the update operation.
+            dict | None: The updated ticket document, or None if the ticket doesn't exist.
+
+        Raises:
+            HTTPException: If the available quantity would go below 0 or above the max quantity.
         """
-        return self.collection.update_one({"_id": ObjectId(ticket_id)}, {"$inc": {"available_quantity": quantity}})
+        if quantity < 0:
+            return await self.reserve(ticket_id, -quantity)
+        if quantity > 0:
+            return await self.release(ticket_id, quantity)
+        return await self.collection.find_one({"_id": convert_to_object_id(ticket_id)})
 
-    def delete_tickets_by_event_id(self, event_id):
+    async def delete_tickets_by_event_id(self, event_id):
         """
         Deletes all tickets for a given event from the database.
 
@@ -204,9 +535,13 @@ class TicketDriver:
         Returns:
             pymongo.results.DeleteResult: The result of the delete operation.
         """
-        return self.collection.delete_many({"event_id": event_id})
+        result = await self.collection.delete_many({"event_id": event_id})
+        await self.db["events"].update_one(
+            {"_id": convert_to_object_id(event_id)}, {"$set": {"ticket_summary": EMPTY_SUMMARY}}
+        )
+        return result
 
-    def delete_ticket_by_ticket_id(self, ticket_id):
+    async def delete_ticket_by_ticket_id(self, ticket_id):
         """
         Deletes a ticket from the database by its ID.
 
@@ -214,6 +549,9 @@ class TicketDriver:
             ticket_id (str): The ID of the ticket to delete.
 
         Returns:
-            pymongo.results.DeleteResult: The result of the delete operation.
+            dict | None: The deleted ticket document, or None if the ticket doesn't exist.
         """
-        return self.collection.delete_one({"_id": ObjectId(ticket_id)})
+        ticket = await self.collection.find_one_and_delete({"_id": convert_to_object_id(ticket_id)})
+        if ticket:
+            await self.change_event_summary(ticket, None)
+        return ticket
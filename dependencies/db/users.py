@@ -1,15 +1,23 @@
+import os
+import time
 from datetime import datetime
 
 import email_validator
 from fastapi import HTTPException
 from fastapi import status
 
+from pymongo import ASCENDING
+from pymongo import IndexModel
+from pymongo import ReturnDocument
 from pymongo import errors as mongo_errors
 from email_validator import validate_email
 
 from dependencies.models import users
-from dependencies.db.client import Client
+from dependencies.db.client import AsyncClient
 from dependencies.utils.bson import convert_to_object_id
+from dependencies.utils.bson import document_exists
+from dependencies.utils.bson import find_one_or_404
+from dependencies.utils.cache import TTLCache
 
 """
 This module contains a UsersDriver class that provides methods to interact with user data in a MongoDB database. The 
@@ -36,9 +44,13 @@ Functions:
     - email_exists(email: str): Returns True if a user with the specified email address exists in the database, False 
       otherwise.
     - update_password(email: str, password: str): Updates the password for the user with the specified email address.
+    - rehash_password(email: str, old_hash: str, new_hash: str) -> bool: Replaces the password hash of a user with a
+      stronger hash of the same password, without revoking their tokens.
     - get_user_by_id(user_id: str) -> users.UserInfo: Returns the user object for the user with the specified ID.
+    - get_users_by_ids(user_ids: list[str]) -> dict[str, users.UserInfo]: Returns the user objects of many users, 
+      read with a single query and keyed by ID.
     - get_last_password_update_time(user_id: str) -> datetime: Returns the last time the user with the specified ID 
-      updated their password.
+      updated their password. Served from the PasswordUpdateCache of the worker.
     - edit_info(user_id, firstname, lastname, avatar): Updates the user information for the user with the specified ID.
     - validate(email): Validates the specified email address using the email_validator library.
 
@@ -46,93 +58,181 @@ Usage:
     Create an instance of the UsersDriver class and use its methods to interact with user data in a MongoDB database. 
     The methods can be used to create, update, and retrieve user information, as well as to verify email addresses 
     and validate email addresses.
+
+Configuration:
+    PASSWORD_CACHE_TTL (default 60 seconds), PASSWORD_CACHE_SYNC (default 5 seconds) and PASSWORD_CACHE_SIZE 
+    (default 10000 users) environment variables.
 """
 
+
+class PasswordUpdateCache:
+    """
+    The password update time of recently seen users, kept by every worker so that authenticating a request does not
+    need a query.
+
+    A password change drops the entry of the worker that handled it and increments a version document in the
+    `cache_versions` collection. The other workers read that version at most every `sync_interval` seconds and clear
+    their cache when it changed, so a token revoked by a password change is refused by every worker within
+    `sync_interval` seconds.
+    """
+
+    version_id = "password_updates"
+
+    def __init__(self, max_size: int, ttl: float, sync_interval: float):
+        self.entries = TTLCache(max_size, ttl)
+        self.sync_interval = sync_interval
+        self.version = None
+        self.synced_at = float("-inf")
+
+    async def sync(self, versions):
+        if time.monotonic() - self.synced_at < self.sync_interval:
+            return
+        self.synced_at = time.monotonic()
+        document = await versions.find_one({"_id": self.version_id})
+        version = document["version"] if document else 0
+        if version != self.version:
+            self.entries.clear()
+            self.version = version
+
+    async def publish(self, versions, user_id: str):
+        self.entries.pop(user_id)
+        await versions.update_one({"_id": self.version_id}, {"$inc": {"version": 1}}, upsert=True)
+
+
+password_updates = PasswordUpdateCache(
+    max_size=int(os.environ.get("PASSWORD_CACHE_SIZE", 10000)),
+    ttl=float(os.environ.get("PASSWORD_CACHE_TTL", 60)),
+    sync_interval=float(os.environ.get("PASSWORD_CACHE_SYNC", 5)),
+)
+
+
 class UsersDriver:
+    collection_name = "users"
+    indexes = [
+        IndexModel([("email", ASCENDING)], name="email", unique=True),
+    ]
+
     def __init__(self):
-        self.db = Client.get_instance().get_db()
-        self.collection = self.db["users"]
+        self.db = AsyncClient.get_instance().get_db()
+        self.collection = self.db[self.collection_name]
+        self.cache_versions = self.db["cache_versions"]
 
-    def handle_existing_email(self, email: str):
-        if self.email_exists(email):
+    async def handle_existing_email(self, email: str):
+        if await self.email_exists(email):
             raise HTTPException(detail="email already exists", status_code=status.HTTP_400_BAD_REQUEST)
 
-    def handle_nonexistent_email(self, email: str):
-        if not self.email_exists(email):
+    async def handle_nonexistent_email(self, email: str):
+        if not await self.email_exists(email):
             raise HTTPException(detail="email not found", status_code=status.HTTP_404_NOT_FOUND)
 
-    def handle_existing_user(self, user_id: str):
-        if self.user_exists(user_id):
+    async def handle_existing_user(self, user_id: str):
+        if await self.user_exists(user_id):
             raise HTTPException(detail="user already exists", status_code=status.HTTP_400_BAD_REQUEST)
 
-    def handle_nonexistent_user(self, user_id: str):
-        if not self.user_exists(user_id):
+    async def handle_nonexistent_user(self, user_id: str):
+        if not await self.user_exists(user_id):
             raise HTTPException(detail="user not found", status_code=status.HTTP_404_NOT_FOUND)
 
-    def user_exists(self, user_id: str) -> bool:
-        user_id = convert_to_object_id(user_id)
-        return self.collection.find_one({"_id": user_id}) is not None
+    async def user_exists(self, user_id: str) -> bool:
+        return await document_exists(self.collection, {"_id": convert_to_object_id(user_id)})
 
-    def create_user(self, user: users.UserInSignup) -> users.UserOut:
+    async def create_user(self, user: users.UserInSignup) -> users.UserOut:
         try:
             user_db = users.UserDB(last_password_update=datetime.utcnow(), **user.dict())
-            inserted_id = self.collection.insert_one(user_db.dict()).inserted_id
+            inserted_id = (await self.collection.insert_one(user_db.dict())).inserted_id
             user_out = users.UserOut(**user_db.dict(), id=str(inserted_id))
             return user_out
         except mongo_errors.PyMongoError:
             raise HTTPException(detail="database error", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    def set_is_verified(self, email: str):
+    async def set_is_verified(self, email: str):
         try:
-            result = self.collection.update_one({"email": email}, {"$set": {"is_verified": True}})
+            result = await self.collection.update_one({"email": email}, {"$set": {"is_verified": True}})
             return result.matched_count == 1 or result.modified_count == 1
         except mongo_errors.PyMongoError:
             raise HTTPException(detail="database error", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    def get_user_by_email(self, email: str) -> users.UserOut:
+    async def get_user_by_email(self, email: str) -> users.UserOut:
         try:
-            user = self.collection.find_one({"email": email})
+            user = await self.collection.find_one({"email": email})
             return users.UserOut(**user, id=str(user["_id"]))
         except mongo_errors.PyMongoError:
             raise HTTPException(detail="database error", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    def email_exists(self, email: str):
+    async def email_exists(self, email: str):
+        try:
+            return await document_exists(self.collection, {"email": email})
+        except mongo_errors.PyMongoError:
+            raise HTTPException(detail="database error", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    async def update_password(self, email: str, password: str):
         try:
-            return self.collection.find_one({"email": email}) is not None
+            user = await self.collection.find_one_and_update(
+                {"email": email},
+                {"$set": {"password": password, "last_password_update": datetime.utcnow()}},
+                {"_id": 1},
+                return_document=ReturnDocument.AFTER,
+            )
+            if user is not None:
+                await password_updates.publish(self.cache_versions, str(user["_id"]))
+            return user
+        except mongo_errors.PyMongoError:
+            raise HTTPException(detail="database error", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    async def rehash_password(self, email: str, old_hash: str, new_hash: str) -> bool:
+        # the hash is only replaced if it was not changed meanwhile, and the password update time is kept, since the
+        # password itself did not change
+        try:
+            result = await self.collection.update_one(
+                {"email": email, "password": old_hash},
+                {"$set": {"password": new_hash}},
+            )
+            return result.modified_count == 1
         except mongo_errors.PyMongoError:
             raise HTTPException(detail="database error", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    def update_password(self, email: str, password: str):
+    async def get_user_by_id(self, user_id: str) -> users.UserInfo:
         try:
-            return self.collection.update_one(
-                {"email": email}, {"$set": {"password": password, "last_password_update": datetime.utcnow()}}
+            user = await find_one_or_404(
+                self.collection, user_id, "user not found", {"email": 1, "firstname": 1, "lastname": 1, "avatar_url": 1}
             )
         except mongo_errors.PyMongoError:
             raise HTTPException(detail="database error", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return users.UserInfo(id=user_id, **user)
 
-    def get_user_by_id(self, user_id: str) -> users.UserInfo:
-        self.handle_nonexistent_user(user_id)
+    async def get_users_by_ids(self, user_ids: list[str]) -> dict[str, users.UserInfo]:
         try:
-            return users.UserInfo(id=user_id, **self.collection.find_one({"_id": convert_to_object_id(user_id)}))
+            return {
+                str(user["_id"]): users.UserInfo(id=str(user["_id"]), **user)
+                async for user in self.collection.find(
+                    {"_id": {"$in": [convert_to_object_id(user_id) for user_id in set(user_ids)]}},
+                    {"email": 1, "firstname": 1, "lastname": 1, "avatar_url": 1},
+                )
+            }
         except mongo_errors.PyMongoError:
             raise HTTPException(detail="database error", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    def get_last_password_update_time(self, user_id: str) -> datetime:
-        self.handle_nonexistent_user(user_id)
+    async def get_last_password_update_time(self, user_id: str) -> datetime:
         try:
-            return self.collection.find_one({"_id": convert_to_object_id(user_id)})["last_password_update"]
+            await password_updates.sync(self.cache_versions)
+            last_password_update = password_updates.entries.get(user_id)
+            if last_password_update is None:
+                user = await find_one_or_404(self.collection, user_id, "user not found", {"last_password_update": 1})
+                last_password_update = user["last_password_update"]
+                password_updates.entries.set(user_id, last_password_update)
+            return last_password_update
         except mongo_errors.PyMongoError:
             raise HTTPException(detail="database error", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    def edit_info(self, user_id, firstname, lastname, avatar):
+    async def edit_info(self, user_id, firstname, lastname, avatar):
         try:
             print(convert_to_object_id(user_id))
             if firstname is not None:
-                self.collection.update_one({"_id": convert_to_object_id(user_id)}, {"$set": {"firstname": firstname}})
+                await self.collection.update_one({"_id": convert_to_object_id(user_id)}, {"$set": {"firstname": firstname}})
             if lastname is not None:
-                self.collection.update_one({"_id": convert_to_object_id(user_id)}, {"$set": {"lastname": lastname}})
+                await self.collection.update_one({"_id": convert_to_object_id(user_id)}, {"$set": {"lastname": lastname}})
             if avatar is not None:
-                self.collection.update_one({"_id": convert_to_object_id(user_id)}, {"$set": {"avatar_url": avatar}})
+                await self.collection.update_one({"_id": convert_to_object_id(user_id)}, {"$set": {"avatar_url": avatar}})
         except mongo_errors.PyMongoError:
             raise HTTPException(detail="database error", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -7,6 +7,7 @@ from pydantic import Field
 from dependencies.models.tickets import TicketIn
 from dependencies.models.promocodes import PromoCode
 from dependencies.models.users import UserInfo
+from dependencies.utils.pagination import KeysetPage
 
 
 class BasicInfo(BaseModel):
@@ -79,6 +80,33 @@ class State(BaseModel):
     ]
 
 
+class TicketSummary(BaseModel):
+    min_price: Annotated[int | None, Field(
+        description="Lowest ticket price of the event (none if the event has no tickets)",
+        example=50,
+    )] = None
+    max_price: Annotated[int | None, Field(
+        description="Highest ticket price of the event (none if the event has no tickets)",
+        example=100,
+    )] = None
+    is_free: Annotated[bool, Field(
+        description="Whether the event has a free ticket",
+        example=False,
+    )] = False
+    total_quantity: Annotated[int, Field(
+        description="Sum of the maximum quantities of the event tickets",
+        example=110,
+    )] = 0
+    available_quantity: Annotated[int, Field(
+        description="Sum of the available quantities of the event tickets",
+        example=64,
+    )] = 0
+    ticket_types: Annotated[int, Field(
+        description="Number of ticket types of the event",
+        example=2,
+    )] = 0
+
+
 basic_info_type = Annotated[BasicInfo, Field(
     description="Basic information of the event",
 )]
@@ -103,6 +131,9 @@ date_and_time_type = Annotated[DateAndTime, Field(
 location_type = Annotated[Location, Field(
     description="Location details of the event",
 )]
+ticket_summary_type = Annotated[TicketSummary, Field(
+    description="Summary of the tickets of the event",
+)]
 tickets_type = Annotated[list[TicketIn], Field(
     description="Tickets of the event",
 )]
@@ -152,6 +183,7 @@ class EventOut(EventDB):
         description="Whether the event is free or not",
         example=False,
     )]
+    ticket_summary: ticket_summary_type = TicketSummary()
 
 
 class EventCard(BaseModel):
@@ -180,3 +212,82 @@ class EventCard(BaseModel):
         },
     )]
     location: location_type
+
+
+class SuggestionsOut(BaseModel):
+    titles: Annotated[list[str], Field(
+        description="Titles of upcoming events starting with the search, the most liked first",
+        example=["Let's be loyal"],
+    )] = []
+    cities: Annotated[list[str], Field(
+        description="Cities starting with the search, the one with the most upcoming events first",
+        example=["Cairo"],
+    )] = []
+    categories: Annotated[list[str], Field(
+        description="Categories starting with the search, the one with the most upcoming events first",
+        example=["Loyalty"],
+    )] = []
+
+
+class FacetCount(BaseModel):
+    value: Annotated[str, Field(
+        description="Value of the facet, as written in the first matching event",
+        example="Cairo",
+    )]
+    count: Annotated[int, Field(
+        description="Number of matching events with this value",
+        example=12,
+    )]
+
+
+class PriceBandCount(BaseModel):
+    min_price: Annotated[int, Field(
+        description="Lowest minimum ticket price of the band",
+        example=25,
+    )]
+    max_price: Annotated[int | None, Field(
+        description="Highest minimum ticket price of the band, excluded (none for the last band)",
+        example=50,
+    )]
+    count: Annotated[int, Field(
+        description="Number of matching events whose cheapest ticket is in the band",
+        example=7,
+    )]
+
+
+class EventFacets(BaseModel):
+    total: Annotated[int, Field(
+        description="Number of matching events",
+        example=42,
+    )] = 0
+    categories: Annotated[list[FacetCount], Field(
+        description="Most frequent categories of the matching events",
+    )] = []
+    cities: Annotated[list[FacetCount], Field(
+        description="Most frequent cities of the matching events",
+    )] = []
+    online: Annotated[int, Field(
+        description="Number of matching online events",
+        example=10,
+    )] = 0
+    offline: Annotated[int, Field(
+        description="Number of matching events at a venue",
+        example=32,
+    )] = 0
+    free: Annotated[int, Field(
+        description="Number of matching events with a free ticket",
+        example=5,
+    )] = 0
+    paid: Annotated[int, Field(
+        description="Number of matching events without a free ticket",
+        example=37,
+    )] = 0
+    price_bands: Annotated[list[PriceBandCount], Field(
+        description="Number of matching events per band of their cheapest ticket price, empty bands omitted",
+    )] = []
+
+
+class EventSearchPage(KeysetPage[EventOut]):
+    facets: Annotated[EventFacets | None, Field(
+        description="Counts of the matching events per category, city, online, free and price band, if requested",
+    )] = None
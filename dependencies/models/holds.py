@@ -0,0 +1,57 @@
+from typing import Annotated, Literal
+from datetime import datetime
+
+from pydantic import BaseModel
+from pydantic import Field
+
+
+class HoldDB(BaseModel):
+    """
+    Represents tickets set aside for a buyer while they fill in the details of their order.
+
+    Attributes:
+        ticket_id (str): ID of the held ticket.
+        event_id (str): ID of the event of the ticket.
+        user_id (str): ID of the buyer holding the tickets.
+        quantity (int): Number of tickets held.
+        expires_at (datetime): When the tickets are given back if the hold was not converted to an order.
+        state (str): active until the hold is converted to an order, released by the buyer or expired.
+    """
+    ticket_id: Annotated[str, Field(
+        description="ID of the held ticket",
+        example="645a4f6cde817f34feab5e99",
+    )]
+    event_id: Annotated[str, Field(
+        description="ID of the event of the ticket",
+        example="6459447df0c9d6f57d894a60",
+    )]
+    user_id: Annotated[str, Field(
+        description="ID of the buyer holding the tickets",
+        example="2dg3f4g5h6j7k8l9",
+    )]
+    quantity: Annotated[int, Field(
+        gt=0,
+        description="Number of tickets held",
+        example=2,
+    )]
+    expires_at: Annotated[datetime, Field(
+        description="When the tickets are given back if the hold was not converted to an order",
+        example="2023-05-01T00:10:00",
+    )]
+    state: Annotated[Literal["active", "converted", "released", "expired"], Field(
+        description="active until the hold is converted to an order, released by the buyer or expired",
+        example="active",
+    )] = "active"
+
+
+class HoldOut(HoldDB):
+    """
+    Represents a hold that is returned in API responses.
+
+    Attributes:
+        id (str): ID of the hold.
+    """
+    id: Annotated[str, Field(
+        description="ID of the hold",
+        example="645a4f6cde817f34feab5f01",
+    )]
@@ -4,6 +4,8 @@ from datetime import datetime
 from pydantic import BaseModel
 from pydantic import Field
 
+from dependencies.models.attendees import AttendeeOut
+
 
 
 name_type = Annotated[str, Field(
@@ -73,3 +75,36 @@ class OrderOut(Order):
     )]
     tickets_count : tickets_count_type
 
+
+class CheckoutAttendee(BaseModel):
+    first_name: name_type
+    last_name: name_type
+    email: email_type
+    ticket_id: Annotated[str, Field(
+        description="ID of the ticket bought for the attendee",
+        example="645a4f6cde817f34feab5e99",
+    )]
+
+
+class Checkout(BaseModel):
+    first_name: name_type
+    last_name: name_type
+    email: email_type
+    attendees: Annotated[list[CheckoutAttendee], Field(
+        min_items=1,
+        max_items=100,
+        description="One entry per ticket bought",
+    )]
+    promocode_id: Annotated[Optional[str], Field(
+        description="ID of the promocode to apply to the order",
+        example="645a4f6cde817f34feab5e12",
+    )] = None
+    hold_ids: Annotated[list[str], Field(
+        description="IDs of the holds of the buyer whose tickets are used for the attendees",
+        example=["645a4f6cde817f34feab5f01"],
+    )] = []
+
+
+class CheckoutOut(BaseModel):
+    order: OrderOut
+    attendees: list[AttendeeOut]
@@ -81,3 +81,66 @@ class PromocodeOut(PromocodeDB):
         description="ID of the promocode",
         example="gshacgjhvfdry",
     )]
+
+
+class PromocodePrice(BaseModel):
+    """
+    Represents the price of tickets after applying a promocode.
+
+    Attributes:
+        promocode (PromocodeOut): The applied promocode.
+        price (int): Price of the tickets without the promocode.
+        discounted_price (int): Price of the tickets with the promocode.
+    """
+    promocode: PromocodeOut
+    price: Annotated[int, Field(
+        description="Price of the tickets without the promocode",
+        example=200,
+    )]
+    discounted_price: Annotated[int, Field(
+        description="Price of the tickets with the promocode",
+        example=180,
+    )]
+
+
+class PromocodeBatch(BaseModel):
+    """
+    Represents a batch of unique single-use promocodes to generate, all with the same discount.
+
+    Attributes:
+        prefix (str): Prefix of the generated names, followed by a random part.
+        count (int): Number of promocodes to generate.
+        is_percentage (bool): Flag indicating if the promocodes are percentage or amount.
+        discount_amount (float): Discount percentage or amount (must be greater than 0).
+        start_date_time (datetime): Start date and time of the promocodes.
+        end_date_time (datetime): End date and time of the promocodes.
+    """
+    prefix: Annotated[str, Field(
+        max_length=20,
+        regex=r"^[A-Za-z0-9_-]*$",
+        description="Prefix of the generated names, followed by a random part",
+        example="PARTNER-",
+    )]
+    count: Annotated[int, Field(
+        ge=1,
+        le=100000,
+        description="Number of promocodes to generate",
+        example=5000,
+    )]
+    is_percentage: Annotated[bool, Field(
+        description="Flag indicating if the promocodes are percentage or amount",
+        example=True,
+    )]
+    discount_amount: Annotated[float, Field(
+        gt=0,
+        description="Discount percentage or amount(must be greater than 0)",
+        example=0.1,
+    )]
+    start_date_time: Annotated[datetime, Field(
+        description="Start date and time of the promocodes",
+        example="2023-05-01T00:00:00",
+    )]
+    end_date_time: Annotated[datetime, Field(
+        description="End date and time of the promocodes",
+        example="2023-05-31T23:59:59",
+    )]
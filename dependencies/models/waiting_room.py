@@ -0,0 +1,73 @@
+from typing import Annotated, Optional
+
+from pydantic import BaseModel
+from pydantic import Field
+
+
+class WaitingRoomIn(BaseModel):
+    """
+    The admission settings of the waiting room of an event.
+
+    Attributes:
+        rate (float): Number of buyers admitted per second.
+        burst (int): Number of buyers that can be admitted at once after a quiet period.
+    """
+    rate: Annotated[float, Field(
+        gt=0,
+        description="Number of buyers admitted per second",
+        example=20,
+    )]
+    burst: Annotated[int, Field(
+        ge=1,
+        description="Number of buyers that can be admitted at once after a quiet period",
+        example=100,
+    )]
+
+
+class WaitingRoomOut(WaitingRoomIn):
+    """
+    The state of the waiting room of an event.
+
+    Attributes:
+        event_id (str): ID of the event.
+        issued (int): Number of queue positions handed out.
+        admitted_through (int): Every position up to this one is admitted.
+    """
+    event_id: Annotated[str, Field(
+        description="ID of the event",
+        example="6459447df0c9d6f57d894a60",
+    )]
+    issued: Annotated[int, Field(
+        description="Number of queue positions handed out",
+        example=1500,
+    )]
+    admitted_through: Annotated[int, Field(
+        description="Every position up to this one is admitted",
+        example=1200,
+    )]
+
+
+class QueueTicketOut(BaseModel):
+    """
+    The place of a buyer in the waiting room of an event.
+
+    Attributes:
+        position (int): Position of the buyer in the queue, starting at 1.
+        admitted_through (int): Every position up to this one is admitted.
+        queue_token (str): Signed proof of the position, to send when polling the status.
+        pass_token (str | None): Signed pass to send in the X-Waiting-Room-Pass header once admitted.
+    """
+    position: Annotated[int, Field(
+        description="Position of the buyer in the queue, starting at 1",
+        example=1250,
+    )]
+    admitted_through: Annotated[int, Field(
+        description="Every position up to this one is admitted",
+        example=1200,
+    )]
+    queue_token: Annotated[str, Field(
+        description="Signed proof of the position, to send when polling the status",
+    )]
+    pass_token: Annotated[Optional[str], Field(
+        description="Signed pass to send in the X-Waiting-Room-Pass header once admitted",
+    )] = None
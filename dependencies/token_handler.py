@@ -1,17 +1,22 @@
 import os
 from datetime import datetime
 from datetime import timedelta
+from typing import Annotated
 
 import jwt
 
+from fastapi import Depends
 from fastapi import HTTPException
+from fastapi import Request
 from fastapi import status
+from fastapi.security import OAuth2PasswordBearer
 
 from dependencies.models import users
 from dependencies.db import users as users_db
 
 
 users_driver = users_db.UsersDriver()
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
 class TokenHandler:
@@ -31,10 +36,10 @@ class TokenHandler:
         except TypeError as e:
             raise HTTPException(detail="type error", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    def get_user(self, token) -> users.UserToken:
+    async def get_user(self, token) -> users.UserToken:
         try:
             payload = jwt.decode(token, self.secret_key, self.algorithm)
-            last_updated_time = users_driver.get_last_password_update_time(payload["id"])
+            last_updated_time = await users_driver.get_last_password_update_time(payload["id"])
             user = users.UserToken(**payload)
             expiration_time = datetime.fromtimestamp(payload["exp"])
             start_time = datetime.fromtimestamp(payload["start"])
@@ -47,3 +52,21 @@ class TokenHandler:
             raise HTTPException(detail="jwt error", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
         return user
+
+
+token_handler = TokenHandler()
+
+
+async def current_user(request: Request, token: Annotated[str, Depends(oauth2_scheme)]) -> users.UserToken:
+    """
+    FastAPI dependency returning the user of the bearer token of the request.
+
+    The token is decoded and checked against the user's last password update once per request, the result is kept
+    on `request.state.user`. That update time is served from the PasswordUpdateCache of the worker, so a token whose
+    user no longer exists is only refused with a 404 once the cached entry expires (PASSWORD_CACHE_TTL seconds after it
+    was read) or the cache is cleared by a password change. Endpoints that must not act for a deleted user still have
+    to look the user up.
+    """
+    if not hasattr(request.state, "user"):
+        request.state.user = await token_handler.get_user(token)
+    return request.state.user
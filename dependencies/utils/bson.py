@@ -10,3 +10,14 @@ def convert_to_object_id(id_in: str) -> ObjectId:
         return ObjectId(id_in)
     except InvalidId:
         raise HTTPException(detail="invalid id", status_code=status.HTTP_400_BAD_REQUEST)
+
+
+async def find_one_or_404(collection, document_id: str, detail: str, projection: dict = None) -> dict:
+    document = await collection.find_one({"_id": convert_to_object_id(document_id)}, projection)
+    if document is None:
+        raise HTTPException(detail=detail, status_code=status.HTTP_404_NOT_FOUND)
+    return document
+
+
+async def document_exists(collection, query: dict, collation=None) -> bool:
+    return await collection.find_one(query, {"_id": 1}, collation=collation) is not None
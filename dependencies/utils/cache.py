@@ -0,0 +1,56 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+"""
+This module contains a small in-process cache for values that are read far more often than they change.
+
+Classes:
+    - TTLCache: A least-recently-used cache whose entries also expire after a fixed time.
+"""
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    A least-recently-used cache whose entries expire `ttl` seconds after they were set.
+
+    It is not shared between processes: every uvicorn worker has its own, so whoever writes the cached data must
+    also make the other workers drop their copies (or accept that they stay stale for up to `ttl` seconds).
+
+    Attributes:
+        max_size (int): The number of entries kept, the least recently used ones are evicted first.
+        ttl (float): The number of seconds an entry is valid.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        entry = self.entries.get(key, _MISSING)
+        if entry is _MISSING:
+            return default
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self.entries[key]
+            return default
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        self.entries.pop(key, None)
+
+    def clear(self):
+        self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,102 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Generic, Hashable, Optional, TypeVar
+
+"""
+This module contains a DataLoader: a per-request cache that batches the lookups of documents by key.
+
+Every `load(key)` made while the current task runs is collected, and once the task yields to the event loop the
+collected keys are fetched with a single call to the batch function (usually one `$in` query). Results, including
+keys that were not found, are kept for the life of the loader, so a document is read at most once per request.
+
+Classes:
+    - DataLoader: Batches, de-duplicates and memoizes lookups by key.
+
+Usage:
+    users = DataLoader(users_driver.get_users_by_ids)
+    creator, *attendees = await asyncio.gather(users.load(creator_id), *map(users.load, attendee_ids))
+"""
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class DataLoader(Generic[K, V]):
+    """
+    Batches, de-duplicates and memoizes lookups by key.
+
+    Attributes:
+        batch_load (Callable[[list[K]], Awaitable[dict[K, V]]]): Fetches many keys at once. Keys missing from the
+            returned dict are loaded as None.
+        check_key (Callable[[K], Any], optional): Called on every new key before it is queued, so that an invalid
+            key fails the caller that passed it instead of the whole batch.
+    """
+
+    def __init__(
+            self,
+            batch_load: Callable[[list[K]], Awaitable[dict[K, V]]],
+            check_key: Optional[Callable[[K], Any]] = None,
+    ):
+        self.batch_load = batch_load
+        self.check_key = check_key
+        self.cache: dict[K, asyncio.Future] = {}
+        self.queue: list[K] = []
+        self.dispatches: set[asyncio.Task] = set()
+
+    def load(self, key: K) -> "asyncio.Future[Optional[V]]":
+        """
+        Schedules the lookup of a key.
+
+        Args:
+            key (K): The key to look up.
+
+        Returns:
+            asyncio.Future[V | None]: Resolves to the value of the key, or None if it does not exist.
+        """
+        if key not in self.cache:
+            if self.check_key is not None:
+                self.check_key(key)
+            self.cache[key] = asyncio.get_running_loop().create_future()
+            if not self.queue:
+                task = asyncio.create_task(self.dispatch())
+                self.dispatches.add(task)
+                task.add_done_callback(self.dispatches.discard)
+            self.queue.append(key)
+        return self.cache[key]
+
+    async def load_many(self, keys: list[K]) -> list[Optional[V]]:
+        """
+        Looks up many keys with at most one call to the batch function.
+
+        Args:
+            keys (list[K]): The keys to look up.
+
+        Returns:
+            list[V | None]: The values in the order of `keys`, None for the keys that do not exist.
+        """
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def prime(self, key: K, value: V):
+        """
+        Stores a value that was read by other means, unless the key is already cached.
+        """
+        if key not in self.cache:
+            self.cache[key] = asyncio.get_running_loop().create_future()
+            self.cache[key].set_result(value)
+
+    def clear(self, key: K):
+        """
+        Forgets a key, so the next `load` reads it again. Meant to be called after the document is written.
+        """
+        if key in self.cache and self.cache[key].done():
+            del self.cache[key]
+
+    async def dispatch(self):
+        keys, self.queue = self.queue, []
+        try:
+            values = await self.batch_load(keys)
+        except Exception as e:
+            for key in keys:
+                self.cache.pop(key).set_exception(e)
+            return
+        for key in keys:
+            self.cache[key].set_result(values.get(key))
@@ -0,0 +1,217 @@
+import os
+import time
+import asyncio
+import logging
+import smtplib
+from email.message import Message
+from typing import Callable, Optional
+
+from fastapi import HTTPException
+from fastapi import status
+
+"""
+This module contains the outbound mail pipeline. Endpoints only put their messages on an in-process queue and return,
+a few background workers send them over SMTP connections that stay open and logged in between messages.
+
+Classes:
+    - SMTPConnection: A lazily opened, reused SMTP connection.
+    - RateLimiter: Spaces out the sends of every worker to at most MAIL_RATE messages per second.
+    - Mailer: The queue and its workers, retrying temporary failures with exponential backoff.
+
+Usage:
+    mailer.enqueue(recipient, message)
+
+    The workers are started with the application (`mailer.start()`) and drained when it stops
+    (`await mailer.stop()`). To send to a local SMTP stub, e.g. `python -m aiosmtpd -n -l localhost:1025`, set
+    SMTP_HOST=localhost, SMTP_PORT=1025 and SMTP_SSL=0.
+
+Configuration:
+    SMTP_HOST (default smtp.gmail.com), SMTP_PORT (465), SMTP_SSL (1), MAIL_WORKERS (2), MAIL_QUEUE_SIZE (1000),
+    MAIL_RATE (messages per second, 5), MAIL_RETRIES (5) and MAIL_RETRY_DELAY (seconds before the first retry, 1)
+    environment variables. The account is the one of EVENTBRITE_EMAIL and EVENTBRITE_PASSWORD, without them the
+    connection does not log in.
+"""
+
+SMTP_HOST = os.environ.get("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.environ.get("SMTP_PORT", 465))
+SMTP_SSL = os.environ.get("SMTP_SSL", "1") == "1"
+MAIL_WORKERS = int(os.environ.get("MAIL_WORKERS", 2))
+MAIL_QUEUE_SIZE = int(os.environ.get("MAIL_QUEUE_SIZE", 1000))
+MAIL_RATE = float(os.environ.get("MAIL_RATE", 5))
+MAIL_RETRIES = int(os.environ.get("MAIL_RETRIES", 5))
+MAIL_RETRY_DELAY = float(os.environ.get("MAIL_RETRY_DELAY", 1))
+
+logger = logging.getLogger(__name__)
+
+
+class SMTPConnection:
+    """
+    An SMTP connection that is opened on the first send and kept for the next ones. Its methods block, the workers
+    call them in a thread.
+    """
+
+    def __init__(self, host: str = SMTP_HOST, port: int = SMTP_PORT, ssl: bool = SMTP_SSL):
+        self.host = host
+        self.port = port
+        self.ssl = ssl
+        self.username = os.environ.get("EVENTBRITE_EMAIL")
+        self.password = os.environ.get("EVENTBRITE_PASSWORD")
+        self.server: Optional[smtplib.SMTP] = None
+
+    def send(self, recipient: str, message: Message):
+        if self.server is None:
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=30) if self.ssl \
+                else smtplib.SMTP(self.host, self.port, timeout=30)
+            if self.username and self.password:
+                try:
+                    server.login(self.username, self.password)
+                except Exception:
+                    # the retry opens a new connection, this one must not stay open
+                    server.close()
+                    raise
+            self.server = server
+        try:
+            self.server.sendmail(message["From"] or self.username, recipient, message.as_string())
+        except (smtplib.SMTPServerDisconnected, OSError):
+            # the server closed an idle connection, the next attempt opens a new one
+            self.close()
+            raise
+
+    def close(self):
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.server = None
+
+
+class RateLimiter:
+    """
+    Hands out send slots at most `rate` per second, in the order they were asked for.
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0
+        self.next_slot = 0.0
+
+    async def acquire(self):
+        now = time.monotonic()
+        slot = max(now, self.next_slot)
+        self.next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+def is_temporary(error: Exception) -> bool:
+    """
+    Whether sending again later may succeed: the connection failed or the server answered with a 4xx code.
+    """
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError))
+
+
+class Mailer:
+    """
+    The outbound mail queue and its workers.
+
+    Attributes:
+        workers (int): The number of workers, each with its own SMTP connection.
+        queue_size (int): The number of messages waiting to be sent before enqueue refuses new ones.
+        retries (int): The number of times a message is sent again after a temporary failure.
+        retry_delay (float): The seconds before the first retry, doubled for every following one.
+        connection_factory (Callable[[], SMTPConnection]): Creates the connection of a worker.
+        metrics (dict): The number of messages sent, retried and given up on.
+    """
+
+    def __init__(
+            self,
+            workers: int = MAIL_WORKERS,
+            queue_size: int = MAIL_QUEUE_SIZE,
+            rate: float = MAIL_RATE,
+            retries: int = MAIL_RETRIES,
+            retry_delay: float = MAIL_RETRY_DELAY,
+            connection_factory: Callable[[], SMTPConnection] = SMTPConnection,
+    ):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.connection_factory = connection_factory
+        self.rate_limiter = RateLimiter(rate)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.queue: Optional[asyncio.Queue] = None
+        self.tasks: list[asyncio.Task] = []
+        self.metrics = {"sent": 0, "retried": 0, "failed": 0}
+
+    def start(self):
+        """
+        Starts the workers on the running event loop, unless they already run on it.
+        """
+        loop = asyncio.get_running_loop()
+        if self.loop is loop:
+            return
+        self.loop = loop
+        self.queue = asyncio.Queue(self.queue_size)
+        self.tasks = [loop.create_task(self.work(self.connection_factory())) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 10):
+        """
+        Waits up to `timeout` seconds for the queued messages to be sent, then stops the workers.
+        """
+        if not self.tasks:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("stopping the mailer with %d unsent messages", self.queue.qsize())
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.loop = None
+        self.tasks = []
+
+    def enqueue(self, recipient: str, message: Message):
+        """
+        Queues a message to be sent in the background.
+
+        Raises:
+            HTTPException: If MAIL_QUEUE_SIZE messages are already waiting.
+        """
+        self.start()
+        try:
+            self.queue.put_nowait((recipient, message))
+        except asyncio.QueueFull:
+            raise HTTPException(detail="failed to send email.", status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    async def work(self, connection: SMTPConnection):
+        try:
+            while True:
+                recipient, message = await self.queue.get()
+                try:
+                    await self.deliver(connection, recipient, message)
+                finally:
+                    self.queue.task_done()
+        finally:
+            await asyncio.to_thread(connection.close)
+
+    async def deliver(self, connection: SMTPConnection, recipient: str, message: Message):
+        for attempt in range(self.retries + 1):
+            await self.rate_limiter.acquire()
+            try:
+                await asyncio.to_thread(connection.send, recipient, message)
+                self.metrics["sent"] += 1
+                return
+            except Exception as e:
+                if not is_temporary(e) or attempt == self.retries:
+                    self.metrics["failed"] += 1
+                    logger.error("failed to send %r to %s: %r", message["Subject"], recipient, e)
+                    return
+                self.metrics["retried"] += 1
+                await asyncio.sleep(self.retry_delay * 2 ** attempt)
+
+
+mailer = Mailer()
@@ -0,0 +1,164 @@
+import os
+import binascii
+from typing import Any, Generic, Optional, TypeVar
+
+from bson import json_util
+from bson.errors import BSONError
+from fastapi import HTTPException
+from fastapi import Query
+from fastapi import status
+from fastapi_pagination.cursor import CursorPage, CursorParams, decode_cursor
+from pymongo import ASCENDING
+
+"""
+This module contains the keyset pagination used by every list endpoint.
+
+A page is read with a range query on the sort keys of the last document of the previous page, so reading page N costs
+the same as reading the first one. The cursor handed to clients is opaque: the base64 encoded Extended JSON list of the
+sort key values of that last document.
+
+Classes:
+    - KeysetParams: The `cursor` and `size` query parameters of a paginated endpoint.
+    - KeysetPage: The response envelope of a paginated endpoint.
+
+Functions:
+    - keyset_filter: Builds the query that selects the documents after the given sort key values.
+    - find_page: Reads one page of documents and the cursor of the next one.
+    - aggregate_page: Same, for documents sorted on fields computed by an aggregation pipeline (like a relevance score).
+
+Configuration:
+    PAGE_SIZE (default 50) and MAX_PAGE_SIZE (default 100) environment variables.
+"""
+
+T = TypeVar("T")
+
+PAGE_SIZE = int(os.environ.get("PAGE_SIZE", 50))
+MAX_PAGE_SIZE = int(os.environ.get("MAX_PAGE_SIZE", 100))
+
+
+class KeysetParams(CursorParams):
+    size: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Page size")
+
+    def sort_values(self, sort: list[tuple[str, int]]) -> Optional[list]:
+        """
+        Decodes the cursor into the sort key values of the last document of the previous page.
+
+        Args:
+            sort (list[tuple[str, int]]): The sort the cursor was created for.
+
+        Returns:
+            list | None: The sort key values, or None for the first page.
+
+        Raises:
+            HTTPException: If the cursor was not created by this API for this sort.
+        """
+        if not self.cursor:
+            return None
+        try:
+            values = json_util.loads(decode_cursor(self.cursor))
+        except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, BSONError):
+            values = None
+        if not isinstance(values, list) or len(values) != len(sort):
+            raise HTTPException(detail="invalid cursor", status_code=status.HTTP_400_BAD_REQUEST)
+        return values
+
+
+class KeysetPage(CursorPage[T], Generic[T]):
+    __params_type__ = KeysetParams
+
+
+def get_field(document: dict, path: str) -> Any:
+    for key in path.split("."):
+        document = document.get(key) if isinstance(document, dict) else None
+    return document
+
+
+def keyset_filter(sort: list[tuple[str, int]], values: list) -> dict:
+    """
+    Builds the query that selects the documents that come after the given sort key values.
+
+    For a sort on (a, b) this is `a > va or (a == va and b > vb)`, with `<` for descending keys. The last sort key must
+    be unique (usually `_id`) so that no document is skipped or repeated between pages.
+
+    Args:
+        sort (list[tuple[str, int]]): The sort of the query, as (field, direction) pairs.
+        values (list): The sort key values of the last document of the previous page.
+
+    Returns:
+        dict: The MongoDB query.
+    """
+    branches = []
+    for i, (field, direction) in enumerate(sort):
+        branch = {sort[j][0]: values[j] for j in range(i)}
+        branch[field] = {"$gt" if direction == ASCENDING else "$lt": values[i]}
+        branches.append(branch)
+    return {"$or": branches}
+
+
+async def find_page(
+        collection,
+        query: dict,
+        sort: list[tuple[str, int]],
+        params: KeysetParams,
+        projection: Optional[dict] = None,
+) -> tuple[list[dict], Optional[str]]:
+    """
+    Reads one page of the documents matching a query.
+
+    One document more than the page size is read to know whether there is a next page, without counting.
+
+    Args:
+        collection (AsyncIOMotorCollection): The collection to read.
+        query (dict): The filter of the documents.
+        sort (list[tuple[str, int]]): The order of the documents. Should be backed by an index and end with a unique key.
+        params (KeysetParams): The requested cursor and page size.
+        projection (dict, optional): The fields to read. Must include every sort key. Defaults to every field.
+
+    Returns:
+        tuple[list[dict], str | None]: The documents of the page, and the raw cursor of the next page if there is one.
+    """
+    values = params.sort_values(sort)
+    if values is not None:
+        query = {"$and": [query, keyset_filter(sort, values)]}
+
+    documents = await collection.find(query, projection).sort(sort).limit(params.size + 1).to_list(
+        length=params.size + 1
+    )
+    if len(documents) <= params.size:
+        return documents, None
+
+    documents = documents[:params.size]
+    return documents, json_util.dumps([get_field(documents[-1], field) for field, _ in sort])
+
+
+async def aggregate_page(
+        collection,
+        pipeline: list[dict],
+        sort: list[tuple[str, int]],
+        params: KeysetParams,
+) -> tuple[list[dict], Optional[str]]:
+    """
+    Reads one page of the documents output by an aggregation pipeline, for sorts on fields the pipeline computes and
+    a find cannot filter on.
+
+    Args:
+        collection (AsyncIOMotorCollection): The collection to aggregate.
+        pipeline (list[dict]): The stages selecting the documents and computing the sort keys.
+        sort (list[tuple[str, int]]): The order of the documents. Should end with a unique key.
+        params (KeysetParams): The requested cursor and page size.
+
+    Returns:
+        tuple[list[dict], str | None]: The documents of the page, and the raw cursor of the next page if there is one.
+    """
+    values = params.sort_values(sort)
+    pipeline = list(pipeline)
+    if values is not None:
+        pipeline.append({"$match": keyset_filter(sort, values)})
+    pipeline += [{"$sort": dict(sort)}, {"$limit": params.size + 1}]
+
+    documents = await collection.aggregate(pipeline).to_list(length=params.size + 1)
+    if len(documents) <= params.size:
+        return documents, None
+
+    documents = documents[:params.size]
+    return documents, json_util.dumps([get_field(documents[-1], field) for field, _ in sort])
@@ -0,0 +1,70 @@
+import os
+import re
+import unicodedata
+from typing import Optional
+
+"""
+This module contains the normalization of the names users filter on (cities, categories), so that equality and prefix
+filters can be served by plain indexes instead of case-insensitive regular expressions, and of the words searched with
+the text index of the events.
+
+Functions:
+    - fold: Case-folds a name and strips its diacritics and extra spaces.
+    - prefix_filter: Builds the query matching the folded names that start with a folded prefix.
+    - search_terms: Splits a search into the terms sent to the text index.
+
+Configuration:
+    SEARCH_MIN_TERM_LENGTH (shorter terms are ignored, default 3) environment variable.
+"""
+
+SEARCH_MIN_TERM_LENGTH = int(os.environ.get("SEARCH_MIN_TERM_LENGTH", 3))
+
+SPACES = re.compile(r"\s+")
+TERM_PATTERN = re.compile(r"\w+")
+
+
+def fold(text: Optional[str]) -> Optional[str]:
+    """
+    Returns the key a name is stored and searched with: "  São  PAULO " and "sao paulo" both give "sao paulo".
+
+    Args:
+        text (str | None): The name.
+
+    Returns:
+        str | None: The folded name, or None if there is no name.
+    """
+    if text is None:
+        return None
+    if text.isascii():
+        # nothing to decompose, and ASCII case folding is lowercasing
+        return " ".join(text.lower().split())
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return SPACES.sub(" ", stripped.casefold()).strip()
+
+
+def prefix_filter(text: str) -> Optional[dict]:
+    """
+    Builds the filter matching the folded names that start with the folded `text`. The pattern is anchored and case
+    sensitive, so an index on the folded field serves it with a range scan.
+
+    Returns:
+        dict | None: The filter, or None if `text` folds to nothing and every name matches.
+    """
+    key = fold(text)
+    if not key:
+        return None
+    return {"$regex": "^" + re.escape(key)}
+
+
+def search_terms(text: str) -> list[str]:
+    """
+    Splits a search into its distinct words of at least SEARCH_MIN_TERM_LENGTH characters, lowercased. Anything else
+    (punctuation, quotes, leading dashes) is dropped, so a search cannot use the negation or phrase operators of the
+    text index.
+    """
+    terms = []
+    for term in TERM_PATTERN.findall(text.lower()):
+        if len(term) >= SEARCH_MIN_TERM_LENGTH and term not in terms:
+            terms.append(term)
+    return terms
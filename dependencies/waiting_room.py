@@ -0,0 +1,345 @@
+import os
+import time
+from datetime import datetime
+from datetime import timedelta
+from typing import Annotated, Optional
+
+import jwt
+
+from fastapi import Depends
+from fastapi import Header
+from fastapi import HTTPException
+from fastapi import status
+from pymongo import ReturnDocument
+
+from dependencies.db.client import AsyncClient
+from dependencies.db.tickets import TicketDriver
+from dependencies.models.users import UserToken
+from dependencies.models.waiting_room import QueueTicketOut, WaitingRoomIn, WaitingRoomOut
+from dependencies.token_handler import current_user
+from dependencies.utils.bson import document_exists
+from dependencies.utils.cache import TTLCache
+
+"""
+This module contains the waiting room of hot event on-sales: an admission layer in front of the ticket and order
+endpoints of an event, so that a crowd arriving at once is let in at a rate the application can serve.
+
+While the waiting room of an event is open, buyers join its queue and get a position, and positions are admitted in
+order by a token bucket: `rate` buyers per second, up to `burst` at once after a quiet period. An admitted buyer gets a
+pass, a short-lived token signed with JWT_SECRET_KEY, that the gated endpoints verify without reading the database.
+
+Classes:
+    - MemoryStore: Keeps the queues in the memory of the worker. Enough for a single worker.
+    - MongoStore: Keeps the queues in the waiting_rooms collection, shared by every worker.
+    - WaitingRoom: Opens and closes the waiting rooms, hands out positions and passes.
+
+Functions:
+    - admitted: FastAPI dependency refusing requests for an event with an open waiting room without a valid pass.
+    - admitted_user: Same, and the pass must have been handed out to the authenticated user.
+    - ticket_admitted, ticket_admitted_user: Same, for the endpoints of a ticket (holds, quantity updates).
+    - check_pass: The check behind the dependencies, for endpoints that find the event of a request themselves.
+
+Usage:
+    @router.post("/{event_id}/...", dependencies=[Depends(admitted_user)])
+
+Configuration:
+    WAITING_ROOM_STORE (memory or mongo, default memory), WAITING_ROOM_PASS_TTL (seconds a pass is valid, 300),
+    WAITING_ROOM_QUEUE_TTL (seconds a position is kept, 7200) and WAITING_ROOM_CACHE_TTL (seconds a worker trusts
+    what it knows of which rooms are open in mongo mode, 2) environment variables.
+"""
+
+WAITING_ROOM_STORE = os.environ.get("WAITING_ROOM_STORE", "memory")
+PASS_TTL = int(os.environ.get("WAITING_ROOM_PASS_TTL", 300))
+QUEUE_TTL = int(os.environ.get("WAITING_ROOM_QUEUE_TTL", 7200))
+ROOM_CACHE_TTL = float(os.environ.get("WAITING_ROOM_CACHE_TTL", 2))
+
+# the key under which MongoStore caches whether any room is open, which no event ID can collide with
+ANY_ROOM = ("any",)
+
+PASS_AUDIENCE = "waiting-room-pass"
+QUEUE_AUDIENCE = "waiting-room-queue"
+
+
+def refill(room: dict, now: float) -> dict:
+    """
+    Admits the positions the token bucket of a room can afford since it was last refilled.
+
+    Args:
+        room (dict): The room: its `rate`, `burst`, `tokens`, `refilled_at`, `issued` and `admitted_through`.
+        now (float): The current time, in seconds since the epoch.
+
+    Returns:
+        dict: The refilled room.
+    """
+    tokens = min(room["burst"], room["tokens"] + max(0.0, now - room["refilled_at"]) * room["rate"])
+    admitted = min(int(tokens), room["issued"] - room["admitted_through"])
+    return {
+        **room,
+        "tokens": tokens - admitted,
+        "admitted_through": room["admitted_through"] + admitted,
+        "refilled_at": now,
+    }
+
+
+def new_room(settings: WaitingRoomIn) -> dict:
+    return {**settings.dict(), "tokens": settings.burst, "refilled_at": time.time(), "issued": 0, "admitted_through": 0}
+
+
+class MemoryStore:
+    """
+    Keeps the waiting rooms in the memory of the worker: every worker has its own queues, so it is only suitable
+    when the application runs a single worker.
+    """
+
+    def __init__(self):
+        self.rooms: dict[str, dict] = {}
+
+    async def open(self, event_id: str, settings: WaitingRoomIn) -> dict:
+        self.rooms[event_id] = {**new_room(settings), **self.rooms.get(event_id, {}), **settings.dict()}
+        return self.rooms[event_id]
+
+    async def close(self, event_id: str) -> bool:
+        return self.rooms.pop(event_id, None) is not None
+
+    async def is_open(self, event_id: str) -> bool:
+        return event_id in self.rooms
+
+    async def any_open(self) -> bool:
+        return bool(self.rooms)
+
+    async def get(self, event_id: str) -> Optional[dict]:
+        if event_id not in self.rooms:
+            return None
+        self.rooms[event_id] = refill(self.rooms[event_id], time.time())
+        return self.rooms[event_id]
+
+    async def join(self, event_id: str) -> Optional[dict]:
+        if event_id not in self.rooms:
+            return None
+        self.rooms[event_id]["issued"] += 1
+        return await self.get(event_id)
+
+
+class MongoStore:
+    """
+    Keeps the waiting rooms in the waiting_rooms collection, so that every worker hands out positions from the same
+    queue and admits them from the same token bucket.
+
+    Positions are handed out with an atomic `$inc`. Refills are written with a compare-and-set on `refilled_at`, so
+    two workers refilling at once cannot admit the same tokens twice. Whether a room is open, and whether any room is
+    open at all, is cached for ROOM_CACHE_TTL seconds, so that the gated endpoints do not read the database on every
+    request.
+    """
+    collection_name = "waiting_rooms"
+
+    def __init__(self):
+        self.db = AsyncClient.get_instance().get_db()
+        self.collection = self.db[self.collection_name]
+        self.open_rooms = TTLCache(max_size=10000, ttl=ROOM_CACHE_TTL)
+
+    async def open(self, event_id: str, settings: WaitingRoomIn) -> dict:
+        room = new_room(settings)
+        self.open_rooms.pop(event_id)
+        self.open_rooms.pop(ANY_ROOM)
+        return await self.collection.find_one_and_update(
+            {"_id": event_id},
+            {
+                "$set": settings.dict(),
+                "$setOnInsert": {key: value for key, value in room.items() if key not in settings.dict()},
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def close(self, event_id: str) -> bool:
+        self.open_rooms.pop(event_id)
+        self.open_rooms.pop(ANY_ROOM)
+        return (await self.collection.delete_one({"_id": event_id})).deleted_count == 1
+
+    async def is_open(self, event_id: str) -> bool:
+        is_open = self.open_rooms.get(event_id)
+        if is_open is None:
+            is_open = await document_exists(self.collection, {"_id": event_id})
+            self.open_rooms.set(event_id, is_open)
+        return is_open
+
+    async def any_open(self) -> bool:
+        any_open = self.open_rooms.get(ANY_ROOM)
+        if any_open is None:
+            any_open = await document_exists(self.collection, {})
+            self.open_rooms.set(ANY_ROOM, any_open)
+        return any_open
+
+    async def get(self, event_id: str) -> Optional[dict]:
+        room = await self.collection.find_one({"_id": event_id})
+        return await self.refill(room) if room is not None else None
+
+    async def join(self, event_id: str) -> Optional[dict]:
+        room = await self.collection.find_one_and_update(
+            {"_id": event_id}, {"$inc": {"issued": 1}}, return_document=ReturnDocument.AFTER
+        )
+        return await self.refill(room) if room is not None else None
+
+    async def refill(self, room: dict) -> dict:
+        while True:
+            refilled = refill(room, time.time())
+            if refilled["admitted_through"] == room["admitted_through"]:
+                # nothing to admit: the bucket is a function of the stored state and the time, no need to write
+                return refilled
+            result = await self.collection.update_one(
+                {"_id": room["_id"], "refilled_at": room["refilled_at"]},
+                {"$set": {key: refilled[key] for key in ("tokens", "admitted_through", "refilled_at")}},
+            )
+            if result.modified_count == 1:
+                return refilled
+            # another worker refilled first, start again from what it wrote
+            room = await self.collection.find_one({"_id": room["_id"]})
+            if room is None:
+                return refilled
+
+
+def sign(payload: dict, audience: str, ttl: int) -> str:
+    payload = {**payload, "aud": audience, "exp": datetime.utcnow() + timedelta(seconds=ttl)}
+    return jwt.encode(payload, os.environ.get("JWT_SECRET_KEY"), "HS256")
+
+
+def verify(token: Optional[str], audience: str) -> Optional[dict]:
+    if not token:
+        return None
+    try:
+        return jwt.decode(token, os.environ.get("JWT_SECRET_KEY"), ["HS256"], audience=audience)
+    except jwt.exceptions.PyJWTError:
+        return None
+
+
+class WaitingRoom:
+    """
+    Opens and closes the waiting rooms of events, and hands out queue positions and passes.
+
+    Attributes:
+        store (MemoryStore | MongoStore): Where the queues are kept, chosen by WAITING_ROOM_STORE.
+    """
+
+    def __init__(self):
+        self.store = MongoStore() if WAITING_ROOM_STORE == "mongo" else MemoryStore()
+
+    async def open(self, event_id: str, settings: WaitingRoomIn) -> WaitingRoomOut:
+        return WaitingRoomOut(event_id=event_id, **await self.store.open(event_id, settings))
+
+    async def close(self, event_id: str):
+        if not await self.store.close(event_id):
+            raise HTTPException(detail="waiting room not found", status_code=status.HTTP_404_NOT_FOUND)
+
+    async def get(self, event_id: str) -> WaitingRoomOut:
+        room = await self.store.get(event_id)
+        if room is None:
+            raise HTTPException(detail="waiting room not found", status_code=status.HTTP_404_NOT_FOUND)
+        return WaitingRoomOut(event_id=event_id, **room)
+
+    async def join(self, event_id: str, user_id: str) -> QueueTicketOut:
+        """
+        Hands out the next position of the queue of an event.
+
+        Raises:
+            HTTPException: If the event has no open waiting room.
+        """
+        room = await self.store.join(event_id)
+        if room is None:
+            raise HTTPException(detail="waiting room not found", status_code=status.HTTP_404_NOT_FOUND)
+        position = room["issued"]
+        queue_token = sign({"event_id": event_id, "user_id": user_id, "position": position}, QUEUE_AUDIENCE, QUEUE_TTL)
+        return self.ticket(event_id, user_id, position, room["admitted_through"], queue_token)
+
+    async def status(self, event_id: str, user_id: str, queue_token: str) -> QueueTicketOut:
+        """
+        Tells a buyer whether their position is admitted yet, with their pass if it is.
+
+        Raises:
+            HTTPException: If the queue token was not handed out to this user for this event, or the event has no
+                open waiting room.
+        """
+        payload = verify(queue_token, QUEUE_AUDIENCE)
+        if payload is None or payload["event_id"] != event_id or payload["user_id"] != user_id:
+            raise HTTPException(detail="invalid queue token", status_code=status.HTTP_400_BAD_REQUEST)
+        room = await self.store.get(event_id)
+        if room is None:
+            raise HTTPException(detail="waiting room not found", status_code=status.HTTP_404_NOT_FOUND)
+        return self.ticket(event_id, user_id, payload["position"], room["admitted_through"], queue_token)
+
+    def ticket(self, event_id, user_id, position, admitted_through, queue_token) -> QueueTicketOut:
+        pass_token = None
+        if position <= admitted_through:
+            pass_token = sign({"event_id": event_id, "user_id": user_id}, PASS_AUDIENCE, PASS_TTL)
+        return QueueTicketOut(
+            position=position, admitted_through=admitted_through, queue_token=queue_token, pass_token=pass_token
+        )
+
+
+waiting_room = WaitingRoom()
+
+
+async def check_pass(event_id: str, pass_token: Optional[str], user_id: Optional[str] = None) -> Optional[dict]:
+    """
+    Refuses a request for an event whose waiting room is open, unless it carries a valid pass for the event, handed
+    out to `user_id` if given. The pass is only verified, never looked up.
+
+    Returns:
+        dict | None: The payload of the pass, or None if the event has no open waiting room.
+    """
+    if not await waiting_room.store.is_open(event_id):
+        return None
+    payload = verify(pass_token, PASS_AUDIENCE)
+    if payload is None or payload["event_id"] != event_id or (user_id is not None and payload["user_id"] != user_id):
+        raise HTTPException(detail="waiting room pass required", status_code=status.HTTP_403_FORBIDDEN)
+    return payload
+
+
+async def admitted(
+        event_id: str, x_waiting_room_pass: Annotated[Optional[str], Header()] = None
+) -> Optional[dict]:
+    """
+    Refuses a request for an event whose waiting room is open, unless it carries a valid pass for the event in the
+    X-Waiting-Room-Pass header.
+    """
+    return await check_pass(event_id, x_waiting_room_pass)
+
+
+async def admitted_user(
+        event_id: str,
+        user: Annotated[UserToken, Depends(current_user)],
+        x_waiting_room_pass: Annotated[Optional[str], Header()] = None,
+) -> Optional[dict]:
+    """
+    Same as admitted, and the pass must have been handed out to the authenticated user, so it cannot be shared.
+    """
+    return await check_pass(event_id, x_waiting_room_pass, user.id)
+
+
+async def ticket_admitted(
+        ticket_id: str, x_waiting_room_pass: Annotated[Optional[str], Header()] = None
+) -> Optional[dict]:
+    """
+    Same as admitted, for the endpoints of a ticket: the pass must be for the event of the ticket. The ticket is only
+    read to find its event while some waiting room is open.
+
+    Raises:
+        HTTPException: If a waiting room is open and the ticket does not exist (404), or the pass is missing (403).
+    """
+    if not await waiting_room.store.any_open():
+        return None
+    ticket = await TicketDriver().get_ticket_by_id(ticket_id)
+    return await check_pass(ticket.event_id, x_waiting_room_pass)
+
+
+async def ticket_admitted_user(
+        ticket_id: str,
+        user: Annotated[UserToken, Depends(current_user)],
+        x_waiting_room_pass: Annotated[Optional[str], Header()] = None,
+) -> Optional[dict]:
+    """
+    Same as admitted_user, for the endpoints of a ticket: the pass must be for the event of the ticket.
+    """
+    if not await waiting_room.store.any_open():
+        return None
+    ticket = await TicketDriver().get_ticket_by_id(ticket_id)
+    return await check_pass(ticket.event_id, x_waiting_room_pass, user.id)
@@ -13,9 +13,17 @@ from routers.users import users
 from routers.tickets import tickets
 from routers.orders import orders
 from routers.attendees import attendees
+from routers.holds import holds
+from routers.waiting_room import waiting_room
 
 from routers.promocodes import promocodes
 
+from dependencies.db.indexes import ensure_indexes
+from dependencies.db.holds import hold_reclaimer
+from dependencies.db.event_index import event_index
+from dependencies.db.suggestions import suggestions
+from dependencies.utils.mailer import mailer
+
 
 app = FastAPI(
     title="EventBrite",
@@ -42,5 +50,57 @@ app.include_router(tickets.router)
 app.include_router(orders.router)
 app.include_router(promocodes.router)
 app.include_router(attendees.router)
+app.include_router(holds.router)
+app.include_router(waiting_room.router)
 
 add_pagination(app)
+
+
+@app.on_event("startup")
+async def create_indexes():
+    await ensure_indexes()
+
+
+@app.on_event("startup")
+async def start_mailer():
+    mailer.start()
+
+
+@app.on_event("startup")
+async def start_hold_reclaimer():
+    hold_reclaimer.start()
+
+
+@app.on_event("startup")
+async def start_event_index():
+    event_index.start()
+
+
+@app.on_event("startup")
+async def start_suggestions():
+    suggestions.start()
+
+
+@app.on_event("shutdown")
+async def stop_password_workers():
+    auth.password_handler.shutdown()
+
+
+@app.on_event("shutdown")
+async def stop_mailer():
+    await mailer.stop()
+
+
+@app.on_event("shutdown")
+async def stop_hold_reclaimer():
+    await hold_reclaimer.stop()
+
+
+@app.on_event("shutdown")
+async def stop_event_index():
+    await event_index.stop()
+
+
+@app.on_event("shutdown")
+async def stop_suggestions():
+    await suggestions.stop()
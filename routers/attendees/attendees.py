@@ -6,12 +6,13 @@ from dependencies.db.users import UsersDriver
 from dependencies.db.attendees import AttendeeDriver
 from dependencies.db.events import EventDriver
 from dependencies.db.orders import OrderDriver
+from dependencies.utils.pagination import KeysetPage, KeysetParams
 from .email_handler import EmailHandler
 #token
-from dependencies.token_handler import TokenHandler
-from fastapi.security import OAuth2PasswordBearer
+from dependencies.token_handler import current_user
 from dependencies.models.users import UserToken
 from fastapi import Depends
+from dependencies.waiting_room import admitted_user
 
 
 router = APIRouter(
@@ -23,9 +24,6 @@ db_handler = AttendeeDriver()
 users_driver = UsersDriver()
 event_driver = EventDriver()
 order_driver = OrderDriver()
-#token
-token_handler = TokenHandler()
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 #email
 email_handler = EmailHandler()
 
@@ -54,10 +52,14 @@ email_handler = EmailHandler()
         status.HTTP_401_UNAUTHORIZED: {
             "description": "Unauthorized.",
         },
+        status.HTTP_403_FORBIDDEN: {
+            "description": "waiting room pass required",
+        },
     },
+    dependencies=[Depends(admitted_user)],
 )
 async def add_attendee(event_id: str,
-    token: Annotated[str, Depends(oauth2_scheme)],
+    user: Annotated[UserToken, Depends(current_user)],
     attendee: Attendee = Body(...,description="Attendee model",
     example={
         "first_name":"John",
@@ -68,16 +70,12 @@ async def add_attendee(event_id: str,
         "event_id":"6459447df0c9d6f57d894a60",
     })
     )->AttendeeOut:
-    user: UserToken = token_handler.get_user(token)
     user_id = user.id
-    users_driver.handle_nonexistent_user(user_id)#i think this is not needed
-    event_driver.handle_nonexistent_event(event_id)
-    order_driver.handle_nonexistent_order(attendee.order_id)
-    #update the count of order tickets
-    #order_driver.upate_tickets_count(attendee.order_id, 1)
+    await event_driver.handle_nonexistent_event(event_id)
+    await order_driver.handle_nonexistent_order(attendee.order_id)
     #send email
-    email_handler.send_email(attendee.email, event_id,attendee)
-    return db_handler.add_attendee(event_id, attendee)
+    await email_handler.send_email(attendee.email, event_id,attendee)
+    return await db_handler.add_attendee(event_id, attendee)
 
 @router.get(
     "/{attendee_id}/get_attendee",
@@ -102,8 +100,7 @@ async def add_attendee(event_id: str,
     }
 )
 async def get_attendee(attendee_id: str)->AttendeeOut:
-    db_handler.handle_nonexistent_attendee(attendee_id)
-    return db_handler.get_attendee(attendee_id)
+    return await db_handler.get_attendee(attendee_id)
 
 @router.get(
     "/{event_id}/get_attendees",
@@ -146,9 +143,9 @@ async def get_attendee(attendee_id: str)->AttendeeOut:
         },
     }
 )
-async def get_attendees(event_id: str)->List[AttendeeOut]:
-    event_driver.handle_nonexistent_event(event_id)
-    return db_handler.get_attendees(event_id)
+async def get_attendees(event_id: str, params: Annotated[KeysetParams, Depends()])->KeysetPage[AttendeeOut]:
+    await event_driver.handle_nonexistent_event(event_id)
+    return await db_handler.get_attendees(event_id, params)
 
 @router.get(
     "/order/{order_id}",
@@ -191,9 +188,11 @@ async def get_attendees(event_id: str)->List[AttendeeOut]:
         },
     }
 )
-async def get_attendees_by_order_id(order_id: str)->List[AttendeeOut]:
-    order_driver.handle_nonexistent_order(order_id)
-    return db_handler.get_attendees_by_order_id(order_id)
+async def get_attendees_by_order_id(
+        order_id: str, params: Annotated[KeysetParams, Depends()]
+)->KeysetPage[AttendeeOut]:
+    await order_driver.handle_nonexistent_order(order_id)
+    return await db_handler.get_attendees_by_order_id(order_id, params)
 
 @router.put(
     "/{attendee_id}/update_attendee",
@@ -203,8 +202,11 @@ async def get_attendees_by_order_id(order_id: str)->List[AttendeeOut]:
         status.HTTP_200_OK: {
             "description":"Attendee updated successfully"
         },
+        status.HTTP_400_BAD_REQUEST: {
+            "description": "Invalid order id.",
+        },
         status.HTTP_404_NOT_FOUND: {
-            "description": "Attendee not found.",
+            "description": "Attendee or order not found.",
         },
         status.HTTP_401_UNAUTHORIZED: {
             "description": "Unauthorized.",
@@ -212,7 +214,7 @@ async def get_attendees_by_order_id(order_id: str)->List[AttendeeOut]:
     }
 )
 async def update_attendee(attendee_id: str,
-    token: Annotated[str, Depends(oauth2_scheme)],
+    user: Annotated[UserToken, Depends(current_user)],
     updated_attributes=Body(...,description="Attendee model",
     example={
         "first_name":"John",
@@ -220,11 +222,9 @@ async def update_attendee(attendee_id: str,
         "email":"iman@yahoo.com",
         }
      )):
-    user: UserToken = token_handler.get_user(token)
     user_id = user.id
-    users_driver.handle_nonexistent_user(user_id)#i think this is not needed
-    db_handler.handle_nonexistent_attendee(attendee_id)
-    db_handler.update_attendee(attendee_id, updated_attributes)
+    await db_handler.handle_nonexistent_attendee(attendee_id)
+    await db_handler.update_attendee(attendee_id, updated_attributes)
     return PlainTextResponse("Attendee updated successfully.", status_code=status.HTTP_200_OK)
 
 @router.delete(
@@ -241,13 +241,9 @@ async def update_attendee(attendee_id: str,
     }
 )
 async def delete_attendee(attendee_id: str,
-    token: Annotated[str, Depends(oauth2_scheme)]):
-    user: UserToken = token_handler.get_user(token)
+    user: Annotated[UserToken, Depends(current_user)]):
     user_id = user.id
-    users_driver.handle_nonexistent_user(user_id)#i think this is not needed
-    db_handler.handle_nonexistent_attendee(attendee_id)
-        #update the count of order tickets
-    #order_driver.upate_tickets_count(attendee.order_id, -1)
+    await db_handler.handle_nonexistent_attendee(attendee_id)
     #delete
-    db_handler.delete_attendee(attendee_id)
+    await db_handler.delete_attendee(attendee_id)
     return PlainTextResponse("Attendee deleted successfully.", status_code=status.HTTP_200_OK)
@@ -4,13 +4,13 @@ from fastapi import APIRouter, Depends
 from fastapi import status
 from fastapi import HTTPException
 from fastapi.responses import PlainTextResponse
-from fastapi.security import OAuth2PasswordBearer
 from fastapi.security import OAuth2PasswordRequestForm
 
 from dependencies.models import users
 from dependencies.db.users import UsersDriver
 from .password_handler import PasswordHandler
 from dependencies.token_handler import TokenHandler
+from dependencies.token_handler import current_user
 from .email_handler import EmailHandler
 from .email_handler import EmailType
 
@@ -23,7 +23,6 @@ password_handler = PasswordHandler()
 token_handler = TokenHandler()
 email_handler = EmailHandler()
 users_driver = UsersDriver()
-oath2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
 @router.post(
@@ -53,10 +52,10 @@ oath2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
     }
 )
 async def signup(user: users.UserInSignup) -> PlainTextResponse:
-    users_driver.handle_existing_email(user.email)
+    await users_driver.handle_existing_email(user.email)
 
-    user.password = password_handler.get_password_hash(user.password)
-    inserted_user: users.UserOut = users_driver.create_user(user)
+    user.password = await password_handler.get_password_hash(user.password)
+    inserted_user: users.UserOut = await users_driver.create_user(user)
 
     token = token_handler.encode_token(users.UserToken(**inserted_user.dict()), 0.5)
     email_handler.send_email(user.email, token, EmailType.SIGNUP_VERIFICATION)
@@ -110,12 +109,10 @@ async def signup(user: users.UserInSignup) -> PlainTextResponse:
         }
     }
 )
-async def verify_email(token: Annotated[str, Depends(oath2_scheme)]) -> PlainTextResponse:
-    user = token_handler.get_user(token)
+async def verify_email(user: Annotated[users.UserToken, Depends(current_user)]) -> PlainTextResponse:
+    await users_driver.handle_nonexistent_email(user.email)
 
-    users_driver.handle_nonexistent_email(user.email)
-
-    if not users_driver.set_is_verified(user.email):
+    if not await users_driver.set_is_verified(user.email):
         raise HTTPException(detail="can't verify email", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
     return PlainTextResponse("email verified successfully", status_code=status.HTTP_200_OK)
@@ -185,11 +182,14 @@ async def login(user_in: Annotated[OAuth2PasswordRequestForm, Depends()]) -> use
     users_driver.validate(user_in.username)
     user_in = users.UserInLogin(email=user_in.username, password=user_in.password)
 
-    users_driver.handle_nonexistent_email(user_in.email)
-    user_db: users.UserOut = users_driver.get_user_by_email(user_in.email)
+    await users_driver.handle_nonexistent_email(user_in.email)
+    user_db: users.UserOut = await users_driver.get_user_by_email(user_in.email)
 
-    if not password_handler.verify_password(user_in.password, user_db.password):
+    verified, new_hash = await password_handler.verify_password(user_in.password, user_db.password)
+    if not verified:
         raise HTTPException(detail="wrong password", status_code=status.HTTP_401_UNAUTHORIZED)
+    if new_hash is not None:
+        await users_driver.rehash_password(user_db.email, user_db.password, new_hash)
 
     encoded_token = token_handler.encode_token(users.UserToken(**user_db.dict()))
     if not user_db.is_verified:
@@ -263,8 +263,8 @@ async def login(user_in: Annotated[OAuth2PasswordRequestForm, Depends()]) -> use
     users_driver.validate(user_in.username)
     user_in = users.UserInLogin(email=user_in.username, password=user_in.password)
 
-    users_driver.handle_nonexistent_email(user_in.email)
-    user_db: users.UserOut = users_driver.get_user_by_email(user_in.email)
+    await users_driver.handle_nonexistent_email(user_in.email)
+    user_db: users.UserOut = await users_driver.get_user_by_email(user_in.email)
 
     encoded_token = token_handler.encode_token(users.UserToken(**user_db.dict()))
     if not user_db.is_verified:
@@ -302,9 +302,9 @@ async def login(user_in: Annotated[OAuth2PasswordRequestForm, Depends()]) -> use
 
 )
 async def forgot_password(email):
-    users_driver.handle_nonexistent_email(email)
+    await users_driver.handle_nonexistent_email(email)
 
-    user_out: users.UserOut = users_driver.get_user_by_email(email)
+    user_out: users.UserOut = await users_driver.get_user_by_email(email)
     encoded_token = token_handler.encode_token(users.UserToken(**user_out.dict()), 0.5)
     email_handler.send_email(email, encoded_token, EmailType.FORGET_PASSWORD)
     return PlainTextResponse("sent a verification email", status_code=status.HTTP_200_OK)
@@ -337,13 +337,11 @@ async def forgot_password(email):
     }
 
 )
-async def change_password(token: Annotated[str, Depends(oath2_scheme)], request: users.UserInForgotPassword):
-    user = token_handler.get_user(token)
-
-    users_driver.handle_nonexistent_email(user.email)
-    new_password = password_handler.get_password_hash(request.new_password)
+async def change_password(user: Annotated[users.UserToken, Depends(current_user)], request: users.UserInForgotPassword):
+    await users_driver.handle_nonexistent_email(user.email)
+    new_password = await password_handler.get_password_hash(request.new_password)
 
-    users_driver.update_password(user.email, new_password)
+    await users_driver.update_password(user.email, new_password)
     return PlainTextResponse("password updated successfully", status_code=status.HTTP_200_OK)
 
 
@@ -373,14 +371,13 @@ async def change_password(token: Annotated[str, Depends(oath2_scheme)], request:
         }
     }
 )
-async def update_password(token: Annotated[str, Depends(oath2_scheme)], request: users.UserInUpdatePassword):
-    user = token_handler.get_user(token)
-
-    users_driver.handle_nonexistent_email(user.email)
-    db_user: users.UserOut = users_driver.get_user_by_email(user.email)
+async def update_password(user: Annotated[users.UserToken, Depends(current_user)], request: users.UserInUpdatePassword):
+    await users_driver.handle_nonexistent_email(user.email)
+    db_user: users.UserOut = await users_driver.get_user_by_email(user.email)
 
-    if not password_handler.verify_password(request.old_password, db_user.password):
+    verified, _ = await password_handler.verify_password(request.old_password, db_user.password)
+    if not verified:
         raise HTTPException(detail="password is incorrect", status_code=status.HTTP_401_UNAUTHORIZED)
-    new_password_hashed = password_handler.get_password_hash(request.new_password)
-    users_driver.update_password(user.email, new_password_hashed)
+    new_password_hashed = await password_handler.get_password_hash(request.new_password)
+    await users_driver.update_password(user.email, new_password_hashed)
     return PlainTextResponse("password updated successfully", status_code=status.HTTP_200_OK)
@@ -2,16 +2,15 @@ import os
 
 from enum import Enum
 
-from fastapi import HTTPException
-from fastapi import status
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime
 from datetime import timedelta
 
+from dependencies.utils.mailer import mailer
+
 """
-This module contains a class EmailHandler that is used for sending emails using the Gmail SMTP server. The class 
+This module contains a class EmailHandler that is used for sending emails through the mail queue. The class 
 defines two types of emails, SIGNUP_VERIFICATION and FORGET_PASSWORD, and generates the HTML content for both types of 
 emails. The class also has a method for sending emails.
 
@@ -20,8 +19,8 @@ Functions:
     - generate_html_for_signup_verification(token: str): Generates the HTML content for SIGNUP_VERIFICATION email.
     - generate_html_for_forgot_password(token: str): Generates the HTML content for FORGET_PASSWORD email.
     - get_email_body(email_type: EmailType, token: str): Returns the HTML content for the specified email type.
-    - send_email(email: str, token: str, email_type: EmailType): Sends an email of the specified email type to the 
-      specified email address.
+    - send_email(email: str, token: str, email_type: EmailType): Queues an email of the specified email type to the 
+      specified email address, it is sent in the background.
 
 Constants:
     - EmailType: An enum that defines the two types of emails, SIGNUP_VERIFICATION and FORGET_PASSWORD.
@@ -39,8 +38,6 @@ class EmailType(Enum):
 class EmailHandler:
     def __init__(self):
         self.source_email = os.environ.get("EVENTBRITE_EMAIL")
-        self.source_password = os.environ.get("EVENTBRITE_PASSWORD")
-        self.message = None
         self.expiration_date = datetime.utcnow() + timedelta(hours=24)
         self.host = os.environ.get("FRONT_HOSTNAME")
 
@@ -63,23 +60,10 @@ class EmailHandler:
             else self.generate_html_for_forgot_password(token)
 
     def send_email(self, email: str, token: str, email_type: EmailType):
-        self.message = MIMEMultipart()
-        self.message["From"] = self.source_email
-        self.message["To"] = email
-        self.message["Subject"] = "Verification email"
+        message = MIMEMultipart()
+        message["From"] = self.source_email
+        message["To"] = email
+        message["Subject"] = "Verification email"
         body = self.get_email_body(email_type, token)
-        self.message.attach(MIMEText(body, "html"))
-        try:
-            server = smtplib.SMTP_SSL("smtp.gmail.com", 465)
-            # server.starttls()
-            server.login(self.source_email, self.source_password)
-            server.sendmail(self.source_email, email, self.message.as_string())
-        except smtplib.SMTPRecipientsRefused:
-            raise HTTPException(detail="recipient email refused.",
-                                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        except smtplib.SMTPException:
-            raise HTTPException(detail="failed to send email.",
-                                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        except AttributeError:
-            raise HTTPException(detail="no source email.",
-                                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        message.attach(MIMEText(body, "html"))
+        mailer.enqueue(email, message)
@@ -1,29 +1,139 @@
+import os
+import time
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from fastapi import HTTPException
+from fastapi import status
 from passlib.context import CryptContext
 
 """
-This module contains a PasswordHandler class that uses the passlib library to handle password encryption and 
-verification. The class has two methods: verify_password and get_password_hash.
+This module contains a PasswordHandler class that uses the passlib library to handle password encryption and
+verification. bcrypt is slow on purpose, so the work is done on a small pool of worker processes instead of the event
+loop: a login burst then only delays other logins and signups, not every request of the worker.
 
 Functions:
     - __init__(): Initializes the class with the necessary instance variables.
-    - verify_password(plain_password: str, hashed_password: str) -> bool: Verifies the provided plain password 
-      against a hashed password, returns True if the verification succeeds, False otherwise.
+    - verify_password(plain_password: str, hashed_password: str) -> tuple[bool, str | None]: Verifies the provided
+      plain password against a hashed password. Returns whether the verification succeeded, and a new hash of the
+      password if the stored one was made with outdated settings (e.g. fewer BCRYPT_ROUNDS) and should be replaced.
     - get_password_hash(password: str) -> str: Hashes the provided password and returns the resulting hash string.
+    - stats() -> dict: Returns the queueing metrics of the pool, logged with every refused call.
+    - shutdown(): Stops the worker processes.
 
 Usage:
-    Create an instance of the PasswordHandler class and use the verify_password and get_password_hash methods to 
-    handle password encryption and verification. The verify_password method takes a plain password and a hashed 
-    password as parameters and returns a Boolean value indicating whether the passwords match. The get_password_hash 
-    method takes a plain password as a parameter and returns a hash string that can be stored in a database or used 
-    for password comparison.
+    Create an instance of the PasswordHandler class and await the verify_password and get_password_hash methods to
+    handle password encryption and verification. When more than HASH_QUEUE_SIZE calls are waiting for a worker, new
+    calls are refused with a 503 instead of queueing without bound. If a worker dies, the calls it broke are answered
+    with a 503 and the next call starts a new pool.
+
+Configuration:
+    BCRYPT_ROUNDS (default 12), HASH_WORKERS (default half the CPUs) and HASH_QUEUE_SIZE (default 64) environment
+    variables. Raising BCRYPT_ROUNDS takes effect for existing users on their next login.
 """
 
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", 12))
+HASH_WORKERS = int(os.environ.get("HASH_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+HASH_QUEUE_SIZE = int(os.environ.get("HASH_QUEUE_SIZE", 64))
+
+logger = logging.getLogger(__name__)
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+def hash_password(password: str) -> tuple[str, float]:
+    start = time.perf_counter()
+    return pwd_context.hash(password), time.perf_counter() - start
+
+
+def verify_password(plain_password: str, hashed_password: str) -> tuple[tuple[bool, Optional[str]], float]:
+    start = time.perf_counter()
+    new_hash = None
+    verified = pwd_context.verify(plain_password, hashed_password)
+    if verified and pwd_context.needs_update(hashed_password):
+        new_hash = pwd_context.hash(plain_password)
+    return (verified, new_hash), time.perf_counter() - start
+
+
 class PasswordHandler:
-    def __init__(self):
-        self.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    def __init__(self, workers: int = HASH_WORKERS, queue_size: int = HASH_QUEUE_SIZE):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.pending = 0
+        self.metrics = {
+            "completed": 0,
+            "rejected": 0,
+            "broken_pools": 0,
+            "rehashed": 0,
+            "max_pending": 0,
+            "queue_seconds": 0.0,
+            "hash_seconds": 0.0,
+        }
+
+    async def run(self, function, *args):
+        if self.pending >= self.workers + self.queue_size:
+            self.metrics["rejected"] += 1
+            logger.warning("password hashing queue is full, refusing the request: %s", self.stats())
+            raise HTTPException(
+                detail="server is busy, please try again",
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": "1"},
+            )
+        if self.executor is None:
+            # spawn, not fork: the workers must not inherit the threads and sockets of the server process
+            self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+        self.pending += 1
+        self.metrics["max_pending"] = max(self.metrics["max_pending"], self.pending)
+        start = time.perf_counter()
+        executor = self.executor
+        try:
+            result, hash_seconds = await asyncio.get_running_loop().run_in_executor(executor, function, *args)
+        except BrokenProcessPool:
+            # a worker died, the pool refuses every call from now on: the next call starts a new one
+            if self.executor is executor:
+                self.metrics["broken_pools"] += 1
+                logger.error("password hashing pool is broken, restarting it: %s", self.stats())
+                executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = None
+            raise HTTPException(
+                detail="server is busy, please try again",
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": "1"},
+            )
+        finally:
+            self.pending -= 1
+        self.metrics["completed"] += 1
+        self.metrics["hash_seconds"] += hash_seconds
+        self.metrics["queue_seconds"] += max(0.0, time.perf_counter() - start - hash_seconds)
+        return result
+
+    async def verify_password(self, plain_password, hashed_password):
+        verified, new_hash = await self.run(verify_password, plain_password, hashed_password)
+        if new_hash is not None:
+            self.metrics["rehashed"] += 1
+        return verified, new_hash
+
+    async def get_password_hash(self, password):
+        return await self.run(hash_password, password)
 
-    def verify_password(self, plain_password, hashed_password):
-        return self.pwd_context.verify(plain_password, hashed_password)
+    def stats(self) -> dict:
+        completed = self.metrics["completed"] or 1
+        return {
+            **self.metrics,
+            "pending": self.pending,
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "average_queue_seconds": self.metrics["queue_seconds"] / completed,
+            "average_hash_seconds": self.metrics["hash_seconds"] / completed,
+        }
 
-    def get_password_hash(self, password):
-        return self.pwd_context.hash(password)
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
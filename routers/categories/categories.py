@@ -31,7 +31,7 @@ async def create_category(category: models.Category):
     Returns:
         PlainTextResponse: A plain text response indicating successful creation of category.
     """
-    db_categories_driver.insert(category.dict())
+    await db_categories_driver.insert(category.dict())
     return PlainTextResponse("Category created successfully", status_code=200)
 
 
@@ -52,7 +52,7 @@ async def get_categories():
     Returns:
         List[categories.Category]: A list of Category objects representing all categories.
     """
-    categories = db_categories_driver.find_all()
+    categories = await db_categories_driver.find_all()
     return list(categories)
 
 
@@ -77,9 +77,9 @@ async def get_category(category_name: str):
     Returns:
         categories.Category: A Category object representing the retrieved category.
     """
-    if db_categories_driver.count({"name": category_name}) == 0:
+    if await db_categories_driver.count({"name": category_name}) == 0:
         return PlainTextResponse("Category not found", status_code=404)
-    category = db_categories_driver.find({"name": category_name})
+    category = await db_categories_driver.find({"name": category_name})
     return models.Category(**category[0])
 
 
@@ -104,7 +104,7 @@ async def get_category_sub_categories(category_name: str):
     Returns:
         List[str]: A list of strings representing the sub-categories of the retrieved category.
     """
-    if db_categories_driver.count({"name": category_name}) == 0:
+    if await db_categories_driver.count({"name": category_name}) == 0:
         return PlainTextResponse("Category not found", status_code=404)
-    category = db_categories_driver.find({"name": category_name})
+    category = await db_categories_driver.find({"name": category_name})
     return models.Category(**category[0]).sub_categories
@@ -5,17 +5,20 @@ from fastapi import status
 from fastapi import Depends
 from fastapi import APIRouter
 from fastapi import HTTPException
+from fastapi import Query
 from fastapi.responses import PlainTextResponse
-from fastapi.security import OAuth2PasswordBearer
 
 from dependencies.db.events import EventDriver
 from dependencies.db.likes import LikesDriver
 from dependencies.db.users import UsersDriver
 from dependencies.db.tickets import TicketDriver
 from dependencies.db.promocodes import PromocodeDriver
+from dependencies.db.search import EventSearchDriver
+from dependencies.db.suggestions import suggestions
 import dependencies.models.users as user_models
 import dependencies.models.events as event_models
-from dependencies.token_handler import TokenHandler
+from dependencies.token_handler import current_user
+from dependencies.utils.pagination import KeysetPage, KeysetParams
 
 
 router = APIRouter(
@@ -26,10 +29,9 @@ router = APIRouter(
 event_driver = EventDriver()
 users_driver = UsersDriver()
 likes_driver = LikesDriver()
-token_handler = TokenHandler()
 ticket_driver = TicketDriver()
 promocode_driver = PromocodeDriver()
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+search_driver = EventSearchDriver()
 
 
 @router.post(
@@ -71,24 +73,15 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
     }
 )
 async def create_event(
-        token: Annotated[str, Depends(oauth2_scheme)],
+        user: Annotated[user_models.UserToken, Depends(current_user)],
         event_in: event_models.CreateEventIn
 ) -> event_models.EventOut:
-    user: user_models.UserToken = token_handler.get_user(token)
-
-    users_driver.handle_nonexistent_user(user.id)
-    event_out_id = event_driver.create_new_event(event_models.EventDB(**event_in.dict(), creator_id=user.id))
+    event_out_id = await event_driver.create_new_event(event_models.EventDB(**event_in.dict(), creator_id=user.id))
     if event_in.tickets:
-        ticket_driver.create_tickets(event_out_id, event_in.tickets)
+        await ticket_driver.create_tickets(event_out_id, event_in.tickets)
     if event_in.promocodes:
-        promocode_driver.create_promocodes(event_out_id, event_in.promocodes)
-    return event_models.EventOut(
-        price=ticket_driver.get_minimum_price(event_out_id),
-        is_free=ticket_driver.is_free_event(event_out_id),
-        id=event_out_id,
-        **event_in.dict(),
-        creator_id=user.id
-    )
+        await promocode_driver.create_promocodes(event_out_id, event_in.promocodes)
+    return await event_driver.get_event_by_id(event_out_id)
 
 
 @router.get(
@@ -142,8 +135,7 @@ async def create_event(
 async def get_event(
         event_id: str
 ) -> event_models.EventOut:
-    event_driver.handle_nonexistent_event(event_id)
-    return event_driver.get_event_by_id(event_id)
+    return await event_driver.get_event_by_id(event_id)
 
 
 @router.delete(
@@ -181,28 +173,26 @@ async def get_event(
     }
 )
 async def delete_event(
-        token: Annotated[str, Depends(oauth2_scheme)],
+        user: Annotated[user_models.UserToken, Depends(current_user)],
         event_id: str
 ) -> PlainTextResponse:
-    user = token_handler.get_user(token)
-
-    users_driver.handle_nonexistent_user(user.id)
-    event_driver.handle_nonexistent_event(event_id)
-
-    event: event_models.EventOut = event_driver.get_event_by_id(event_id)
+    event: event_models.EventOut = await event_driver.get_event_by_id(event_id)
     if event.creator_id != user.id:
         raise HTTPException(detail="user is not the creator", status_code=status.HTTP_401_UNAUTHORIZED)
 
-    ticket_driver.delete_tickets_by_event_id(event_id)
-    promocode_driver.delete_promocodes_by_event_id(event_id)
-    likes_driver.delete_likes_by_event_id(event_id)
-    event_driver.delete_event_by_id(event_id)
+    await ticket_driver.delete_tickets_by_event_id(event_id)
+    await promocode_driver.delete_promocodes_by_event_id(event_id)
+    await likes_driver.delete_likes_by_event_id(event_id)
+    await event_driver.delete_event_by_id(event_id)
     return PlainTextResponse("Event deleted successfully", status_code=200)
 
 
 @router.get(
     "/search",
     summary="Search for events",
+    description="This endpoint returns one page of the public events matching the filters, ordered by start date. "
+                "With `facets=true`, the page also holds the counts of every matching event per category, city, "
+                "online, free and price band, to render the filters of a search in a single request.",
     responses={
         status.HTTP_200_OK: {
             "description": "events found",
@@ -240,14 +230,16 @@ async def delete_event(
 )
 async def search_events(
         city: str,
+        params: Annotated[KeysetParams, Depends()],
         online: Optional[bool] = None,
         free: Optional[bool] = None,
         title: Optional[str] = None,
         start_date: Optional[datetime] = None,
         end_date: Optional[datetime] = None,
         category: Optional[str] = None,
-) -> list[event_models.EventOut]:
-    return event_driver.search_events(
+        facets: bool = False,
+) -> event_models.EventSearchPage:
+    return await event_driver.search_events(
         city,
         online,
         free,
@@ -255,4 +247,45 @@ async def search_events(
         start_date,
         end_date,
         category,
+        params=params,
+        facets=facets,
     )
+
+
+@router.get(
+    "/search/text",
+    summary="Search for events by text",
+    description="This endpoint searches the title, summary, organizer, category and city of the public events for "
+                "any of the words of `q`, ignoring case and word endings (\"concerts\" finds \"concert\"), and "
+                "returns the most relevant events first.",
+    responses={
+        status.HTTP_200_OK: {"description": "events found"},
+        status.HTTP_400_BAD_REQUEST: {"description": "search terms must be at least 3 characters long"},
+    },
+)
+async def search_events_by_text(
+        q: Annotated[str, Query(min_length=1, max_length=200)],
+        params: Annotated[KeysetParams, Depends()],
+        online: Optional[bool] = None,
+        free: Optional[bool] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+) -> KeysetPage[event_models.EventOut]:
+    return await search_driver.search(q, params, online, free, start_date, end_date)
+
+
+@router.get(
+    "/suggest",
+    summary="Suggest completions of a search",
+    description="This endpoint completes what the user typed so far in the search box with titles of upcoming public "
+                "events, the most liked first, and with cities and categories, the ones with the most upcoming events "
+                "first, ignoring case and accents. It is served from memory and meant to be called on every keystroke.",
+    responses={
+        status.HTTP_200_OK: {"description": "completions found"},
+    },
+)
+async def suggest(
+        q: Annotated[str, Query(min_length=1, max_length=100)],
+        limit: Annotated[int, Query(ge=1, le=20)] = 8,
+) -> event_models.SuggestionsOut:
+    return suggestions.suggest(q, limit)
@@ -0,0 +1,70 @@
+from typing import Annotated
+from fastapi import APIRouter, status, Depends, Path
+from fastapi.responses import PlainTextResponse
+from dependencies.db.holds import HoldDriver
+from dependencies.models.holds import HoldOut
+#token
+from dependencies.token_handler import current_user
+from dependencies.models.users import UserToken
+from dependencies.waiting_room import ticket_admitted_user
+
+
+router = APIRouter(
+    prefix="/holds",
+    tags=["holds"],
+)
+
+db_handler = HoldDriver()
+
+
+@router.post(
+    "/ticket_id/{ticket_id}/quantity/{quantity}",
+    summary="Hold tickets",
+    description="This endpoint sets tickets aside for the user for a few minutes, while they fill in the details of "
+                "their order. Pass the hold ID to the checkout to use the held tickets, or release the hold to give "
+                "them back. Holds that are neither are given back when they expire.",
+    responses={
+        status.HTTP_200_OK: {"description": "Tickets held successfully"},
+        status.HTTP_400_BAD_REQUEST: {"description": "Not enough tickets available"},
+        status.HTTP_404_NOT_FOUND: {"description": "Ticket not found"},
+        status.HTTP_401_UNAUTHORIZED: {"description": "Unauthorized."},
+        status.HTTP_403_FORBIDDEN: {"description": "waiting room pass required"},
+    },
+    dependencies=[Depends(ticket_admitted_user)],
+)
+async def create_hold(
+        ticket_id: str,
+        quantity: Annotated[int, Path(ge=1, le=100)],
+        user: Annotated[UserToken, Depends(current_user)],
+) -> HoldOut:
+    return await db_handler.create_hold(ticket_id, quantity, user.id)
+
+
+@router.get(
+    "/hold_id/{hold_id}",
+    summary="Get hold by id",
+    description="This endpoint allows you to get a hold of the user by its id.",
+    responses={
+        status.HTTP_200_OK: {"description": "Hold retrieved successfully"},
+        status.HTTP_404_NOT_FOUND: {"description": "hold not found"},
+        status.HTTP_401_UNAUTHORIZED: {"description": "Unauthorized."},
+    },
+)
+async def get_hold(hold_id: str, user: Annotated[UserToken, Depends(current_user)]) -> HoldOut:
+    return await db_handler.get_hold(hold_id, user.id)
+
+
+@router.delete(
+    "/hold_id/{hold_id}",
+    summary="Release hold by id",
+    description="This endpoint gives the tickets of a hold of the user back.",
+    responses={
+        status.HTTP_200_OK: {"description": "Hold released successfully"},
+        status.HTTP_400_BAD_REQUEST: {"description": "hold expired / hold already converted / hold already released"},
+        status.HTTP_404_NOT_FOUND: {"description": "hold not found"},
+        status.HTTP_401_UNAUTHORIZED: {"description": "Unauthorized."},
+    },
+)
+async def release_hold(hold_id: str, user: Annotated[UserToken, Depends(current_user)]):
+    await db_handler.release_hold(hold_id, user.id)
+    return PlainTextResponse("Hold released successfully", status_code=200)
@@ -1,15 +1,21 @@
+import logging
 from fastapi.responses import PlainTextResponse
 from typing import List, Annotated
 from fastapi import APIRouter, HTTPException, status, Body
-from dependencies.models.orders import Order, OrderOut
+from dependencies.models.orders import Checkout, CheckoutOut, Order, OrderOut
 from dependencies.db.users import UsersDriver
 from dependencies.db.orders import OrderDriver
 from dependencies.db.events import EventDriver
+from dependencies.db.checkout import CheckoutDriver
+from dependencies.utils.pagination import KeysetPage, KeysetParams
 #token
-from dependencies.token_handler import TokenHandler
-from fastapi.security import OAuth2PasswordBearer
+from dependencies.token_handler import current_user
 from dependencies.models.users import UserToken
 from fastapi import Depends
+#email
+from routers.attendees.email_handler import EmailHandler
+#waiting room
+from dependencies.waiting_room import admitted_user
 
 router = APIRouter(
     prefix="/orders",
@@ -19,9 +25,9 @@ router = APIRouter(
 db_handler = OrderDriver()
 users_driver = UsersDriver()
 event_driver = EventDriver()
-#token
-token_handler = TokenHandler()
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+checkout_driver = CheckoutDriver()
+email_handler = EmailHandler()
+logger = logging.getLogger(__name__)
 
 @router.post(
     "/{event_id}/add_order",
@@ -47,10 +53,14 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
         status.HTTP_401_UNAUTHORIZED: {
             "description": "Unauthorized.",
         },
+        status.HTTP_403_FORBIDDEN: {
+            "description": "waiting room pass required",
+        },
     },
+    dependencies=[Depends(admitted_user)],
 )
 async def add_order(event_id: str,
-    token: Annotated[str, Depends(oauth2_scheme)],
+    user: Annotated[UserToken, Depends(current_user)],
     order: Order = Body(...,description="Order model",
     example={
     "first_name":"John",
@@ -62,11 +72,58 @@ async def add_order(event_id: str,
     "image_link":"https://www.example.com/image.png"
     })
 )->OrderOut:
-    event_driver.handle_nonexistent_event(event_id)
-    user: UserToken = token_handler.get_user(token)
+    await event_driver.handle_nonexistent_event(event_id)
     order.user_id = user.id
-    users_driver.handle_nonexistent_user(order.user_id)#i think it's not necessary done in get user
-    return db_handler.add_order(event_id, order)
+    return await db_handler.add_order(event_id, order)
+
+@router.post(
+    "/{event_id}/checkout",
+    summary="Buy tickets of an event",
+    description="This endpoint places an order with its attendees in one call: the tickets are reserved, the "
+                "promocode is redeemed and the order and its attendees are added in a single transaction, so either "
+                "all of it happens or none of it does.",
+    responses={
+        status.HTTP_200_OK: {
+            "description": "Order placed successfully.",
+        },
+        status.HTTP_400_BAD_REQUEST: {
+            "description": "Not enough tickets available / Not enough promocodes available / Promocode is not active.",
+        },
+        status.HTTP_404_NOT_FOUND: {
+            "description": "Event not found / Ticket not found / Promocode ID is invalid.",
+        },
+        status.HTTP_401_UNAUTHORIZED: {
+            "description": "Unauthorized.",
+        },
+        status.HTTP_403_FORBIDDEN: {
+            "description": "waiting room pass required",
+        },
+    },
+    dependencies=[Depends(admitted_user)],
+)
+async def checkout(event_id: str,
+    user: Annotated[UserToken, Depends(current_user)],
+    checkout_in: Checkout = Body(...,description="Checkout model",
+    example={
+    "first_name":"John",
+    "last_name":"Doe",
+    "email":"ahmed@gmail.com",
+    "attendees":[
+        {"first_name":"John","last_name":"Doe","email":"ahmed@gmail.com","ticket_id":"645a4f6cde817f34feab5e99"},
+        {"first_name":"Jane","last_name":"Doe","email":"jane@gmail.com","ticket_id":"645a4f6cde817f34feab5e99"},
+    ],
+    "promocode_id":"645a4f6cde817f34feab5e12",
+    })
+)->CheckoutOut:
+    event = await event_driver.get_event_by_id(event_id)
+    placed = await checkout_driver.checkout(event, user.id, checkout_in)
+    #send email, the order is placed even if the mail queue refuses the confirmations
+    for attendee in placed.attendees:
+        try:
+            await email_handler.send_email(attendee.email, event_id, attendee, event)
+        except Exception as e:
+            logger.error("could not send the confirmation of order %s to %s: %r", attendee.order_id, attendee.email, e)
+    return placed
 
 @router.get(
     "/order_id/{order_id}",
@@ -74,8 +131,7 @@ async def add_order(event_id: str,
     description="This endpoint allows you to get order by order id.",
 )
 async def get_order(order_id: str)->OrderOut:
-    db_handler.handle_nonexistent_order(order_id)
-    return db_handler.get_order(order_id)
+    return await db_handler.get_order(order_id)
 
 @router.get(
     "/myorders/",
@@ -130,11 +186,11 @@ async def get_order(order_id: str)->OrderOut:
         },
     },
 )
-async def get_orders_by_user_id( token: Annotated[str, Depends(oauth2_scheme)])->List[OrderOut]:
-    user: UserToken = token_handler.get_user(token)
+async def get_orders_by_user_id(
+        user: Annotated[UserToken, Depends(current_user)], params: Annotated[KeysetParams, Depends()]
+)->KeysetPage[OrderOut]:
     user_id = user.id
-    users_driver.handle_nonexistent_user(user_id)#i think it's not necessary done in get user
-    return db_handler.get_user_orders(user_id)
+    return await db_handler.get_user_orders(user_id, params)
 
 @router.get(
     "/event_id/{event_id}",
@@ -191,9 +247,9 @@ async def get_orders_by_user_id( token: Annotated[str, Depends(oauth2_scheme)])-
         },
     },
 )
-async def get_orders_by_event_id(event_id: str)->List[OrderOut]:
-    event_driver.handle_nonexistent_event(event_id)
-    return db_handler.get_event_orders(event_id)
+async def get_orders_by_event_id(event_id: str, params: Annotated[KeysetParams, Depends()])->KeysetPage[OrderOut]:
+    await event_driver.handle_nonexistent_event(event_id)
+    return await db_handler.get_event_orders(event_id, params)
 
 @router.put(
     "/{order_id}/edit_order",
@@ -212,7 +268,7 @@ async def get_orders_by_event_id(event_id: str)->List[OrderOut]:
     },
 )
 async def edit_order(order_id: str,
-    token: Annotated[str, Depends(oauth2_scheme)],
+    user: Annotated[UserToken, Depends(current_user)],
     updated_attributes=Body(...,description="Order model",
     example={
     "first_name":"John",
@@ -220,11 +276,9 @@ async def edit_order(order_id: str,
     "email":"ahmed2@gmail.com",
     })
     ):
-    user: UserToken = token_handler.get_user(token)
     user_id = user.id
-    users_driver.handle_nonexistent_user(user_id)#i think it's not necessary done in get user
-    db_handler.handle_nonexistent_order(order_id)
-    db_handler.edit_order(order_id, updated_attributes)
+    await db_handler.handle_nonexistent_order(order_id)
+    await db_handler.edit_order(order_id, updated_attributes)
     return PlainTextResponse("Order edited successfully.", status_code=status.HTTP_200_OK)
 
 @router.delete(
@@ -240,11 +294,9 @@ async def edit_order(order_id: str,
     },
 )
 async def delete_order(order_id: str,
-        token: Annotated[str, Depends(oauth2_scheme)]
+        user: Annotated[UserToken, Depends(current_user)]
     ):
-    user: UserToken = token_handler.get_user(token)
     user_id = user.id
-    users_driver.handle_nonexistent_user(user_id)#i think it's not necessary done in get user
-    db_handler.handle_nonexistent_order(order_id)
-    db_handler.delete_order(order_id)
+    await db_handler.handle_nonexistent_order(order_id)
+    await db_handler.delete_order(order_id)
     return PlainTextResponse("Order deleted successfully.", status_code=status.HTTP_200_OK)
@@ -1,8 +1,11 @@
-from fastapi import APIRouter, HTTPException, status, Body
-from fastapi.responses import PlainTextResponse
-from typing import List, Annotated
-from dependencies.db.promocodes import PromocodeDriver
-from dependencies.models.promocodes import PromoCode, PromocodeOut
+import json
+from fastapi import APIRouter, HTTPException, status, Body, Depends, Query
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from typing import List, Annotated, Literal
+from dependencies.db.promocodes import PromocodeDriver, apply_promocode, check_active
+from dependencies.db.tickets import TicketDriver
+from dependencies.models.promocodes import PromoCode, PromocodeBatch, PromocodeOut, PromocodePrice
+from dependencies.utils.pagination import KeysetPage, KeysetParams
 
 router = APIRouter(
     prefix="/promocodes",
@@ -10,17 +13,16 @@ router = APIRouter(
 )
 
 db_handler = PromocodeDriver()
+ticket_driver = TicketDriver()
 
 
-def unlimited(promocode_id):
-    code = db_handler.get_promocode_by_id(promocode_id)
+def unlimited(code: PromocodeOut):
     if code.is_limited is False:
         return True
     return False
 
 
-def check_amount(promocode_id, amount):
-    code = db_handler.get_promocode_by_id(promocode_id)
+def check_amount(code: PromocodeOut, amount):
     if amount < 0:
         if code.current_amount + amount < 0:
             raise HTTPException(
@@ -48,7 +50,7 @@ def check_amount(promocode_id, amount):
     },
 )
 async def create_promocodes_by_event_id(event_id: str, promocodes: List[PromoCode]):
-    if not db_handler.is_valid_event_id(event_id):
+    if not await db_handler.is_valid_event_id(event_id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Event ID is invalid")
 
     for code in promocodes:
@@ -57,13 +59,48 @@ async def create_promocodes_by_event_id(event_id: str, promocodes: List[PromoCod
                                 detail=f"Current amount can't be more than limited amount for {code.name}")
         elif code.current_amount is None:
             code.current_amount = code.limited_amount
-    insertion = db_handler.create_promocodes(event_id, promocodes)
+    insertion = await db_handler.create_promocodes(event_id, promocodes)
     if insertion:
         return insertion
     else:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Promocodes creation failed")
 
 
+@router.post(
+    "/event_id/{event_id}/generate",
+    summary="Generate single-use promocodes by event id",
+    description="This endpoint generates `count` unique promocodes usable once each, named `prefix` followed by a "
+                "random part, and streams them back as they are inserted: as CSV (`id,name` lines after a header) or "
+                "as NDJSON (one `{\"id\": ..., \"name\": ...}` object per line). If the stream ends with fewer "
+                "codes than requested, only those were created.",
+    tags=["promocodes"],
+    responses={
+        200: {"description": "Promocodes generated successfully"},
+        404: {"description": "Event ID is invalid"},
+    },
+)
+async def generate_promocodes_by_event_id(
+        event_id: str, batch: PromocodeBatch, format: Literal["csv", "ndjson"] = "csv"
+) -> StreamingResponse:
+    if not await db_handler.is_valid_event_id(event_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Event ID is invalid")
+
+    async def lines():
+        if format == "csv":
+            yield "id,name\n"
+        async for promocodes in db_handler.generate_promocodes(event_id, batch):
+            if format == "csv":
+                yield "".join(f"{promocode['_id']},{promocode['name']}\n" for promocode in promocodes)
+            else:
+                yield "".join(
+                    json.dumps({"id": str(promocode["_id"]), "name": promocode["name"]}) + "\n"
+                    for promocode in promocodes
+                )
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(lines(), media_type=media_type)
+
+
 @router.put(
     "/promocode_id/{promocode_id}",
     summary="Update promocode by promocode id",
@@ -89,13 +126,9 @@ async def update_promocode_by_id(promocode_id: str,
                                          "end_date_time": "2023-05-31T23:59:59"
                                      }
                                  )]):
-    if not db_handler.is_valid_promocode_id(promocode_id):
+    if not await db_handler.update_promocode(promocode_id, updated_promocode):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Promocode ID is invalid")
-
-    if db_handler.update_promocode(promocode_id, updated_promocode):
-        return PlainTextResponse("Promocode updated successfully", status_code=200)
-    else:
-        raise HTTPException(status_code=500, detail="Promocode update failed")
+    return PlainTextResponse("Promocode updated successfully", status_code=200)
 
 
 @router.put(
@@ -112,14 +145,12 @@ async def update_promocode_by_id(promocode_id: str,
     },
 )
 async def update_promocode_amount_by_id(promocode_id: str, amount: int):
-    if not db_handler.is_valid_promocode_id(promocode_id):
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Promocode ID is invalid")
-
-    if unlimited(promocode_id):
+    code = await db_handler.get_promocode_by_id(promocode_id, not_found="Promocode ID is invalid")
+    if unlimited(code):
         return PlainTextResponse("Promocode is unlimited", status_code=200)
 
-    check_amount(promocode_id, amount)
-    if db_handler.update_promocode_amount(promocode_id, amount):
+    check_amount(code, amount)
+    if await db_handler.update_promocode_amount(promocode_id, amount):
         return PlainTextResponse("Promocode amount updated successfully", status_code=200)
     else:
         raise HTTPException(status_code=status.HTTP_408_REQUEST_TIMEOUT, detail="Promocode amount update failed")
@@ -135,11 +166,13 @@ async def update_promocode_amount_by_id(promocode_id: str, amount: int):
         404: {"description": "Event ID not found"},
     },
 )
-async def get_promocodes_by_event_id(event_id: str) -> List[PromocodeOut]:
-    if not db_handler.is_valid_event_id(event_id):
+async def get_promocodes_by_event_id(
+        event_id: str, params: Annotated[KeysetParams, Depends()]
+) -> KeysetPage[PromocodeOut]:
+    if not await db_handler.is_valid_event_id(event_id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Event ID not found")
 
-    return db_handler.get_promocodes(event_id)
+    return await db_handler.get_promocodes_page(event_id, params)
 
 
 @router.get(
@@ -153,10 +186,32 @@ async def get_promocodes_by_event_id(event_id: str) -> List[PromocodeOut]:
     },
 )
 async def get_promocode_by_id(promocode_id: str):
-    if not db_handler.is_valid_promocode_id(promocode_id):
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Promocode ID not found")
+    return await db_handler.get_promocode_by_id(promocode_id)
 
-    return db_handler.get_promocode_by_id(promocode_id)
+
+@router.get(
+    "/event_id/{event_id}/name/{name}/price",
+    summary="Apply promocode by name",
+    description="This endpoint checks that the promocode the buyer typed exists for the event (ignoring case) and can "
+                "be used now, and returns the price of the given tickets with and without it. Repeat a ticket id to "
+                "price several tickets of the same type.",
+    tags=["promocodes"],
+    responses={
+        200: {"description": "Promocode applied successfully"},
+        400: {"description": "Promocode is not active / Not enough promocodes available"},
+        404: {"description": "Promocode not found / Ticket not found"},
+    },
+)
+async def apply_promocode_by_name(
+        event_id: str, name: str, ticket_ids: Annotated[List[str], Query(min_items=1, max_items=100)]
+) -> PromocodePrice:
+    promocode = await db_handler.get_promocode_by_name(event_id, name)
+    check_active(promocode)
+    tickets = await ticket_driver.get_tickets_by_ids(list(set(ticket_ids)))
+    if any(ticket_id not in tickets or tickets[ticket_id].event_id != event_id for ticket_id in ticket_ids):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ticket not found")
+    price = sum(tickets[ticket_id].price for ticket_id in ticket_ids)
+    return PromocodePrice(promocode=promocode, price=price, discounted_price=apply_promocode(price, promocode))
 
 
 @router.delete(
@@ -170,10 +225,10 @@ async def get_promocode_by_id(promocode_id: str):
     },
 )
 async def delete_promocodes_by_event_id(event_id: str):
-    if not db_handler.is_valid_event_id(event_id):
+    if not await db_handler.is_valid_event_id(event_id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Event ID is invalid")
 
-    db_handler.delete_promocodes_by_event_id(event_id)
+    await db_handler.delete_promocodes_by_event_id(event_id)
     return PlainTextResponse("Promocodes deleted successfully", status_code=200)
 
 
@@ -188,8 +243,6 @@ async def delete_promocodes_by_event_id(event_id: str):
     },
 )
 async def delete_promocode_by_id(promocode_id: str):
-    if not db_handler.is_valid_promocode_id(promocode_id):
+    if not await db_handler.delete_promocode_by_id(promocode_id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Promocode ID is invalid")
-
-    db_handler.delete_promocode_by_id(promocode_id)
     return PlainTextResponse("Promocode deleted successfully", status_code=200)
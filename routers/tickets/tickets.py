@@ -1,8 +1,10 @@
 from fastapi.responses import PlainTextResponse
 from typing import List, Annotated
-from fastapi import APIRouter, HTTPException, status, Body
+from fastapi import APIRouter, HTTPException, status, Body, Depends
 from dependencies.db.tickets import TicketDriver
 from dependencies.models.tickets import TicketIn, TicketOut
+from dependencies.utils.pagination import KeysetPage, KeysetParams
+from dependencies.waiting_room import ticket_admitted
 
 
 router = APIRouter(
@@ -13,24 +15,6 @@ router = APIRouter(
 db_handler = TicketDriver()
 
 
-def check_quantity(ticket_id, quantity):
-    ticket = db_handler.get_ticket_by_id(ticket_id)
-    if quantity < 0:
-        if ticket.available_quantity + quantity < 0:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Not enough tickets available",
-            )
-        return True
-    if quantity > 0:
-        if ticket.available_quantity + quantity > ticket.max_quantity:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Too many tickets",
-            )
-        return True
-
-
 @router.post(
     "/event_id/{event_id}",
     summary="Create tickets by event id",
@@ -43,9 +27,9 @@ def check_quantity(ticket_id, quantity):
     },
 )
 async def create_tickets_by_event_id(event_id: str, tickets: List[TicketIn]):
-    if not db_handler.is_valid_event_id(event_id):
+    if not await db_handler.is_valid_event_id(event_id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Event not found")
-    inserted = db_handler.create_tickets(event_id, tickets)
+    inserted = await db_handler.create_tickets(event_id, tickets)
     if inserted:
         return inserted
     else:
@@ -62,11 +46,13 @@ async def create_tickets_by_event_id(event_id: str, tickets: List[TicketIn]):
         404: {"description": "Event not found"},
     },
 )
-async def get_tickets_by_event_id(event_id: str) -> List[TicketOut]:
-    if db_handler.is_valid_event_id(event_id) == 0:
+async def get_tickets_by_event_id(
+        event_id: str, params: Annotated[KeysetParams, Depends()]
+) -> KeysetPage[TicketOut]:
+    if await db_handler.is_valid_event_id(event_id) == 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Event not found")
 
-    return db_handler.get_tickets(event_id)
+    return await db_handler.get_tickets_page(event_id, params)
 
 
 @router.get(
@@ -80,9 +66,7 @@ async def get_tickets_by_event_id(event_id: str) -> List[TicketOut]:
     },
 )
 async def get_tickets_by_ticket_id(ticket_id: str) -> TicketOut:
-    if db_handler.is_valid_ticket_id(ticket_id) == 0:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ticket not found")
-    return db_handler.get_ticket_by_id(ticket_id)
+    return await db_handler.get_ticket_by_id(ticket_id)
 
 
 @router.put(
@@ -106,10 +90,7 @@ async def update_ticket_by_ticket_id(
             },
         )]
 ):
-    if db_handler.is_valid_ticket_id(ticket_id) == 0:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ticket not found")
-
-    if db_handler.update_ticket(ticket_id, updated_attributes):
+    if await db_handler.update_ticket(ticket_id, updated_attributes):
         return PlainTextResponse("Ticket updated successfully", status_code=200)
     else:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ticket not found")
@@ -125,15 +106,12 @@ async def update_ticket_by_ticket_id(
         404: {"description": "Ticket not found"},
         400: {"description": "Not enough tickets available"},
         400: {"description": "Too many tickets"},
+        403: {"description": "waiting room pass required"},
     },
+    dependencies=[Depends(ticket_admitted)],
 )
 async def update_ticket_by_available_quantity(ticket_id: str, quantity: int):
-    if db_handler.is_valid_ticket_id(ticket_id) == 0:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ticket not found")
-
-    check_quantity(ticket_id, quantity)
-
-    if db_handler.update_quantity(ticket_id, quantity):
+    if await db_handler.update_quantity(ticket_id, quantity):
         return PlainTextResponse("Tickets updated successfully", status_code=200)
     else:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ticket not found")
@@ -150,10 +128,10 @@ async def update_ticket_by_available_quantity(ticket_id: str, quantity: int):
     },
 )
 async def delete_tickets_by_event_id(event_id: str):
-    if db_handler.is_valid_event_id(event_id) == 0:
+    if await db_handler.is_valid_event_id(event_id) == 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Event not found")
 
-    if db_handler.delete_tickets_by_event_id(event_id):
+    if await db_handler.delete_tickets_by_event_id(event_id):
         return PlainTextResponse("Tickets deleted successfully", status_code=200)
     else:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Event not found")
@@ -170,10 +148,7 @@ async def delete_tickets_by_event_id(event_id: str):
     },
 )
 async def delete_tickets_by_ticket_id(ticket_id: str):
-    if db_handler.is_valid_ticket_id(ticket_id) == 0:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ticket not found")
-
-    if db_handler.delete_ticket_by_ticket_id(ticket_id):
+    if await db_handler.delete_ticket_by_ticket_id(ticket_id):
         return PlainTextResponse("Tickets deleted successfully", status_code=status.HTTP_200_OK)
     else:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ticket not found")
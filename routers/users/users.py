@@ -3,15 +3,16 @@ from typing import Annotated, Optional
 from fastapi import APIRouter, Depends
 from fastapi import status
 from fastapi.responses import PlainTextResponse
-from fastapi.security import OAuth2PasswordBearer
 
 from dependencies.models import events
 from dependencies.db.users import UsersDriver
 from dependencies.db.events import EventDriver
 from dependencies.db.likes import LikesDriver
 from dependencies.db.follow import FollowsDriver
+from dependencies.db.loaders import Loaders, get_loaders
 from dependencies.models import users
-from dependencies.token_handler import TokenHandler
+from dependencies.token_handler import current_user
+from dependencies.utils.pagination import KeysetPage, KeysetParams
 
 router = APIRouter(
     prefix="/users",
@@ -19,15 +20,13 @@ router = APIRouter(
 )
 
 users_driver = UsersDriver()
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
-token_handler = TokenHandler()
 likes_driver = LikesDriver()
 event_driver = EventDriver()
 follows_driver = FollowsDriver()
 
 
-def get_user_info(user_id: str) -> users.UserInfo:
-    return users_driver.get_user_by_id(user_id)
+async def get_user_info(user_id: str) -> users.UserInfo:
+    return await users_driver.get_user_by_id(user_id)
 
 
 @router.get(
@@ -57,7 +56,7 @@ def get_user_info(user_id: str) -> users.UserInfo:
     }
 )
 async def check_email(email: str):
-    users_driver.handle_nonexistent_email(email)
+    await users_driver.handle_nonexistent_email(email)
 
     return PlainTextResponse("email is available", status_code=status.HTTP_200_OK)
 
@@ -99,8 +98,8 @@ async def check_email(email: str):
     }
 )
 async def get_avatar(email: str) -> users.UserAvatar:
-    users_driver.handle_nonexistent_email(email)
-    return users.UserAvatar(**users_driver.get_user_by_email(email).dict())
+    await users_driver.handle_nonexistent_email(email)
+    return users.UserAvatar(**(await users_driver.get_user_by_email(email)).dict())
 
 
 @router.get(
@@ -144,7 +143,7 @@ async def get_avatar(email: str) -> users.UserAvatar:
     }
 )
 async def get_user_by_id(user_id) -> users.UserInfo:
-    return get_user_info(user_id)
+    return await get_user_info(user_id)
 
 
 @router.get(
@@ -152,9 +151,8 @@ async def get_user_by_id(user_id) -> users.UserInfo:
     summary="get user information",
     description="get the user firstname, lastname and avatar",
 )
-async def get_info(token: Annotated[str, Depends(oauth2_scheme)]) -> users.UserInfo:
-    user = token_handler.get_user(token)
-    return get_user_info(user.id)
+async def get_info(user: Annotated[users.UserToken, Depends(current_user)]) -> users.UserInfo:
+    return await get_user_info(user.id)
 
 
 @router.post(
@@ -202,13 +200,10 @@ async def get_info(token: Annotated[str, Depends(oauth2_scheme)]) -> users.UserI
         }
     }
 )
-async def like_event(event_id: str, token: Annotated[str, Depends(oauth2_scheme)]):
-    user = token_handler.get_user(token)
+async def like_event(event_id: str, user: Annotated[users.UserToken, Depends(current_user)]):
+    await event_driver.handle_nonexistent_event(event_id)
 
-    users_driver.handle_nonexistent_user(user.id)
-    event_driver.handle_nonexistent_event(event_id)
-
-    likes_driver.like_event(user.id, event_id)
+    await likes_driver.like_event(user.id, event_id)
     return PlainTextResponse("event liked", status_code=status.HTTP_200_OK)
 
 
@@ -257,13 +252,10 @@ async def like_event(event_id: str, token: Annotated[str, Depends(oauth2_scheme)
         }
     }
 )
-async def unlike_event(event_id: str, token: Annotated[str, Depends(oauth2_scheme)]):
-    user = token_handler.get_user(token)
-
-    users_driver.handle_nonexistent_user(user.id)
-    event_driver.handle_nonexistent_event(event_id)
+async def unlike_event(event_id: str, user: Annotated[users.UserToken, Depends(current_user)]):
+    await event_driver.handle_nonexistent_event(event_id)
 
-    likes_driver.unlike_event(user.id, event_id)
+    await likes_driver.unlike_event(user.id, event_id)
     return PlainTextResponse("event unliked", status_code=status.HTTP_200_OK)
 
 
@@ -318,25 +310,31 @@ async def unlike_event(event_id: str, token: Annotated[str, Depends(oauth2_schem
         }
     }
 )
-async def get_liked_events(token: Annotated[str, Depends(oauth2_scheme)]) -> list[events.EventCard]:
-    user = token_handler.get_user(token)
-
-    users_driver.handle_nonexistent_user(user.id)
-
-    return [
+async def get_liked_events(
+        user: Annotated[users.UserToken, Depends(current_user)],
+        params: Annotated[KeysetParams, Depends()],
+        loaders: Annotated[Loaders, Depends(get_loaders)],
+) -> KeysetPage[events.EventCard]:
+    liked_events = await likes_driver.get_liked_events(user.id, params)
+    events_out = [event for event in await loaders.events.load_many(liked_events.items) if event is not None]
+    creators = dict(zip(
+        [event_out.creator_id for event_out in events_out],
+        await loaders.users.load_many([event_out.creator_id for event_out in events_out]),
+    ))
+
+    return liked_events.copy(update={"items": [
         events.EventCard(
             id=event_out.id,
             title=event_out.basic_info.title,
             start_date_time=event_out.date_and_time.start_date_time,
             image_link=event_out.image_link,
             is_online=event_out.location.is_online,
-            creator_info=users_driver.get_user_by_id(event_out.creator_id),
+            creator_info=creators[event_out.creator_id],
             location=event_out.location
         )
-        for event_out in [
-            event_driver.get_event_by_id(event_id) for event_id in likes_driver.get_liked_events(user.id)
-        ]
-    ]
+        for event_out in events_out
+        if creators[event_out.creator_id] is not None
+    ]})
 
 
 @router.get(
@@ -374,13 +372,10 @@ async def get_liked_events(token: Annotated[str, Depends(oauth2_scheme)]) -> lis
         }
     }
 )
-async def is_liked(event_id: str, token: Annotated[str, Depends(oauth2_scheme)]) -> bool:
-    user = token_handler.get_user(token)
-
-    users_driver.handle_nonexistent_user(user.id)
-    event_driver.handle_nonexistent_event(event_id)
+async def is_liked(event_id: str, user: Annotated[users.UserToken, Depends(current_user)]) -> bool:
+    await event_driver.handle_nonexistent_event(event_id)
 
-    return likes_driver.is_event_liked(user.id, event_id)
+    return await likes_driver.is_event_liked(user.id, event_id)
 
 
 @router.post(
@@ -439,13 +434,10 @@ async def is_liked(event_id: str, token: Annotated[str, Depends(oauth2_scheme)])
         }
     }
 )
-async def follow_user(user_id: str, token: Annotated[str, Depends(oauth2_scheme)]):
-    user = token_handler.get_user(token)
-
-    users_driver.handle_nonexistent_user(user.id)
-    users_driver.handle_nonexistent_user(user_id)
+async def follow_user(user_id: str, user: Annotated[users.UserToken, Depends(current_user)]):
+    await users_driver.handle_nonexistent_user(user_id)
 
-    follows_driver.follow_user(user.id, user_id)
+    await follows_driver.follow_user(user.id, user_id)
     return PlainTextResponse("user followed", status_code=status.HTTP_200_OK)
 
 
@@ -494,13 +486,10 @@ async def follow_user(user_id: str, token: Annotated[str, Depends(oauth2_scheme)
         }
     }
 )
-async def unfollow_user(user_id: str, token: Annotated[str, Depends(oauth2_scheme)]):
-    user = token_handler.get_user(token)
+async def unfollow_user(user_id: str, user: Annotated[users.UserToken, Depends(current_user)]):
+    await users_driver.handle_nonexistent_user(user_id)
 
-    users_driver.handle_nonexistent_user(user.id)
-    users_driver.handle_nonexistent_user(user_id)
-
-    follows_driver.unfollow_user(user.id, user_id)
+    await follows_driver.unfollow_user(user.id, user_id)
     return PlainTextResponse("user unfollowed", status_code=status.HTTP_200_OK)
 
 
@@ -542,12 +531,15 @@ async def unfollow_user(user_id: str, token: Annotated[str, Depends(oauth2_schem
         }
     }
 )
-async def get_followed_users(token: Annotated[str, Depends(oauth2_scheme)]) -> list[users.UserInfo]:
-    user = token_handler.get_user(token)
-
-    users_driver.handle_nonexistent_user(user.id)
-
-    return [users_driver.get_user_by_id(user_id) for user_id in follows_driver.get_followed_users(user.id)]
+async def get_followed_users(
+        user: Annotated[users.UserToken, Depends(current_user)],
+        params: Annotated[KeysetParams, Depends()],
+        loaders: Annotated[Loaders, Depends(get_loaders)],
+) -> KeysetPage[users.UserInfo]:
+    followed_users = await follows_driver.get_followed_users(user.id, params)
+    return followed_users.copy(update={"items": [
+        followed for followed in await loaders.users.load_many(followed_users.items) if followed is not None
+    ]})
 
 
 @router.get(
@@ -584,13 +576,10 @@ async def get_followed_users(token: Annotated[str, Depends(oauth2_scheme)]) -> l
         }
     }
 )
-async def is_followed(user_id: str, token: Annotated[str, Depends(oauth2_scheme)]):
-    user = token_handler.get_user(token)
+async def is_followed(user_id: str, user: Annotated[users.UserToken, Depends(current_user)]):
+    await users_driver.handle_nonexistent_user(user_id)
 
-    users_driver.handle_nonexistent_user(user.id)
-    users_driver.handle_nonexistent_user(user_id)
-
-    if follows_driver.is_user_followed(user.id, user_id):
+    if await follows_driver.is_user_followed(user.id, user_id):
         return PlainTextResponse("true", status_code=status.HTTP_200_OK)
     else:
         return PlainTextResponse("false", status_code=status.HTTP_404_NOT_FOUND)
@@ -632,14 +621,12 @@ async def is_followed(user_id: str, token: Annotated[str, Depends(oauth2_scheme)
         }
     })
 async def edit_info(
-        token: Annotated[str, Depends(oauth2_scheme)],
+        user: Annotated[users.UserToken, Depends(current_user)],
         firstname: Optional[str] = None,
         lastname: Optional[str] = None,
         avatar_url: Optional[str] = None,
 ) -> PlainTextResponse:
-    user = token_handler.get_user(token)
-    users_driver.handle_nonexistent_user(user.id)
-    users_driver.edit_info(user.id, firstname, lastname, avatar_url)
+    await users_driver.edit_info(user.id, firstname, lastname, avatar_url)
     return PlainTextResponse("User information updated successfully", status_code=status.HTTP_200_OK)
 
 
@@ -702,9 +689,8 @@ async def edit_info(
         }
     }
 )
-async def get_created_events(token: Annotated[str, Depends(oauth2_scheme)]) -> list[events.EventOut]:
-    user = token_handler.get_user(token)
-
-    users_driver.handle_nonexistent_user(user.id)
-
-    return event_driver.get_events_by_creator_id(user.id)
+async def get_created_events(
+        user: Annotated[users.UserToken, Depends(current_user)],
+        params: Annotated[KeysetParams, Depends()],
+) -> KeysetPage[events.EventOut]:
+    return await event_driver.get_events_by_creator_id(user.id, params)
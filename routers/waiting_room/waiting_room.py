@@ -0,0 +1,103 @@
+from typing import Annotated
+from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi.responses import PlainTextResponse
+from dependencies.db.events import EventDriver
+from dependencies.models.waiting_room import QueueTicketOut, WaitingRoomIn, WaitingRoomOut
+from dependencies.waiting_room import waiting_room
+#token
+from dependencies.token_handler import current_user
+from dependencies.models.users import UserToken
+
+
+router = APIRouter(
+    prefix="/waiting-room",
+    tags=["waiting room"],
+)
+
+event_driver = EventDriver()
+
+
+async def check_creator(event_id: str, user: UserToken):
+    event = await event_driver.get_event_by_id(event_id)
+    if event.creator_id != user.id:
+        raise HTTPException(detail="user is not the creator", status_code=status.HTTP_401_UNAUTHORIZED)
+
+
+@router.put(
+    "/event_id/{event_id}",
+    summary="Open the waiting room of an event",
+    description="This endpoint opens the waiting room of an event, or changes its admission rate if it is open. "
+                "While it is open, buying tickets of the event requires a pass from the waiting room.",
+    responses={
+        status.HTTP_200_OK: {"description": "Waiting room opened successfully"},
+        status.HTTP_404_NOT_FOUND: {"description": "event not found"},
+        status.HTTP_401_UNAUTHORIZED: {"description": "user is not the creator"},
+    },
+)
+async def open_waiting_room(
+        event_id: str, settings: WaitingRoomIn, user: Annotated[UserToken, Depends(current_user)]
+) -> WaitingRoomOut:
+    await check_creator(event_id, user)
+    return await waiting_room.open(event_id, settings)
+
+
+@router.get(
+    "/event_id/{event_id}",
+    summary="Get the waiting room of an event",
+    description="This endpoint returns the admission rate of the waiting room of an event and how far it got.",
+    responses={
+        status.HTTP_200_OK: {"description": "Waiting room retrieved successfully"},
+        status.HTTP_404_NOT_FOUND: {"description": "waiting room not found"},
+    },
+)
+async def get_waiting_room(event_id: str) -> WaitingRoomOut:
+    return await waiting_room.get(event_id)
+
+
+@router.delete(
+    "/event_id/{event_id}",
+    summary="Close the waiting room of an event",
+    description="This endpoint closes the waiting room of an event: buying its tickets no longer requires a pass.",
+    responses={
+        status.HTTP_200_OK: {"description": "Waiting room closed successfully"},
+        status.HTTP_404_NOT_FOUND: {"description": "event not found / waiting room not found"},
+        status.HTTP_401_UNAUTHORIZED: {"description": "user is not the creator"},
+    },
+)
+async def close_waiting_room(event_id: str, user: Annotated[UserToken, Depends(current_user)]):
+    await check_creator(event_id, user)
+    await waiting_room.close(event_id)
+    return PlainTextResponse("Waiting room closed successfully", status_code=200)
+
+
+@router.post(
+    "/event_id/{event_id}/join",
+    summary="Join the waiting room of an event",
+    description="This endpoint gives the user the next position in the queue of an event. The pass is returned at "
+                "once if the position is already admitted, otherwise poll the status with the queue token.",
+    responses={
+        status.HTTP_200_OK: {"description": "Waiting room joined successfully"},
+        status.HTTP_404_NOT_FOUND: {"description": "waiting room not found"},
+        status.HTTP_401_UNAUTHORIZED: {"description": "Unauthorized."},
+    },
+)
+async def join_waiting_room(event_id: str, user: Annotated[UserToken, Depends(current_user)]) -> QueueTicketOut:
+    return await waiting_room.join(event_id, user.id)
+
+
+@router.get(
+    "/event_id/{event_id}/status",
+    summary="Get the place of the user in the waiting room of an event",
+    description="This endpoint tells whether the position of the queue token is admitted yet, and returns the pass "
+                "to send in the X-Waiting-Room-Pass header if it is.",
+    responses={
+        status.HTTP_200_OK: {"description": "Status retrieved successfully"},
+        status.HTTP_400_BAD_REQUEST: {"description": "invalid queue token"},
+        status.HTTP_404_NOT_FOUND: {"description": "waiting room not found"},
+        status.HTTP_401_UNAUTHORIZED: {"description": "Unauthorized."},
+    },
+)
+async def get_status(
+        event_id: str, queue_token: str, user: Annotated[UserToken, Depends(current_user)]
+) -> QueueTicketOut:
+    return await waiting_room.status(event_id, user.id, queue_token)
@@ -0,0 +1,7 @@
+from fastapi.testclient import TestClient
+
+from main import app
+
+# The async Mongo client binds to the first event loop that uses it, so all test modules share one client that is
+# entered once and keeps a single event loop (its portal) alive for every request and driver call.
+client = TestClient(app).__enter__()
@@ -0,0 +1,71 @@
+from datetime import datetime
+from datetime import timedelta
+
+from bson import ObjectId
+
+from dependencies.db.event_index import EventIndex
+
+NOW = datetime(2030, 1, 1)
+
+
+def event(hours: int, city: str, is_public: bool = True) -> dict:
+    return {
+        "_id": ObjectId(),
+        "state": {"is_public": is_public},
+        "date_and_time": {"start_date_time": NOW + timedelta(hours=hours)},
+        "location": {"is_online": False},
+        "ticket_summary": {"min_price": 10, "is_free": False},
+        "normalized": {"city": city, "category": "music"},
+    }
+
+
+def test_search_pages_follow_start_time_then_id():
+    """Test that the index pages through the matching events in the order of the search results, cursor included"""
+    events = [event(hours, city) for hours in (3, 1, 1, 2) for city in ("cairo", "cairns")] + [event(0, "cairo", False)]
+    index = EventIndex(enabled=True)
+    index.build(events, NOW)
+    expected = sorted(
+        (e for e in events if e["normalized"]["city"] == "cairo" and e["state"]["is_public"]),
+        key=lambda e: (e["date_and_time"]["start_date_time"], e["_id"]),
+    )
+
+    ids, after = index.search("CAIRO", None, None, NOW, None, None, None, 3)
+    assert ids == [e["_id"] for e in expected[:3]]
+    assert after == [expected[2]["date_and_time"]["start_date_time"], expected[2]["_id"]]
+    ids, after = index.search("CAIRO", None, None, NOW, None, None, after, 3)
+    assert ids == [expected[3]["_id"]] and after is None
+    assert index.search("cai", None, True, NOW, None, None, None, 3) == ([], None)
+
+
+def test_search_falls_back_outside_the_index():
+    """Test that searches the index cannot answer are left to MongoDB, and that changes are applied incrementally"""
+    index = EventIndex(enabled=True)
+    assert index.search("", None, None, NOW, None, None, None, 3) is None
+    index.build([], NOW)
+    assert index.search("", None, None, None, None, None, None, 3) is None
+    assert index.search("", None, None, NOW - timedelta(days=1), None, None, None, 3) is None
+
+    added = event(1, "giza")
+    index.apply({"operationType": "insert", "documentKey": {"_id": added["_id"]}, "fullDocument": added})
+    assert index.search("giz", None, None, NOW, None, None, None, 3) == ([added["_id"]], None)
+    index.apply({"operationType": "delete", "documentKey": {"_id": added["_id"]}})
+    assert index.search("giz", None, None, NOW, None, None, None, 3) == ([], None)
+    assert len(index) == 0
+
+
+def test_changes_are_merged_in_batches():
+    """Test that buffered changes are merged in start time order, and that searches without dates are answered"""
+    events = [event(hours, "cairo") for hours in (1, 3, 5)]
+    index = EventIndex(enabled=True)
+    index.build(events)
+    moved, added, hidden = dict(events[0]), event(4, "cairo"), dict(events[2])
+    moved["date_and_time"] = {"start_date_time": NOW + timedelta(hours=6)}
+    hidden["state"] = {"is_public": False}
+    for document in (moved, added, hidden):
+        index.apply({"operationType": "replace", "documentKey": {"_id": document["_id"]}, "fullDocument": document})
+    index.apply({"operationType": "delete", "documentKey": {"_id": events[1]["_id"]}})
+    assert len(index.pending) == 4
+
+    ids, after = index.search("cairo", None, None, None, None, None, None, 5)
+    assert ids == [added["_id"], moved["_id"]] and after is None
+    assert not index.pending
@@ -0,0 +1,25 @@
+from dependencies.db.events import FACET_PRICE_BANDS, FACETS, to_facets
+
+
+def test_facets_are_read_from_one_aggregation_result():
+    """Test that the groups of the facet stage become the counts of a search, missing values counted nowhere"""
+    result = {
+        "total": [{"count": 6}],
+        "categories": [{"_id": "music", "value": "Music", "count": 4}],
+        "cities": [{"_id": "cairo", "value": "Cairo", "count": 5}, {"_id": "giza", "value": "Giza", "count": 1}],
+        "online": [{"_id": False, "count": 5}, {"_id": True, "count": 1}],
+        "free": [{"_id": True, "count": 2}, {"_id": None, "count": 4}],
+        "price_bands": [{"_id": 250, "count": 1}, {"_id": 0, "count": 2}],
+    }
+    facets = to_facets(result)
+    assert facets.total == 6
+    assert [(city.value, city.count) for city in facets.cities] == [("Cairo", 5), ("Giza", 1)]
+    assert (facets.online, facets.offline, facets.free, facets.paid) == (1, 5, 2, 0)
+    assert [(band.min_price, band.max_price, band.count) for band in facets.price_bands] == [(0, 1, 2), (250, None, 1)]
+
+
+def test_facets_of_no_event_are_empty():
+    """Test that a search matching nothing has zero counts, and that the price bands cover every price"""
+    facets = to_facets({name: [] for name in FACETS})
+    assert facets.total == 0 and facets.cities == [] and facets.price_bands == []
+    assert FACETS["price_bands"][1]["$bucket"]["default"] == FACET_PRICE_BANDS[-1]
@@ -0,0 +1,50 @@
+from dependencies.db.events import EventDriver
+from dependencies.db.indexes import IndexRegistry
+from dependencies.db.promocodes import PromocodeDriver
+from dependencies.db.search import EventSearchDriver, search_terms
+
+
+def test_search_terms_drop_short_words_and_operators():
+    """Test that a search keeps its distinct words of at least three characters, without text index operators"""
+    assert search_terms('Rock -concert in "Cairo", ROCK!') == ["rock", "concert", "cairo"]
+    assert search_terms("a b c") == []
+
+
+def test_text_index_matches_its_server_form():
+    """Test that the text index is not reported as changed when the server stores it in its own form"""
+    declared = EventSearchDriver.indexes[0].document
+    existing = {
+        "key": [("_fts", "text"), ("_ftsx", 1)],
+        "weights": dict(declared["weights"]),
+        "partialFilterExpression": {"state.is_public": True},
+    }
+    assert IndexRegistry._same_index(declared, existing)
+    existing["weights"]["summary"] = 2
+    assert not IndexRegistry._same_index(declared, existing)
+
+
+def test_collation_matches_its_server_form():
+    """Test that a collation is compared with the defaults and version the server fills in, and that a change shows"""
+    declared = PromocodeDriver.indexes[1].document
+    existing = {
+        "key": [("event_id", 1), ("name", 1)],
+        "unique": True,
+        "collation": {
+            "locale": "en", "caseLevel": False, "caseFirst": "off", "strength": 2, "numericOrdering": False,
+            "alternate": "non-ignorable", "maxVariable": "punct", "normalization": False, "backwards": False,
+            "version": "57.1",
+        },
+    }
+    assert IndexRegistry._same_index(declared, existing)
+    existing["collation"]["strength"] = 3
+    assert not IndexRegistry._same_index(declared, existing)
+    del existing["collation"]
+    assert not IndexRegistry._same_index(declared, existing)
+
+
+def test_title_search_is_narrowed_by_the_text_index():
+    """Test that a title search reads the candidates of the text index, unless it has no word long enough"""
+    query = EventDriver().build_search_query("", title="Rock (Live)")
+    assert query["$text"] == {"$search": "rock live"}
+    assert query["basic_info.title"]["$regex"].search("The ROCK (live) tour")
+    assert "$text" not in EventDriver().build_search_query("", title="DJ")
@@ -0,0 +1,37 @@
+from dependencies.db.suggestions import Completions, build_completions
+
+
+def event(event_id: str, title: str, city: str, category: str) -> dict:
+    return {"_id": event_id, "basic_info": {"title": title, "category": category}, "location": {"city": city}}
+
+
+def test_completions_are_the_heaviest_names_starting_with_the_prefix():
+    """Test that titles are weighted by likes and cities by events, ignoring case and accents, and that a build keeps
+    only the heaviest names"""
+    events = [
+        event("1", "Cairo Jazz", "Cairo", "Music"),
+        event("2", "Caïro Food", "CAIRO", "Food"),
+        event("3", "Cairns Run", "Cairns", "Sports"),
+        event("4", "Cairns Run", "Cairns", "Sports"),
+        event("5", "Cairns Run", "Cairns", "Sports"),
+    ]
+    titles, cities, categories = build_completions(events, ["Music", "Cabaret"], {"2": 3})
+    assert titles.complete("cair", 2) == ["Caïro Food", "Cairns Run"]
+    assert cities.complete("cair", 5) == ["Cairns", "Cairo"]
+    assert categories.complete("m", 5) == ["Music"]
+
+    trimmed = Completions.build({"a": ["A", 1], "b": ["B", 3], "c": ["C", 2]}, max_entries=2)
+    assert trimmed.complete("", 5) == ["B", "C"]
+
+
+def test_added_names_respect_the_budget():
+    """Test that names are added incrementally until the completions are full, and only counted when asked to"""
+    completions = Completions(max_entries=2)
+    completions.add("Cairo")
+    completions.add("cairo", grow=False)
+    completions.add("Giza")
+    completions.add("Luxor")
+    assert len(completions) == 2
+    completions.add("Giza")
+    completions.add("Giza")
+    assert completions.complete("", 5) == ["Giza", "Cairo"]
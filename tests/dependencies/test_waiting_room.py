@@ -0,0 +1,26 @@
+import asyncio
+
+from dependencies.waiting_room import MemoryStore, WaitingRoomIn, refill
+
+
+def test_token_bucket_admits_burst_then_rate():
+    """Test that a room admits up to burst positions at once, then rate positions per second"""
+    room = {"rate": 2, "burst": 3, "tokens": 3, "refilled_at": 0, "issued": 10, "admitted_through": 0}
+    room = refill(room, 0)
+    assert room["admitted_through"] == 3
+    room = refill(room, 1)
+    assert room["admitted_through"] == 5
+    room = refill(room, 100)
+    assert room["admitted_through"] == 8
+    assert room["tokens"] == 0
+
+
+def test_positions_are_never_admitted_before_they_are_issued():
+    """Test that tokens left unused by an empty queue are capped at burst"""
+    store = MemoryStore()
+
+    async def run():
+        await store.open("event", WaitingRoomIn(rate=1000, burst=2))
+        return [(await store.join("event"))["admitted_through"] for _ in range(4)]
+
+    assert asyncio.run(run()) == [1, 2, 2, 2]
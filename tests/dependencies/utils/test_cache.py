@@ -0,0 +1,25 @@
+import time
+
+from dependencies.utils.cache import TTLCache
+
+
+def test_entries_expire():
+    """Test that an entry is not returned after its time to live"""
+    cache = TTLCache(max_size=10, ttl=0.01)
+    cache.set("user", 1)
+    assert cache.get("user") == 1
+    time.sleep(0.02)
+    assert cache.get("user") is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    """Test that the cache keeps at most max_size entries, evicting the least recently used one"""
+    cache = TTLCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
@@ -0,0 +1,38 @@
+import asyncio
+
+from dependencies.utils.dataloader import DataLoader
+
+
+def make_loader():
+    calls = []
+
+    async def batch_load(keys):
+        calls.append(keys)
+        return {key: key * 2 for key in keys if key != 3}
+
+    return DataLoader(batch_load), calls
+
+
+def test_load_many_batches_and_deduplicates():
+    """Test that the keys loaded together are fetched with one de-duplicated batch"""
+    async def run():
+        loader, calls = make_loader()
+        values = await loader.load_many([1, 2, 2, 3])
+        return values, calls
+
+    values, calls = asyncio.run(run())
+    assert values == [2, 4, 4, None]
+    assert calls == [[1, 2, 3]]
+
+
+def test_load_is_memoized():
+    """Test that a key is fetched once for the life of the loader, including keys that were not found"""
+    async def run():
+        loader, calls = make_loader()
+        await asyncio.gather(loader.load(1), loader.load(3))
+        values = [await loader.load(1), await loader.load(3)]
+        return values, calls
+
+    values, calls = asyncio.run(run())
+    assert values == [2, None]
+    assert calls == [[1, 3]]
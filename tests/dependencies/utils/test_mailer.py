@@ -0,0 +1,56 @@
+import asyncio
+import smtplib
+from email.message import EmailMessage
+
+from dependencies.utils.mailer import Mailer
+
+
+class FakeConnection:
+    def __init__(self, errors):
+        self.errors = errors
+        self.sent = []
+
+    def send(self, recipient, message):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append(recipient)
+
+    def close(self):
+        pass
+
+
+def make_message():
+    message = EmailMessage()
+    message["Subject"] = "Verification email"
+    return message
+
+
+def test_temporary_failures_are_retried():
+    """Test that a message is sent again after a dropped connection or a 4xx answer"""
+    connection = FakeConnection([smtplib.SMTPServerDisconnected(), smtplib.SMTPResponseException(421, b"busy")])
+
+    async def run():
+        mailer = Mailer(workers=1, rate=0, retry_delay=0, connection_factory=lambda: connection)
+        mailer.enqueue("user@example.com", make_message())
+        await mailer.stop()
+        return mailer.metrics
+
+    metrics = asyncio.run(run())
+    assert connection.sent == ["user@example.com"]
+    assert metrics == {"sent": 1, "retried": 2, "failed": 0}
+
+
+def test_permanent_failures_are_not_retried():
+    """Test that a message refused with a 5xx answer is given up on without blocking the next ones"""
+    connection = FakeConnection([smtplib.SMTPRecipientsRefused({"bad@example.com": (550, b"no such user")})])
+
+    async def run():
+        mailer = Mailer(workers=1, rate=0, retry_delay=0, connection_factory=lambda: connection)
+        mailer.enqueue("bad@example.com", make_message())
+        mailer.enqueue("user@example.com", make_message())
+        await mailer.stop()
+        return mailer.metrics
+
+    metrics = asyncio.run(run())
+    assert connection.sent == ["user@example.com"]
+    assert metrics == {"sent": 1, "retried": 0, "failed": 1}
@@ -0,0 +1,14 @@
+from dependencies.utils.text import fold, prefix_filter
+
+
+def test_fold_ignores_case_accents_and_spaces():
+    """Test that the spellings of a name a user may type fold to the same key"""
+    assert fold("  São  PAULO ") == fold("sao paulo") == "sao paulo"
+    assert fold("CAIRO") == fold("Cairo") == fold("cairo")
+    assert fold(None) is None
+
+
+def test_prefix_filter_is_anchored_and_escaped():
+    """Test that a prefix filter is an anchored pattern on the folded prefix, and that an empty one matches anything"""
+    assert prefix_filter("Ál.") == {"$regex": r"^al\."}
+    assert prefix_filter("  ") is None
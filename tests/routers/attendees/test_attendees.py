@@ -1,6 +1,4 @@
-from fastapi.testclient import TestClient
-
-from main import app
+from tests.client import client
 
 from dependencies.token_handler import TokenHandler
 from dependencies.models.users import UserToken
@@ -11,7 +9,6 @@ from dependencies.db.orders import OrderDriver
 from dependencies.db.attendees import AttendeeDriver
 
 user_driver = UsersDriver()
-client = TestClient(app)
 token_handler = TokenHandler()
 
 correct_email="ahmedfathy1234553@gmail.com"#should be in users db
@@ -33,7 +30,7 @@ attendee1 = {
     }
 
 def get_user_id(email):
-    user = user_driver.get_user_by_email(email)
+    user = client.portal.call(user_driver.get_user_by_email, email)
     return user.id
 
 def test_add_attendee():
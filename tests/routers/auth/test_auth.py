@@ -1,12 +1,9 @@
-from fastapi.testclient import TestClient
-
-from main import app
+from tests.client import client
 from dependencies.token_handler import TokenHandler
 from dependencies.models.users import UserToken
 from dependencies.db.users import UsersDriver
 
 user_driver = UsersDriver()
-client = TestClient(app)
 token_handler = TokenHandler()
 
 user_signup = {
@@ -27,7 +24,7 @@ user_wrong_data = {
 }
 
 def get_user_id(email):
-    user = user_driver.get_user_by_email(email)
+    user = client.portal.call(user_driver.get_user_by_email, email)
     return user.id
 
 
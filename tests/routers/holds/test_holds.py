@@ -0,0 +1,62 @@
+from tests.client import client
+from dependencies.db.tickets import TicketDriver
+from dependencies.db.users import UsersDriver
+from dependencies.models.users import UserToken
+from dependencies.token_handler import TokenHandler
+
+"""
+This module contains unit tests for testing the ticket holds of the FastAPI application.
+"""
+
+ticket_driver = TicketDriver()
+user_driver = UsersDriver()
+token_handler = TokenHandler()
+
+correct_email = "ahmedfathy1234553@gmail.com"  # should be in users db
+event_id = "645a56ccb72d59a07bacfa53"  # should have tickets
+incorrect_id = "645a4f6cde817f34feab5e99"
+
+
+def headers():
+    """A helper function that returns the authorization header of a user for testing"""
+    user = client.portal.call(user_driver.get_user_by_email, correct_email)
+    return {"Authorization": f"Bearer {token_handler.encode_token(UserToken(email=correct_email, id=user.id))}"}
+
+
+def available_quantity(ticket_id):
+    """A helper function that returns the available quantity of a ticket"""
+    return client.portal.call(ticket_driver.get_ticket_by_id, ticket_id).available_quantity
+
+
+def test_hold_and_release():
+    """Test that holding tickets takes them off the available quantity and releasing the hold gives them back"""
+    ticket_id = client.portal.call(ticket_driver.get_tickets, event_id)[0].id
+    before = available_quantity(ticket_id)
+
+    response = client.post(f"/holds/ticket_id/{ticket_id}/quantity/1", headers=headers())
+    assert response.status_code == 200
+    hold_id = response.json()["id"]
+    assert response.json()["state"] == "active"
+    assert available_quantity(ticket_id) == before - 1
+
+    response = client.delete(f"/holds/hold_id/{hold_id}", headers=headers())
+    assert response.status_code == 200
+    assert available_quantity(ticket_id) == before
+
+    response = client.delete(f"/holds/hold_id/{hold_id}", headers=headers())
+    assert response.status_code == 400
+    assert response.json() == {"detail": "hold already released"}
+
+
+def test_hold_with_wrong_ticket_id():
+    """Test for holding tickets of a ticket that does not exist"""
+    response = client.post(f"/holds/ticket_id/{incorrect_id}/quantity/1", headers=headers())
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Ticket not found"}
+
+
+def test_get_hold_with_wrong_hold_id():
+    """Test for getting a hold that does not exist"""
+    response = client.get(f"/holds/hold_id/{incorrect_id}", headers=headers())
+    assert response.status_code == 404
+    assert response.json() == {"detail": "hold not found"}
@@ -1,6 +1,4 @@
-from fastapi.testclient import TestClient
-
-from main import app
+from tests.client import client
 
 from dependencies.token_handler import TokenHandler
 from dependencies.models.users import UserToken
@@ -11,7 +9,6 @@ from dependencies.db.events import EventDriver
 from dependencies.db.orders import OrderDriver
 
 user_driver = UsersDriver()
-client = TestClient(app)
 token_handler = TokenHandler()
 
 correct_email="ahmedfathy1234553@gmail.com"#shoul be in users db
@@ -41,9 +38,19 @@ order2 = {
     "image_link":"https://www.example.com/image.png"
     }
 
+#checkout with a ticket that does not exist
+checkout1 = {
+    "first_name":"ff",
+    "last_name":"Doe",
+    "email":correct_email,
+    "attendees":[
+        {"first_name":"ff","last_name":"Doe","email":correct_email,"ticket_id":"64594a6ec8bd709f5481b8a9"},
+    ],
+    }
+
 
 def get_user_id(email):
-    user = user_driver.get_user_by_email(email)
+    user = client.portal.call(user_driver.get_user_by_email, email)
     return user.id
 
 def test_add_order():
@@ -67,6 +74,23 @@ def test_add_order_with_wrong_event_id():
     assert response.status_code == 404
     assert response.json()["detail"] == "event not found"
 
+def test_checkout_with_wrong_event_id():
+    user_email = order1["email"]
+    user = UserToken(email=user_email, id=get_user_id(user_email))
+    token = token_handler.encode_token(user)
+
+    response = client.post(f"/orders/{incorrect_event_id}/checkout", json=checkout1,headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 404
+
+def test_checkout_with_wrong_ticket_id():
+    user_email = order1["email"]
+    user = UserToken(email=user_email, id=get_user_id(user_email))
+    token = token_handler.encode_token(user)
+
+    response = client.post(f"/orders/{correct_event_id}/checkout", json=checkout1,headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Ticket not found"}
+
 def test_get_order():
     response = client.get(f"/orders/{incorrect_order_id}")
     assert response.status_code == 404
@@ -1,13 +1,12 @@
-from fastapi.testclient import TestClient
-from main import app
+import json
+
+from tests.client import client
 from dependencies.db.promocodes import PromocodeDriver
 
 """
 This module contains unit tests for testing the functionality of the FastAPI application that manages event tickets.
 """
 
-# Create a TestClient instance to send requests to the FastAPI application.
-client = TestClient(app)
 # Create a TicketDriver instance to interact with the ticket database
 promocode_driver = PromocodeDriver()
 
@@ -35,7 +34,7 @@ updated_promocode = {
 
 def promocode_id():
     """A helper function that returns the ID of a ticket for testing"""
-    return promocode_driver.get_promocodes("645a56ccb72d59a07bacfa53")[0].id
+    return client.portal.call(promocode_driver.get_promocodes, "645a56ccb72d59a07bacfa53")[0].id
 
 
 def test_create_promocodes():
@@ -44,6 +43,26 @@ def test_create_promocodes():
     assert response.status_code == 200
 
 
+def test_generate_promocodes():
+    """Test for generating unique single-use promocodes for an event"""
+    response = client.post(
+        "/promocodes/event_id/645a56ccb72d59a07bacfa53/generate",
+        params={"format": "ndjson"},
+        json={
+            "prefix": "TEST-",
+            "count": 3,
+            "is_percentage": True,
+            "discount_amount": 0.2,
+            "start_date_time": "2023-05-01T00:00:00",
+            "end_date_time": "2023-05-31T23:59:59",
+        },
+    )
+    assert response.status_code == 200
+    names = [json.loads(line)["name"] for line in response.text.splitlines()]
+    assert len(set(names)) == 3
+    assert all(name.startswith("TEST-") for name in names)
+
+
 def test_create_promocodes_invalid_event_id():
     """Test for creating new tickets for an event with an invalid event ID"""
     response = client.post("/promocodes/event_id/645a56ccb72d59a07bacfa99", json=[new_promocode])
@@ -77,6 +96,26 @@ def test_get_promocodes_by_invalid_promocode_id():
     assert response.json() == {'detail': 'Promocode ID not found'}
 
 
+def test_apply_promocode_by_name():
+    """Test for applying a promocode by its name, ignoring case"""
+    response = client.get(
+        "/promocodes/event_id/645a56ccb72d59a07bacfa53/name/TEST PROMOCODE/price",
+        params={"ticket_ids": ["645a4f6cde817f34feab5e99"]},
+    )
+    assert response.status_code == 400
+    assert response.json() == {'detail': 'Promocode is not active'}
+
+
+def test_apply_promocode_by_invalid_name():
+    """Test for applying a promocode with a name that does not exist"""
+    response = client.get(
+        "/promocodes/event_id/645a56ccb72d59a07bacfa53/name/NOPE/price",
+        params={"ticket_ids": ["645a4f6cde817f34feab5e99"]},
+    )
+    assert response.status_code == 404
+    assert response.json() == {'detail': 'Promocode not found'}
+
+
 def test_update_promocodes():
     """Test for updating a ticket"""
     response = client.put(f"/promocodes/promocode_id/{promocode_id()}", json=updated_promocode)
@@ -1,13 +1,10 @@
-from fastapi.testclient import TestClient
-from main import app
+from tests.client import client
 from dependencies.db.tickets import TicketDriver
 
 """
 This module contains unit tests for testing the functionality of the FastAPI application that manages event tickets.
 """
 
-# Create a TestClient instance to send requests to the FastAPI application.
-client = TestClient(app)
 # Create a TicketDriver instance to interact with the ticket database
 ticket_driver = TicketDriver()
 
@@ -34,7 +31,7 @@ updated_ticket = {
 
 def ticket_id():
     """A helper function that returns the ID of a ticket for testing"""
-    return ticket_driver.get_tickets("645a56ccb72d59a07bacfa53")[0].id
+    return client.portal.call(ticket_driver.get_tickets, "645a56ccb72d59a07bacfa53")[0].id
 
 
 def test_create_tickets():
@@ -56,6 +53,12 @@ def test_get_tickets_by_event_id():
     assert response.status_code == 200
 
 
+def test_get_tickets_by_event_id_invalid_cursor():
+    """Test for getting tickets for an event with a cursor that was not issued by the API"""
+    response = client.get("/tickets/event_id/645a56ccb72d59a07bacfa53", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+
 def test_get_tickets_by_invalid_event_id():
     """Test for getting tickets for an event with an invalid event ID"""
     response = client.get("/tickets/event_id/645a56ccb72d59a07bacfa99")
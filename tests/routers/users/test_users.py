@@ -1,13 +1,10 @@
-from fastapi.testclient import TestClient
-
-from main import app
+from tests.client import client
 from dependencies.db.users import UsersDriver
 from dependencies.token_handler import TokenHandler
 from dependencies.models.users import UserToken
 
 user_driver = UsersDriver()
 token_handler = TokenHandler()
-client = TestClient(app)
 
 user_data = {
     "email": "test.test@gmail.com",
@@ -28,11 +25,11 @@ def get_token():
     token = token_handler.encode_token(user)
     return token
 def get_user_id(email):
-    user = user_driver.get_user_by_email(email)
+    user = client.portal.call(user_driver.get_user_by_email, email)
     return user.id
 
 def remove_user_by_email(email):
-    user_driver.collection.delete_one({"email": email})
+    client.portal.call(user_driver.collection.delete_one, {"email": email})
 
 def test_get_info():
     token = get_token()